@@ -0,0 +1,189 @@
+#admission.py
+"""
+Admission control for expensive routes.
+
+Analyses hold a slot while they run; at most ANALYZE_MAX_IN_FLIGHT run at once per worker.
+POST /analyze/ requests take theirs in the middleware. Further requests wait in a FIFO queue of at
+most ANALYZE_MAX_QUEUE entries for up to ANALYZE_QUEUE_TIMEOUT_SECONDS. Anything beyond that is
+shed immediately with 503 and a Retry-After header instead of piling up behind slow upstream
+calls. A request is also shed when it could not start before its deadline anyway: the expected
+wait is how long the running analyses still need (recent latency minus the time they have already
+run), plus one full latency for every earlier round of the queue.
+
+POST /analyze/batch streams for as long as the whole batch runs, so it is not guarded as a
+request. Each subject takes a slot of its own (acquire_free_slot) and only when one is free with
+nobody queued: batch items give way to interactive requests and are never shed.
+
+Every other route (health check, plans, auth, discussions, metrics) bypasses the controller, so
+those routes keep their capacity during an analysis flood. Set ANALYZE_MAX_IN_FLIGHT=0 to
+disable admission control.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from dotenv import load_dotenv
+load_dotenv()
+
+GUARDED_ROUTES = {("POST", "/analyze/"), ("POST", "/analyze")}
+BACKGROUND_POLL = 0.25  # seconds between free-slot checks of a waiting batch item
+
+
+class Shed(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight=16, max_queue=32, queue_timeout=60.0, window=50):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._started = []  # monotonic start times of the slots in use
+        self._waiters = deque()
+        self._latencies = deque(maxlen=window)
+        self._stats = {"admitted": 0, "queued": 0, "shed_queue_full": 0, "shed_predicted": 0,
+                       "shed_timeout": 0, "background_admitted": 0, "background_deferred": 0}
+
+    @property
+    def enabled(self):
+        return self.max_in_flight > 0
+
+    def recent_latency(self):
+        return sum(self._latencies) / len(self._latencies) if self._latencies else None
+
+    def expected_wait(self, position):
+        """Seconds until the request at queue ``position`` (0-based) starts, from recent latency"""
+        latency = self.recent_latency()
+        if latency is None:
+            return 0.0
+        now = time.monotonic()
+        remaining = sorted(max(0.0, latency - (now - started)) for started in self._started)
+        slot = position % self.max_in_flight
+        first_free = remaining[slot] if slot < len(remaining) else 0.0
+        return first_free + (position // self.max_in_flight) * latency
+
+    def retry_after(self):
+        wait = self.expected_wait(len(self._waiters)) or self.queue_timeout
+        return min(120, max(1, math.ceil(wait)))
+
+    async def acquire(self):
+        """Take a slot, waiting in the queue if needed; raises Shed when the request is refused"""
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self._started.append(time.monotonic())
+            self._stats["admitted"] += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._stats["shed_queue_full"] += 1
+            raise Shed("queue_full", self.retry_after())
+        if self.expected_wait(len(self._waiters)) > self.queue_timeout:
+            self._stats["shed_predicted"] += 1
+            raise Shed("predicted_timeout", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._stats["queued"] += 1
+        try:
+            # release() hands the slot over by resolving the future; shield keeps wait_for from
+            # cancelling it, so a slot handed over at the deadline is still seen
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                waiter.cancel()
+                self._waiters.remove(waiter)
+                self._stats["shed_timeout"] += 1
+                raise Shed("timeout", self.retry_after())
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            raise
+        self._stats["admitted"] += 1
+
+    async def acquire_free_slot(self):
+        """Take a slot for background work once one is free and nobody is queued; never sheds"""
+        if not (self.in_flight < self.max_in_flight and not self._waiters):
+            self._stats["background_deferred"] += 1
+            while not (self.in_flight < self.max_in_flight and not self._waiters):
+                await asyncio.sleep(BACKGROUND_POLL)
+        self.in_flight += 1
+        self._started.append(time.monotonic())
+        self._stats["background_admitted"] += 1
+
+    def release(self, elapsed=None):
+        now = time.monotonic()
+        if elapsed is not None:
+            self._latencies.append(elapsed)
+        if self._started:
+            # The slot that started closest to ``elapsed`` ago, else the longest-running one
+            finished = (min(self._started, key=lambda started: abs(now - elapsed - started))
+                        if elapsed is not None else min(self._started))
+            self._started.remove(finished)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # the slot passes to the next waiter
+                self._started.append(now)
+                return
+        self.in_flight -= 1
+
+    def stats(self):
+        latency = self.recent_latency()
+        return dict(self._stats, in_flight=self.in_flight, queue_depth=len(self._waiters),
+                    max_in_flight=self.max_in_flight, max_queue=self.max_queue,
+                    recent_latency=round(latency, 3) if latency is not None else None)
+
+
+class AdmissionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (scope["method"], scope["path"]) not in GUARDED_ROUTES:
+            await self.app(scope, receive, send)
+            return
+        controller = get_admission_controller()
+        if not controller.enabled:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await controller.acquire()
+        except Shed as shed:
+            await send_busy(send, shed)
+            return
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(time.perf_counter() - started)
+
+
+async def send_busy(send, shed):
+    body = b'{"detail":"Server busy, please retry later","reason":"' + shed.reason.encode() + b'"}'
+    await send({"type": "http.response.start", "status": 503, "headers": [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+        (b"retry-after", str(shed.retry_after).encode()),
+    ]})
+    await send({"type": "http.response.body", "body": body})
+
+
+# Lazy, per-process controller (limits are per worker)
+_controller = None
+
+def get_admission_controller():
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController(
+            max_in_flight=int(os.getenv("ANALYZE_MAX_IN_FLIGHT", 16)),
+            max_queue=int(os.getenv("ANALYZE_MAX_QUEUE", 32)),
+            queue_timeout=float(os.getenv("ANALYZE_QUEUE_TIMEOUT_SECONDS", 60)),
+        )
+    return _controller
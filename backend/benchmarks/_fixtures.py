@@ -0,0 +1,48 @@
+# _fixtures.py
+"""Shared fake data for the benchmarks: Tavily-shaped search results with full page content"""
+import os
+import random
+import sys
+
+# Allow `python benchmarks/<script>.py` from the backend folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_WORDS = ("market revenue growth competition supplier customer pricing regulation electric "
+          "vehicle battery margin brand demand capacity software energy storage europe china "
+          "subsidy strategy partnership cost production delivery quarter analyst forecast").split()
+
+
+def fake_sentence(rng, subject):
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(10, 24))]
+    if rng.random() < 0.3:
+        words.insert(rng.randint(0, len(words)), subject)
+    return " ".join(words).capitalize() + "."
+
+
+def fake_results(subject="Tesla", n=5, page_chars=4000, seed=7):
+    """Tavily-style results; ``page_chars`` of content each, as returned with full page content"""
+    rng = random.Random(seed)
+    results = []
+    for i in range(n):
+        content = ""
+        while len(content) < page_chars:
+            content += fake_sentence(rng, subject) + " "
+        results.append({
+            "title": f"{subject} industry report part {i + 1}",
+            "url": f"https://example.com/{subject.lower()}/report-{i + 1}",
+            "content": content.strip(),
+            "score": round(rng.random(), 3),
+        })
+    return results
+
+
+def fake_report(subject="Tesla", chars=6000, seed=11):
+    """A markdown report with headers, citations and a Sources block"""
+    rng = random.Random(seed)
+    parts = [f"# SWOT Analysis of {subject}"]
+    while sum(len(p) for p in parts) < chars:
+        parts.append(f"## {rng.choice(_WORDS).capitalize()}")
+        parts.append(" ".join(fake_sentence(rng, subject) + f" [{rng.randint(1, 5)}]" for _ in range(4)))
+    body = "\n\n".join(parts)
+    sources = "\n".join(f"{i}. [{subject} source {i}](https://example.com/{i})" for i in range(1, 6))
+    return body + "\n\n### Sources\n" + sources
@@ -0,0 +1,100 @@
+# bench_admission.py
+"""
+Cheap-route latency during an analysis flood, with and without admission control.
+
+One uvicorn worker runs worker_app.py. Each analysis waits BENCH_UPSTREAM_MS (default 3 s) on
+the "upstream" and then holds the GIL for BENCH_CPU_MS (default 20 ms), the way prompt
+building and response parsing do. FLOOD clients post /analyze/ back to back with a client
+timeout; shed clients wait for Retry-After before trying again. A separate probe process calls
+GET / and GET /plans/ every 20 ms. The report shows the probe's p50/p99 and what happened to
+the analyses.
+"""
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+import httpx
+from bench_workers import HERE, free_port, wait_until_up
+
+DURATION = 20.0
+FLOOD = 200
+CLIENT_TIMEOUT = 15.0
+
+
+def probe(url, stop_at, results):
+    async def run():
+        latencies = []
+        async with httpx.AsyncClient(base_url=url, timeout=CLIENT_TIMEOUT) as client:
+            while time.time() < stop_at:
+                for path in ("/", "/plans/"):
+                    started = time.perf_counter()
+                    await client.get(path)
+                    latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.02)
+        results.put(latencies)
+    asyncio.run(run())
+
+
+async def flood(url, stop_at):
+    outcomes = {"ok": 0, "shed": 0, "timed_out": 0}
+    ok_latencies = []
+    limits = httpx.Limits(max_connections=FLOOD)
+    async with httpx.AsyncClient(base_url=url, timeout=CLIENT_TIMEOUT, limits=limits) as client:
+        async def analyst(n):
+            i = 0
+            while time.time() < stop_at:
+                i += 1
+                started = time.perf_counter()
+                try:
+                    r = await client.post("/analyze/", json={"messages": [], "user_input": f"swot of company {n}-{i}"})
+                except httpx.TimeoutException:
+                    outcomes["timed_out"] += 1
+                    continue
+                if r.status_code == 503:
+                    outcomes["shed"] += 1
+                    await asyncio.sleep(float(r.headers.get("retry-after", 1)))
+                elif r.status_code == 200:
+                    outcomes["ok"] += 1
+                    ok_latencies.append(time.perf_counter() - started)
+        await asyncio.gather(*(analyst(n) for n in range(FLOOD)))
+    ok_latencies.sort()
+    outcomes["ok_p50_s"] = round(ok_latencies[len(ok_latencies) // 2], 1) if ok_latencies else None
+    return outcomes
+
+
+def run(max_in_flight):
+    port = free_port()
+    env = dict(os.environ, VECTOR_INDEX_ENABLED="0", ANALYZE_MAX_IN_FLIGHT=str(max_in_flight),
+               BENCH_UPSTREAM_MS=os.getenv("BENCH_UPSTREAM_MS", "3000"), BENCH_CPU_MS=os.getenv("BENCH_CPU_MS", "20"))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "worker_app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=HERE, env=env, stdout=subprocess.DEVNULL,
+    )
+    try:
+        url = f"http://127.0.0.1:{port}"
+        wait_until_up(url)
+        stop_at = time.time() + DURATION
+        results = multiprocessing.Queue()
+        prober = multiprocessing.Process(target=probe, args=(url, stop_at, results))
+        prober.start()
+        outcomes = asyncio.run(flood(url, stop_at))
+        latencies = sorted(results.get())
+        prober.join()
+    finally:
+        server.terminate()
+        server.wait()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)], outcomes
+
+
+def main():
+    print(f"flood={FLOOD} clients, client timeout {CLIENT_TIMEOUT:.0f}s, duration={DURATION:.0f}s, "
+          f"cheap probe every 20 ms\n")
+    for label, max_in_flight in (("no admission", 0), ("admission (defaults)", int(os.getenv("ANALYZE_MAX_IN_FLIGHT", 16)))):
+        p50, p99, outcomes = run(max_in_flight)
+        print(f"{label:>21}: cheap p50 {p50 * 1000:6.1f} ms  p99 {p99 * 1000:7.1f} ms  analyses {outcomes}")
+
+
+if __name__ == "__main__":
+    main()
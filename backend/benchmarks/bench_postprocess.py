@@ -0,0 +1,58 @@
+# bench_postprocess.py
+"""
+Post-processing on a 50 KB report: the previous per-call re.sub sanitizer versus the precompiled
+one, streaming (re-sanitizing the accumulated text per chunk versus IncrementalSanitizer),
+citation validation and the Sources section.
+"""
+import re
+import timeit
+from _fixtures import fake_report, fake_results
+from postprocess import sanitize_markdown, IncrementalSanitizer, validate_citations, format_source_links
+
+REPORT = "```markdown\n" + fake_report(chars=50_000) + "\n```"
+RESULTS = fake_results()
+CHUNK = 40
+
+
+def legacy_sanitize_markdown(text):
+    # The sanitizer as it was inlined in initialize_workflow
+    text = re.sub(r'^```markdown\s*', '', text)
+    text = re.sub(r'^```md\s*', '', text)
+    text = re.sub(r'\s*```$', '', text)
+    text = re.sub(r'(?<!\n)#{1,6}\s', r'\n\g<0>', text)
+    return text.strip()
+
+
+def stream_resanitize():
+    # Naive streaming: sanitize everything received so far after every chunk
+    received = ""
+    for i in range(0, len(REPORT), CHUNK):
+        received += REPORT[i:i + CHUNK]
+        legacy_sanitize_markdown(received)
+
+
+def stream_incremental():
+    sanitizer = IncrementalSanitizer()
+    out = [sanitizer.feed(REPORT[i:i + CHUNK]) for i in range(0, len(REPORT), CHUNK)]
+    out.append(sanitizer.finish())
+    return "".join(out)
+
+
+def bench(label, fn, number):
+    per_call = min(timeit.repeat(fn, number=number, repeat=5)) / number
+    print(f"{label:<44}{per_call * 1000:>10.3f} ms")
+
+
+def main():
+    assert stream_incremental() == sanitize_markdown(REPORT)
+    print(f"report size: {len(REPORT) / 1024:.1f} KB, stream chunk: {CHUNK} chars\n")
+    bench("sanitize (legacy re.sub)", lambda: legacy_sanitize_markdown(REPORT), 200)
+    bench("sanitize (precompiled)", lambda: sanitize_markdown(REPORT), 200)
+    bench("stream: re-sanitize accumulated text", stream_resanitize, 1)
+    bench("stream: IncrementalSanitizer", stream_incremental, 20)
+    bench("validate_citations", lambda: validate_citations(REPORT, RESULTS), 200)
+    bench("format_source_links", lambda: format_source_links(RESULTS), 5000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# bench_profiling.py
+"""
+Per-request cost of the profiling middleware around a trivial ASGI app: absent, installed but
+disabled (the production default) and profiling every request with cProfile.
+"""
+import asyncio
+import time
+import _fixtures  # noqa: F401  (sys.path)
+import profiling
+from profiling import Profiling, ProfilingMiddleware
+
+SCOPE = {"type": "http", "method": "GET", "path": "/plans/", "headers": [(b"accept", b"*/*")]}
+
+
+async def app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"[]"})
+
+
+async def noop(message):
+    pass
+
+
+async def per_request_us(handler, n):
+    started = time.perf_counter()
+    for _ in range(n):
+        await handler(dict(SCOPE), None, noop)
+    return (time.perf_counter() - started) / n * 1e6
+
+
+async def main(n=20_000):
+    base = await per_request_us(app, n)
+    profiling._profiling = Profiling(sample_rate=0)
+    disabled = await per_request_us(ProfilingMiddleware(app), n)
+    profiling._profiling = Profiling(sample_rate=1.0)
+    sampled = await per_request_us(ProfilingMiddleware(app), n // 20)
+    print(f"no middleware      {base:8.2f} us/request")
+    print(f"disabled           {disabled:8.2f} us/request  (+{disabled - base:.2f} us)")
+    print(f"profile every call {sampled:8.2f} us/request  (+{sampled - base:.2f} us)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
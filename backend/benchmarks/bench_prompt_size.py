@@ -0,0 +1,39 @@
+# bench_prompt_size.py
+"""
+Prompt size of the five framework templates (and the general prompt) with the raw repr of the
+search results versus the compact numbered serializer.
+"""
+import time
+from _fixtures import fake_results, fake_report
+from graph import build_analysis_prompt, build_general_prompt
+from sources import serialize_sources, serialize_history
+
+FRAMEWORKS = ["SWOT", "PESTLE", "TOWS matrix", "Porter's Five Forces", "Business Model Canvas"]
+
+
+def main():
+    subject = "Tesla"
+    results = fake_results(subject)
+    history = []
+    for turn in range(10):
+        history.append(("human", f"question {turn} about {subject}"))
+        history.append(("ai", fake_report(subject, seed=turn)))
+
+    started = time.perf_counter()
+    compact = serialize_sources(results, query=subject)
+    serialize_ms = (time.perf_counter() - started) * 1000
+
+    print(f"{'template':<24}{'raw chars':>12}{'compact chars':>15}{'reduction':>11}")
+    for framework in FRAMEWORKS:
+        raw = len(build_analysis_prompt(framework, subject, results))
+        small = len(build_analysis_prompt(framework, subject, compact))
+        print(f"{framework:<24}{raw:>12}{small:>15}{1 - small / raw:>10.0%}")
+
+    raw = len(build_general_prompt(history, subject, results))
+    small = len(build_general_prompt(serialize_history(history), subject, compact))
+    print(f"{'general (20 msgs)':<24}{raw:>12}{small:>15}{1 - small / raw:>10.0%}")
+    print(f"\nserialize_sources: {serialize_ms:.2f} ms for {len(results)} results")
+
+
+if __name__ == "__main__":
+    main()
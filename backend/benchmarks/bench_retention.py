@@ -0,0 +1,61 @@
+# bench_retention.py
+"""
+Storage of conversations as /analyze/ writes them (one document per turn carrying the whole
+history) versus compacted into one document and versus archived to compressed JSONL, for 200
+conversations of 20 turns with ~6 KB reports. Sizes are BSON bytes as Mongo stores them.
+"""
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from _fixtures import fake_report
+from retention import ArchiveStore, compact_conversation, archive_stub, document_size
+
+CONVERSATIONS, TURNS = 200, 20
+
+
+def conversation_docs(n, turns):
+    start = datetime(2024, 1, 1)
+    docs, history = [], []
+    for t in range(turns):
+        response = fake_report(chars=6000, seed=n * turns + t)
+        messages = list(history)
+        history = history + [("human", f"question {t}"), ("ai", response)]
+        docs.append({"_id": ObjectId(), "messages": messages, "input": f"question {t}", "response": response,
+                     "full_history": messages + [(f"question {t}", response)], "user_id": "u1",
+                     "conversation_id": f"c{n}", "turn_index": t, "is_head": t == turns - 1,
+                     "title": "question 0", "preview": response[:200], "started_at": start,
+                     "created_at": start + timedelta(minutes=t)})
+    return docs
+
+
+def main():
+    raw = compacted = stubs = 0
+    cold = []
+    for n in range(CONVERSATIONS):
+        docs = conversation_docs(n, TURNS)
+        raw += sum(document_size(doc) for doc in docs)
+        doc = compact_conversation(docs)
+        compacted += document_size(doc)
+        cold.append(doc)
+    directory = tempfile.mkdtemp()
+    for codec in ("gzip", "zstd"):
+        store = ArchiveStore(directory, codec)
+        started = time.perf_counter()
+        name, archive_bytes = store.write(cold)
+        write_s = time.perf_counter() - started
+        started = time.perf_counter()
+        store.read(name, f"c{CONVERSATIONS - 1}")
+        read_ms = (time.perf_counter() - started) * 1000
+        stubs = sum(document_size(archive_stub(doc, name)) for doc in cold)
+        print(f"{codec:>5} archive: {archive_bytes / 2**20:7.2f} MiB on disk  write {write_s:5.2f}s  "
+              f"worst-case read {read_ms:6.1f} ms")
+    shutil.rmtree(directory)
+    print(f"per-turn documents: {raw / 2**20:8.2f} MiB in Mongo")
+    print(f"compacted:          {compacted / 2**20:8.2f} MiB in Mongo ({1 - compacted / raw:.1%} saved)")
+    print(f"archived stubs:     {stubs / 2**20:8.2f} MiB in Mongo ({1 - stubs / raw:.2%} saved)")
+
+
+if __name__ == "__main__":
+    main()
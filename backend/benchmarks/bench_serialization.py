@@ -0,0 +1,79 @@
+# bench_serialization.py
+"""
+Serialization cost of the read-heavy responses: 1,000 plans and a 100-turn chat history.
+
+"before" is what the endpoints did: a Pydantic model per document, response_model validation,
+jsonable_encoder and the stdlib JSON encoder. "after" is the lean path: raw Mongo documents
+rendered by MongoJSONResponse (orjson).
+"""
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from typing import List
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from _fixtures import fake_report
+import main
+
+STATUSES = ["todo", "inprogress", "done"]
+
+
+def fake_plans(n=1000, seed=5):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    return [{"_id": ObjectId(), "title": f"Plan {i}", "description": "Interview suppliers and size the market. " * rng.randint(1, 6),
+             "status": rng.choice(STATUSES), "created_at": start + timedelta(minutes=i),
+             "updated_at": start + timedelta(minutes=i, seconds=30)} for i in range(n)]
+
+
+def fake_history(turns=100):
+    history = []
+    for turn in range(turns):
+        history += [("human", f"question {turn}"), ("ai", fake_report(chars=3000, seed=turn))]
+    return history
+
+
+def timeit(fn, repeat=20):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def plans_before(docs):
+    plans = [main.Plan(**doc) for doc in docs]
+    validated = TypeAdapter(List[main.Plan]).validate_python(plans)  # response_model=List[Plan]
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def plans_after(docs):
+    return main.MongoJSONResponse([main.lean_plan(doc) for doc in docs]).body
+
+
+def history_before(history):
+    response = main.AnalysisResponse(response=history[-1][1], full_history=history, conversation_id="c", turn_index=99)
+    validated = main.AnalysisResponse.model_validate(response)  # response_model=AnalysisResponse
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def history_after(history):
+    return main.MongoJSONResponse({"_id": None, "response": history[-1][1], "full_history": history,
+                                   "conversation_id": "c", "turn_index": 99}).body
+
+
+def main_():
+    docs, history = fake_plans(), fake_history()
+    assert json.loads(plans_before(docs)) == json.loads(plans_after(docs))
+    assert json.loads(history_before(history)) == json.loads(history_after(history))
+    for name, before, after, data in (("1k plans", plans_before, plans_after, docs),
+                                      ("100-turn history", history_before, history_after, history)):
+        t_before, t_after = timeit(lambda: before(data)), timeit(lambda: after(data))
+        print(f"{name:>17}: before {t_before:7.2f} ms  after {t_after:6.2f} ms  ({t_before / t_after:5.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main_()
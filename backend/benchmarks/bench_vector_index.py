@@ -0,0 +1,65 @@
+# bench_vector_index.py
+"""
+Recall and latency of the local vector index. Analyses of N synthetic company subjects are
+indexed, then each subject is queried again with another framework and phrasing; recall@1
+is the share of queries whose top hit is the same subject, and false positives are queries for
+unseen subjects that would still have been answered internally.
+"""
+import random
+import shutil
+import tempfile
+import time
+from _fixtures import fake_results
+from vector_index import VectorIndex, normalize_subject
+
+SYLLABLES = "al be co da el fi go ha in jo ka lu mo ne or pa qu ri so tu va we xi yo za".split()
+FRAMEWORKS = ["SWOT analysis of", "PESTLE for", "Porter's five forces of", "business model canvas for", "tows matrix"]
+SUFFIXES = ["Inc", "Group", "Holdings", "Motors", "Energy", "Labs", ""]
+
+
+def company_names(n, rng):
+    # Unique stems; a shared stem with another suffix is arguably the same company
+    stems = set()
+    while len(stems) < n:
+        stems.add("".join(rng.choice(SYLLABLES) for _ in range(4)))
+    names = [(stem + " " + rng.choice(SUFFIXES)).strip() for stem in stems]
+    rng.shuffle(names)
+    return names
+
+
+def main(sizes=(1_000, 10_000, 50_000), queries=500):
+    rng = random.Random(3)
+    sources = fake_results(n=4, page_chars=1000)
+    for n in sizes:
+        directory = tempfile.mkdtemp()
+        index = VectorIndex(directory)
+        names = company_names(n + queries, rng)
+        indexed, unseen = names[:n], names[n:]
+        started = time.perf_counter()
+        batch = []
+        for i, name in enumerate(indexed):
+            batch.append({"key": f"r{i}", "text": normalize_subject(name), "title": f"SWOT analysis: {name}",
+                          "content": "report", "sources": sources, "created_at": time.time()})
+        index.add(batch)
+        build_s = time.perf_counter() - started
+
+        probe = rng.sample(indexed, min(queries, n))
+        hits, latencies = 0, []
+        for name in probe:
+            # Half of the queries drop the suffix ("Ford" for "Ford Motors")
+            asked = name if rng.random() < 0.5 else name.split()[0]
+            query = f"{rng.choice(FRAMEWORKS)} {asked} 2025"
+            started = time.perf_counter()
+            top = index.search(normalize_subject(query), k=1)[0]
+            latencies.append(time.perf_counter() - started)
+            hits += top["title"] == f"SWOT analysis: {name}"
+        false_positives = sum(index.retrieve(f"SWOT of {name}") is not None for name in unseen)
+        latencies.sort()
+        print(f"N={n:>6}  build {build_s:6.2f}s  recall@1 {hits / len(probe):6.1%}  "
+              f"false positives {false_positives / len(unseen):5.1%}  "
+              f"p50 {latencies[len(latencies) // 2] * 1000:6.2f} ms  p99 {latencies[int(len(latencies) * 0.99)] * 1000:6.2f} ms")
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
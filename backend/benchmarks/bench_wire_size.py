@@ -0,0 +1,96 @@
+# bench_wire_size.py
+"""
+Bytes on the wire for the /analyze/ responses of a 20-turn chat (markdown reports of ~6 KB)
+with full_history versus delta responses, each uncompressed, gzip and Brotli, plus a
+revalidated read of the conversation's turns through its ETag.
+"""
+import contextlib
+import io
+from fastapi.testclient import TestClient
+from _fixtures import fake_report
+import main
+from worker_app import MemoryCollection
+
+TURNS = 20
+
+
+class FakeChain:
+    def __init__(self):
+        self.turn = 0
+
+    def invoke(self, state):
+        self.turn += 1
+        return {"messages": state["messages"] + [("ai", fake_report(chars=6000, seed=self.turn))]}
+
+
+class TurnsCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, *args):
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def __aiter__(self):
+        for doc in self.docs:
+            yield dict(doc)
+
+
+class TurnsCollection(MemoryCollection):
+    """Enough of find_one(), update_many() and find() for /analyze/ and /discussions/{id}/turns"""
+
+    async def find_one(self, filter=None, projection=None, sort=None):
+        if filter and "conversation_id" in filter:
+            docs = [d for d in self.docs.values() if d.get("conversation_id") == filter["conversation_id"]]
+            return max(docs, key=lambda d: d["turn_index"], default=None)
+        return await super().find_one(filter, sort=sort)
+
+    async def update_many(self, filter, update):
+        for doc in self.docs.values():
+            if doc.get("conversation_id") == filter["conversation_id"] and doc["turn_index"] < filter["turn_index"]["$lt"]:
+                doc.update(update["$set"])
+
+    def find(self, filter=None, projection=None):
+        docs = [d for d in self.docs.values() if d.get("conversation_id") == filter["conversation_id"]]
+        return TurnsCursor([{k: d[k] for k in ("_id", *projection) if k in d} for d in docs])
+
+
+def run_chat(client, delta, encoding):
+    main.get_analysis_chain = lambda chain=FakeChain(): chain
+    main.get_db_collections = lambda cols=(TurnsCollection(), MemoryCollection(), MemoryCollection()): cols
+    messages, conversation_id, wire = [], None, 0
+    for turn in range(TURNS):
+        payload = {"messages": messages, "user_input": f"question {turn}", "delta": delta}
+        if conversation_id:
+            payload["conversation_id"] = conversation_id
+        r = client.post("/analyze/", json=payload, headers={"Accept-Encoding": encoding})
+        wire += r.num_bytes_downloaded
+        body = r.json()
+        conversation_id = body["conversation_id"]
+        messages = messages + [("human", f"question {turn}"), ("ai", body["response"])]
+    return wire, conversation_id
+
+
+def main_():
+    client = TestClient(main.app)
+    baseline = None
+    with contextlib.redirect_stdout(io.StringIO()):  # analyze prints debugging output
+        rows = [(delta, encoding, run_chat(client, delta, encoding))
+                for delta in (False, True) for encoding in ("identity", "gzip", "br")]
+    for delta, encoding, (wire, conversation_id) in rows:
+        baseline = baseline or wire
+        label = "delta" if delta else "full_history"
+        print(f"{label:>12} {encoding:>8}: {wire / 1024:8.1f} KiB  ({1 - wire / baseline:6.1%} smaller)")
+
+    url = f"/discussions/{conversation_id}/turns"
+    first = client.get(url, headers={"Accept-Encoding": "br"})
+    again = client.get(url, headers={"Accept-Encoding": "br", "If-None-Match": first.headers["etag"]})
+    print(f"turns read: {first.num_bytes_downloaded / 1024:.1f} KiB, revalidated: "
+          f"{again.num_bytes_downloaded} bytes (HTTP {again.status_code})")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,79 @@
+# bench_workers.py
+"""
+Throughput of /analyze/ under gunicorn with 1..N uvicorn workers. The chain is faked by
+worker_app.py: a blocking upstream wait (BENCH_UPSTREAM_MS, default 50 ms) followed by real
+markdown post-processing, which is what a worker spends its time on in production.
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DURATION = 5.0
+CONCURRENCY = 32
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(url, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url + "/", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+async def load(url):
+    latencies, deadline = [], time.monotonic() + DURATION
+    async with httpx.AsyncClient(base_url=url, timeout=60.0) as client:
+        async def user():
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                # Distinct inputs, so concurrent requests are not coalesced into one run
+                payload = {"messages": [], "user_input": f"swot of company {len(latencies)}-{started}"}
+                r = await client.post("/analyze/", json=payload)
+                r.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+        await asyncio.gather(*(user() for _ in range(CONCURRENCY)))
+    latencies.sort()
+    return len(latencies) / DURATION, latencies[len(latencies) // 2]
+
+
+def main():
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else max(4, os.cpu_count() or 1)
+    counts = sorted({1, 2, 4, max_workers} - {w for w in (2, 4) if w > max_workers})
+    print(f"cpus={os.cpu_count()} concurrency={CONCURRENCY} duration={DURATION}s\n")
+    print(f"{'workers':>8}{'req/s':>10}{'p50 ms':>10}{'speedup':>9}")
+    base = None
+    for workers in counts:
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "worker_app:app", "-k", "uvicorn.workers.UvicornWorker",
+             "-w", str(workers), "-b", f"127.0.0.1:{port}", "--log-level", "warning"],
+            cwd=HERE, env=dict(os.environ, VECTOR_INDEX_ENABLED="0", ANALYZE_MAX_IN_FLIGHT="0"),
+            stdout=subprocess.DEVNULL,
+        )
+        try:
+            url = f"http://127.0.0.1:{port}"
+            wait_until_up(url)
+            rps, p50 = asyncio.run(load(url))
+        finally:
+            server.terminate()
+            server.wait()
+        base = base or rps
+        print(f"{workers:>8}{rps:>10.1f}{p50 * 1000:>10.0f}{rps / base:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
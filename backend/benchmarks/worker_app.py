@@ -0,0 +1,67 @@
+# worker_app.py
+"""
+ASGI app for the worker-scaling benchmark: the real main.app with a fake chain (a blocking
+upstream wait plus real post-processing work) and an in-memory discussion store.
+"""
+import os
+import time
+from _fixtures import fake_report
+import main
+from postprocess import sanitize_markdown
+
+UPSTREAM_SECONDS = float(os.getenv("BENCH_UPSTREAM_MS", 50)) / 1000
+CPU_SECONDS = float(os.getenv("BENCH_CPU_MS", 0)) / 1000  # GIL-holding work per call (parsing, prompts)
+REPORT = fake_report(chars=20_000)
+
+
+class FakeChain:
+    def invoke(self, state):
+        time.sleep(UPSTREAM_SECONDS)  # stands in for the blocking Gemini/Tavily calls
+        deadline = time.thread_time() + CPU_SECONDS
+        while time.thread_time() < deadline:
+            pass
+        return {"messages": state["messages"] + [("ai", sanitize_markdown(REPORT))]}
+
+
+class MemoryCollection:
+    def __init__(self):
+        self.docs = {}
+
+    async def insert_one(self, doc):
+        from bson import ObjectId
+        doc["_id"] = ObjectId()
+        self.docs[doc["_id"]] = doc
+        return type("R", (), {"inserted_id": doc["_id"]})()
+
+    async def find_one(self, filter=None, sort=None, **kwargs):
+        if filter and "_id" in filter:
+            return self.docs.get(filter["_id"])
+        return None
+
+    async def update_one(self, filter, update):
+        return None
+
+    def find(self, filter=None, projection=None):
+        return MemoryCursor(list(self.docs.values()))
+
+
+class MemoryCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, *args):
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def __aiter__(self):
+        for doc in self.docs:
+            yield doc
+
+
+_collections = (MemoryCollection(), MemoryCollection(), MemoryCollection())
+main.get_db_collections = lambda: _collections
+main.get_analysis_chain = lambda: FakeChain()
+app = main.app
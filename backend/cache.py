@@ -0,0 +1,141 @@
+#cache.py
+"""
+Cache backends shared by the workflow and search caches.
+
+CACHE_BACKEND selects the implementation:
+- ``memory`` (default): a per-process LRU dict, right for a single uvicorn process
+- ``mongo``: the ``Cache_data`` collection in the app database with a TTL index, shared by all
+  workers and instances
+- ``redis``: any Redis-compatible server at CACHE_URL (redis, valkey, dragonfly, ...), shared by
+  the workers on a host; needs the optional ``redis`` package
+
+Values must be JSON-serializable. The graph runs synchronously, so every backend is synchronous;
+async code calls them through run_in_threadpool so a mongo/redis round trip does not block the loop.
+"""
+import hashlib
+import json
+from abc import ABC, abstractmethod
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+load_dotenv()
+
+
+def cache_key(namespace, *parts):
+    """Stable key for a namespace and any JSON-serializable parts"""
+    digest = hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+    return f"{namespace}:{digest}"
+
+
+class CacheBackend(ABC):
+    """Interface: ``get`` returns None on a miss, ``set`` stores a value for ``ttl`` seconds"""
+
+    @abstractmethod
+    def get(self, key):
+        ...
+
+    @abstractmethod
+    def set(self, key, value, ttl):
+        ...
+
+    @abstractmethod
+    def delete(self, key):
+        ...
+
+
+class MemoryCache(CacheBackend):
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class MongoCache(CacheBackend):
+    def __init__(self, collection):
+        self.collection = collection
+        # Mongo's TTL monitor removes expired documents in the background (about once a minute);
+        # reads also check the expiry so stale values are never returned
+        self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    def get(self, key):
+        doc = self.collection.find_one({"_id": key, "expires_at": {"$gt": datetime.utcnow()}})
+        return json.loads(doc["value"]) if doc else None
+
+    def set(self, key, value, ttl):
+        self.collection.replace_one(
+            {"_id": key},
+            {"value": json.dumps(value), "expires_at": datetime.utcnow() + timedelta(seconds=ttl)},
+            upsert=True,
+        )
+
+    def delete(self, key):
+        self.collection.delete_one({"_id": key})
+
+
+class RedisCache(CacheBackend):
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key):
+        value = self.client.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(key, json.dumps(value), ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+
+def create_cache(backend=None):
+    backend = (backend or os.getenv("CACHE_BACKEND", "memory")).lower()
+    if backend == "mongo":
+        from pymongo import MongoClient
+        mongodb_url = os.getenv("MONGODB_URL")
+        if not mongodb_url:
+            raise ValueError("MONGODB_URL environment variable not set")
+        return MongoCache(MongoClient(mongodb_url).Consulting_data.get_collection("Cache_data"))
+    if backend == "redis":
+        import redis
+        return RedisCache(redis.Redis.from_url(os.getenv("CACHE_URL", "redis://localhost:6379/0")))
+    return MemoryCache(int(os.getenv("CACHE_MAX_ENTRIES", 1024)))
+
+
+# Lazy, per-process handle; with mongo/redis the cached data itself is shared between processes
+_cache = None
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        try:
+            _cache = create_cache()
+        except Exception as e:
+            print(f"Falling back to in-memory cache: {str(e)}")
+            _cache = MemoryCache()
+    return _cache
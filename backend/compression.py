@@ -0,0 +1,97 @@
+#compression.py
+"""
+Response compression for the API.
+
+Chat and plan responses are mostly markdown and JSON, which compress 5-10x. Clients that accept
+Brotli get it when the optional ``brotli`` package is installed; everyone else gets gzip through
+Starlette's GZipMiddleware. Bodies smaller than ``minimum_size`` are sent as-is, since the
+headers would outweigh the savings. Streamed bodies (e.g. NDJSON) skip Brotli and are gzipped
+with a sync flush after every chunk, so each line reaches the client as soon as it is sent.
+"""
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size=1000, gzip_level=6, brotli_quality=5):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.brotli_quality = brotli_quality
+        self.gzip = StreamingGZipMiddleware(app, minimum_size=minimum_size, compresslevel=gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and brotli is not None:
+            accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+            if "br" in [part.split(";")[0].strip() for part in accept_encoding.split(",")]:
+                await BrotliResponder(self.app, self.minimum_size, self.brotli_quality)(scope, receive, send)
+                return
+        await self.gzip(scope, receive, send)
+
+
+class StreamingGZipMiddleware(GZipMiddleware):
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and "gzip" in Headers(scope=scope).get("accept-encoding", ""):
+            await SyncFlushGZipResponder(self.app, self.minimum_size, self.compresslevel)(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+class SyncFlushGZipResponder(GZipResponder):
+    """GZipResponder that flushes after each streamed chunk instead of buffering until the end."""
+
+    def apply_compression(self, body, *, more_body):
+        if not more_body:
+            return super().apply_compression(body, more_body=False)
+        self.gzip_file.write(body)
+        self.gzip_file.flush(zlib.Z_SYNC_FLUSH)
+        body = self.gzip_buffer.getvalue()
+        self.gzip_buffer.seek(0)
+        self.gzip_buffer.truncate()
+        return body
+
+
+class BrotliResponder:
+    """Compresses a complete (single-message) response body; streamed bodies pass through."""
+
+    def __init__(self, app, minimum_size, quality):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.quality = quality
+        self.send = None
+        self.start_message = None
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_with_brotli)
+
+    async def send_with_brotli(self, message):
+        if message["type"] == "http.response.start":
+            # Hold the headers until the first body chunk tells us whether to compress
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body" or self.start_message is None:
+            await self.send(message)
+            return
+
+        start, self.start_message = self.start_message, None
+        headers = MutableHeaders(raw=start["headers"])
+        body = message.get("body", b"")
+        if (message.get("more_body", False) or len(body) < self.minimum_size
+                or "content-encoding" in headers):
+            await self.send(start)
+            await self.send(message)
+            return
+
+        body = brotli.compress(body, quality=self.quality)
+        headers["Content-Encoding"] = "br"
+        headers["Content-Length"] = str(len(body))
+        headers.add_vary_header("Accept-Encoding")
+        await self.send(start)
+        await self.send({"type": "http.response.body", "body": body})
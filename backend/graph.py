@@ -1,287 +1,334 @@
-from typing import TypedDict, List, Dict, Any
+from typing import TypedDict, NotRequired, List, Dict, Any
 from langgraph.graph import StateGraph, START, END
 from langchain_community.tools.tavily_search import TavilySearchResults
-from langchain_google_genai import ChatGoogleGenerativeAI
+from model_tiering import get_model_router
+from search_gate import get_search_gate
+from sources import serialize_sources, serialize_history
+from postprocess import sanitize_markdown, validate_citations, format_source_links
+from vector_index import get_vector_index, format_internal_notes
+from cache import get_cache, cache_key
 import os
-import re
+import time
 from dotenv import load_dotenv
 load_dotenv()
 
 class ConversationState(TypedDict):
     messages: list
     input: str
+    route: NotRequired[str]  # forces a node (e.g. "swot" for batch runs) instead of keyword routing
+
+# Framework nodes: route name -> analysis type used in the search query and prompt
+FRAMEWORK_ROUTES = {
+    "swot": "SWOT",
+    "pestle": "PESTLE",
+    "tows": "TOWS matrix",
+    "porter": "Porter's Five Forces",
+    "canvas": "Business Model Canvas",
+}
+
+def build_analysis_prompt(analysis_type, subject, sources):
+    """Prompt for a framework report; ``sources`` is the serialized search context"""
+    # Create detailed instructions based on analysis type
+    if analysis_type == "Porter's Five Forces":
+        return f"""
+        Generate a comprehensive Porter's Five Forces analysis in markdown format for: {subject}
+
+        Do NOT wrap your entire response in ```markdown or ```md code blocks. 
+        Write the content directly using markdown syntax.
+
+        IMPORTANT: Include in-text citations using the format [X] where X is the source number (1, 2, 3, etc.).
+        For example: "According to recent market research [1], the industry has shown significant growth."
+        Make sure to cite sources for factual information, statistics, and specific claims.
+
+        Structure your analysis with the following sections:
+
+        1. # Porter's Five Forces Analysis
+
+        2. ## Introduction
+           - Brief overview of the industry/company being analyzed
+           - Why this analysis is important for strategic decision-making
+
+        3. ## Competitive Rivalry
+           - Assess the intensity of competition among existing firms
+           - Consider: number of competitors, industry growth rate, product differentiation, exit barriers, fixed costs
+           - Rate this force (High/Medium/Low) with justification
+
+        4. ## Threat of New Entrants
+           - Evaluate how easy it is for new competitors to enter the market
+           - Consider: economies of scale, capital requirements, access to distribution, brand loyalty, regulations
+           - Rate this force (High/Medium/Low) with justification
+
+        5. ## Bargaining Power of Suppliers
+           - Analyze how much leverage suppliers have in the relationship
+           - Consider: number of suppliers, uniqueness of their product/service, switching costs, forward integration
+           - Rate this force (High/Medium/Low) with justification
+
+        6. ## Bargaining Power of Buyers
+           - Assess how much leverage customers have in the relationship
+           - Consider: number of buyers, purchase volume, price sensitivity, product differentiation, switching costs
+           - Rate this force (High/Medium/Low) with justification
+
+        7. ## Threat of Substitutes
+           - Evaluate the availability of alternative products/services
+           - Consider: price-performance of substitutes, switching costs, buyer propensity to substitute
+           - Rate this force (High/Medium/Low) with justification
+
+        8. ## Overall Assessment
+           - Summarize the findings from all five forces
+           - Provide an overall industry attractiveness rating
+           - Identify key strategic implications for businesses in this industry
+
+        9. ## Strategic Recommendations
+           - Suggest 3-5 specific strategies to address the challenges and opportunities identified
+           - Make these actionable and specific to the industry context
+
+        Use the following information from web searches to inform your analysis:
+        {sources}
+        """
+    elif analysis_type == "Business Model Canvas":
+        return f"""
+        Generate a comprehensive Business Model Canvas analysis in markdown format for: {subject}
+
+        Do NOT wrap your entire response in ```markdown or ```md code blocks. 
+        Write the content directly using markdown syntax.
+
+        IMPORTANT: Include in-text citations using the format [X] where X is the source number (1, 2, 3, etc.).
+        For example: "According to recent market research [1], the industry has shown significant growth."
+        Make sure to cite sources for factual information, statistics, and specific claims.
+
+        Structure your analysis with the following sections:
+
+        1. # Business Model Canvas Analysis
+
+        2. ## Introduction
+           - Brief overview of the company/business being analyzed
+           - Purpose and value of using the Business Model Canvas for this analysis
+
+        3. ## Customer Segments
+           - Identify the different groups of people or organizations the business aims to reach and serve
+           - Analyze whether they target mass market, niche market, segmented, diversified, or multi-sided platforms
+           - Provide specific examples of customer types and their characteristics
+
+        4. ## Value Propositions
+           - Describe the bundle of products and services that create value for each customer segment
+           - Analyze how the business solves customer problems or satisfies customer needs
+           - Evaluate what makes their offering unique compared to competitors
+
+        5. ## Channels
+           - Identify how the company communicates with and reaches its customer segments
+           - Analyze the customer touch points (awareness, evaluation, purchase, delivery, after-sales)
+           - Evaluate the effectiveness of these channels
+
+        6. ## Customer Relationships
+           - Describe the types of relationships the company establishes with specific customer segments
+           - Analyze whether they use personal assistance, dedicated personal assistance, self-service, automated services, communities, or co-creation
+           - Evaluate how these relationships integrate with the rest of the business model
+
+        7. ## Revenue Streams
+           - Identify how the company generates cash from each customer segment
+           - Analyze pricing mechanisms (fixed pricing, dynamic pricing, etc.)
+           - Evaluate the sustainability and diversity of revenue streams
+
+        8. ## Key Resources
+           - Describe the most important assets required to make the business model work
+           - Categorize them as physical, intellectual, human, or financial resources
+           - Analyze how these resources support the value proposition
+
+        9. ## Key Activities
+           - Identify the most important things the company must do to make its business model work
+           - Categorize them as production, problem-solving, or platform/network activities
+           - Evaluate how well these activities are executed
+
+        10. ## Key Partnerships
+            - Describe the network of suppliers and partners that make the business model work
+            - Analyze the types of partnerships (strategic alliances, coopetition, joint ventures, buyer-supplier relationships)
+            - Evaluate the effectiveness of these partnerships
+
+        11. ## Cost Structure
+            - Describe all costs incurred to operate the business model
+            - Analyze whether the business is cost-driven or value-driven
+            - Identify fixed costs, variable costs, economies of scale, and economies of scope
+
+        12. ## Strategic Insights and Recommendations
+            - Provide an overall assessment of the business model's strengths and weaknesses
+            - Identify opportunities for innovation or improvement in each of the nine building blocks
+            - Suggest 3-5 specific strategies to enhance the business model
+
+        Use the following information from web searches to inform your analysis:
+        {sources}
+        """
+    else:
+        # Create detailed instructions to ensure proper markdown formatting
+        return f"""
+        Generate a comprehensive {analysis_type} analysis in markdown format using the information provided below.
+
+        Do NOT wrap your entire response in ```markdown or ```md code blocks. 
+        Write the content directly using markdown syntax.
+
+        IMPORTANT: Include in-text citations using the format [X] where X is the source number (1, 2, 3, etc.).
+        For example: "According to recent market research [1], the industry has shown significant growth."
+        Make sure to cite sources for factual information, statistics, and specific claims.
+
+        Follow these markdown formatting guidelines:
+        1. Use # for main headings and ## or ### for subheadings
+        2. Use bullet points (- or *) for lists of items
+        3. Use numbered lists (1., 2., etc.) for sequential steps or prioritized items
+        4. Use **bold** for emphasis on important points
+        5. Use tables with | and --- syntax where appropriate for organized data
+        6. Use `code` for any technical terms
+
+        Structure your analysis with clear sections and proper formatting.
+
+        Information for analysis:
+        {sources}
+        """
+
+def build_general_prompt(history, user_input, sources):
+    """Prompt for the general chat node; ``history`` and ``sources`` are already serialized"""
+    return f"""
+    Respond to the user's message using proper markdown formatting.
+
+    Do NOT wrap your response in ```markdown or ```md code blocks.
+    Write the content directly using markdown syntax.
+
+    IMPORTANT: Include in-text citations using the format [X] where X is the source number (1, 2, 3, etc.).
+    For example: "According to recent market research [1], the industry has shown significant growth."
+    Make sure to cite sources for factual information, statistics, and specific claims.
+
+    Use these markdown elements appropriately:
+    - Headings with # or ##
+    - Lists with - or *
+    - Emphasis with **bold** or *italic*
+    - Tables with | and --- where appropriate
+
+    User's message history:
+    {history}
+    Latest message: {user_input}
+
+    Here is some relevant information that might help with your response:
+    {sources}
+    """
+
+SEARCH_MAX_RESULTS = 5
+
+def create_search_tool():
+    return TavilySearchResults(max_results=SEARCH_MAX_RESULTS)
+
+def route_for(state):
+    """Node for a state: an explicit valid route, else the first framework named in the input"""
+    if state.get("route") in FRAMEWORK_ROUTES or state.get("route") == "general":
+        return state["route"]
+    input_text = state["input"].lower()
+    return next((key for key in FRAMEWORK_ROUTES if key in input_text), "general")
+
+def search_query(route, user_input):
+    """Web search query a node runs for the input (the cache key used by /prefetch as well)"""
+    if route in FRAMEWORK_ROUTES:
+        return f"{FRAMEWORK_ROUTES[route]} analysis of {user_input} 2025"
+    return user_input
+
+def search_cache_ttl():
+    return float(os.getenv("SEARCH_CACHE_TTL_SECONDS", 3600))
+
+def cached_search(search_tool, query, search_gate, record=True):
+    """
+    Web search results for ``query``, kept in the shared cache for SEARCH_CACHE_TTL_SECONDS so
+    every worker (and every repeat of a query) reuses them instead of calling Tavily again.
+    ``record=False`` leaves the search gate counters alone (used by speculative prefetch).
+    """
+    ttl = search_cache_ttl()
+    cache = get_cache()
+    key = cache_key("search", " ".join(query.lower().split()))
+    if ttl > 0:
+        try:
+            cached = cache.get(key)
+        except Exception as e:
+            print(f"Search cache read failed: {e}")
+            cached = None
+        if cached is not None:
+            if record:
+                search_gate.record_cache_hit()
+            return cached
+
+    started = time.perf_counter()
+    results = search_tool.invoke(query)
+    if record:
+        search_gate.record_search(time.perf_counter() - started)
+    # Tavily reports errors as a string; only real result lists are cached
+    if ttl > 0 and isinstance(results, list):
+        try:
+            cache.set(key, results, ttl)
+        except Exception as e:
+            print(f"Search cache write failed: {e}")
+    return results
 
 def initialize_workflow():
-    # Initialize AI components
-    llm = ChatGoogleGenerativeAI(model="gemini-2.0-pro-exp-02-05")
-    search_tool = TavilySearchResults(max_results=5)
+    # Initialize AI components. The router picks a model per route (flash for general chat,
+    # pro for framework reports) and falls back to a faster model on latency SLO breaches
+    model_router = get_model_router()
+    search_gate = get_search_gate()
+    search_tool = create_search_tool()
+    vector_index = get_vector_index()
 
     # Create workflow graph
     workflow = StateGraph(ConversationState)
     
-    # Function to sanitize markdown responses
-    def sanitize_markdown(text):
-        # Remove any accidental triple backticks that might wrap the entire response
-        text = re.sub(r'^```markdown\s*', '', text)
-        text = re.sub(r'^```md\s*', '', text)
-        text = re.sub(r'\s*```$', '', text)
-        
-        # Ensure proper spacing for markdown elements
-        text = re.sub(r'(?<!\n)#{1,6}\s', r'\n\g<0>', text)  # Add newline before headers if missing
-        
-        return text.strip()
-    
-    # Function to format source links in markdown with numbered citations
-    def format_source_links(results):
-        if not results:
-            return ""
-            
-        sources = []
-        seen_urls = set()
-        
-        for i, result in enumerate(results, 1):
-            try:
-                # Extract URL and title from each result
-                url = None
-                title = None
-                metadata = {}
-                
-                if isinstance(result, dict):
-                    if 'url' in result and 'title' in result:
-                        url = result['url']
-                        title = result['title']
-                        metadata = result.get('metadata', {})
-                    elif isinstance(result.get('metadata'), dict):
-                        metadata = result['metadata']
-                        url = metadata.get('source', metadata.get('url', ''))
-                        title = metadata.get('title', url)
-                elif hasattr(result, 'metadata') and hasattr(result, 'page_content'):
-                    metadata = result.metadata
-                    url = metadata.get('source', metadata.get('url', ''))
-                    title = metadata.get('title', url)
-                else:
-                    continue
-                
-                # Clean the title and url
-                title = str(title).strip().replace('\n', ' ').replace('"', "'") if title else ""
-                url = str(url).strip() if url else ""
-                
-                # Avoid duplicate URLs and empty/invalid entries
-                if url and url not in seen_urls and title:
-                    seen_urls.add(url)
-                    # Format source with proper citation style
-                    sources.append(f"{i}. [{title}]({url})")
-            except Exception as e:
-                print(f"Error processing source {i}: {e}")
-                continue
-        
-        if not sources:
-            return ""
-            
-        # Create a proper sources section with a header
-        return "\n\n### Sources\n" + "\n".join(sources)
-
     # Define analysis functions
-    def analysis_node_factory(analysis_type: str):
+    def analysis_node_factory(route: str, analysis_type: str):
         def analysis_node(state):
-            query = f"{analysis_type} analysis of {state['input']} 2025"
-            results = search_tool.invoke(query)
-            
-            # Create detailed instructions based on analysis type
-            if analysis_type == "Porter's Five Forces":
-                markdown_instructions = f"""
-                Generate a comprehensive Porter's Five Forces analysis in markdown format for: {state['messages'][-1][1]}
-                
-                Do NOT wrap your entire response in ```markdown or ```md code blocks. 
-                Write the content directly using markdown syntax.
-                
-                IMPORTANT: Include in-text citations using the format [X] where X is the source number (1, 2, 3, etc.).
-                For example: "According to recent market research [1], the industry has shown significant growth."
-                Make sure to cite sources for factual information, statistics, and specific claims.
-                
-                Structure your analysis with the following sections:
-                
-                1. # Porter's Five Forces Analysis
-                
-                2. ## Introduction
-                   - Brief overview of the industry/company being analyzed
-                   - Why this analysis is important for strategic decision-making
-                
-                3. ## Competitive Rivalry
-                   - Assess the intensity of competition among existing firms
-                   - Consider: number of competitors, industry growth rate, product differentiation, exit barriers, fixed costs
-                   - Rate this force (High/Medium/Low) with justification
-                
-                4. ## Threat of New Entrants
-                   - Evaluate how easy it is for new competitors to enter the market
-                   - Consider: economies of scale, capital requirements, access to distribution, brand loyalty, regulations
-                   - Rate this force (High/Medium/Low) with justification
-                
-                5. ## Bargaining Power of Suppliers
-                   - Analyze how much leverage suppliers have in the relationship
-                   - Consider: number of suppliers, uniqueness of their product/service, switching costs, forward integration
-                   - Rate this force (High/Medium/Low) with justification
-                
-                6. ## Bargaining Power of Buyers
-                   - Assess how much leverage customers have in the relationship
-                   - Consider: number of buyers, purchase volume, price sensitivity, product differentiation, switching costs
-                   - Rate this force (High/Medium/Low) with justification
-                
-                7. ## Threat of Substitutes
-                   - Evaluate the availability of alternative products/services
-                   - Consider: price-performance of substitutes, switching costs, buyer propensity to substitute
-                   - Rate this force (High/Medium/Low) with justification
-                
-                8. ## Overall Assessment
-                   - Summarize the findings from all five forces
-                   - Provide an overall industry attractiveness rating
-                   - Identify key strategic implications for businesses in this industry
-                
-                9. ## Strategic Recommendations
-                   - Suggest 3-5 specific strategies to address the challenges and opportunities identified
-                   - Make these actionable and specific to the industry context
-                
-                Use the following information from web searches to inform your analysis:
-                {results}
-                """
-            elif analysis_type == "Business Model Canvas":
-                markdown_instructions = f"""
-                Generate a comprehensive Business Model Canvas analysis in markdown format for: {state['messages'][-1][1]}
-                
-                Do NOT wrap your entire response in ```markdown or ```md code blocks. 
-                Write the content directly using markdown syntax.
-                
-                IMPORTANT: Include in-text citations using the format [X] where X is the source number (1, 2, 3, etc.).
-                For example: "According to recent market research [1], the industry has shown significant growth."
-                Make sure to cite sources for factual information, statistics, and specific claims.
-                
-                Structure your analysis with the following sections:
-                
-                1. # Business Model Canvas Analysis
-                
-                2. ## Introduction
-                   - Brief overview of the company/business being analyzed
-                   - Purpose and value of using the Business Model Canvas for this analysis
-                
-                3. ## Customer Segments
-                   - Identify the different groups of people or organizations the business aims to reach and serve
-                   - Analyze whether they target mass market, niche market, segmented, diversified, or multi-sided platforms
-                   - Provide specific examples of customer types and their characteristics
-                
-                4. ## Value Propositions
-                   - Describe the bundle of products and services that create value for each customer segment
-                   - Analyze how the business solves customer problems or satisfies customer needs
-                   - Evaluate what makes their offering unique compared to competitors
-                
-                5. ## Channels
-                   - Identify how the company communicates with and reaches its customer segments
-                   - Analyze the customer touch points (awareness, evaluation, purchase, delivery, after-sales)
-                   - Evaluate the effectiveness of these channels
-                
-                6. ## Customer Relationships
-                   - Describe the types of relationships the company establishes with specific customer segments
-                   - Analyze whether they use personal assistance, dedicated personal assistance, self-service, automated services, communities, or co-creation
-                   - Evaluate how these relationships integrate with the rest of the business model
-                
-                7. ## Revenue Streams
-                   - Identify how the company generates cash from each customer segment
-                   - Analyze pricing mechanisms (fixed pricing, dynamic pricing, etc.)
-                   - Evaluate the sustainability and diversity of revenue streams
-                
-                8. ## Key Resources
-                   - Describe the most important assets required to make the business model work
-                   - Categorize them as physical, intellectual, human, or financial resources
-                   - Analyze how these resources support the value proposition
-                
-                9. ## Key Activities
-                   - Identify the most important things the company must do to make its business model work
-                   - Categorize them as production, problem-solving, or platform/network activities
-                   - Evaluate how well these activities are executed
-                
-                10. ## Key Partnerships
-                    - Describe the network of suppliers and partners that make the business model work
-                    - Analyze the types of partnerships (strategic alliances, coopetition, joint ventures, buyer-supplier relationships)
-                    - Evaluate the effectiveness of these partnerships
-                
-                11. ## Cost Structure
-                    - Describe all costs incurred to operate the business model
-                    - Analyze whether the business is cost-driven or value-driven
-                    - Identify fixed costs, variable costs, economies of scale, and economies of scope
-                
-                12. ## Strategic Insights and Recommendations
-                    - Provide an overall assessment of the business model's strengths and weaknesses
-                    - Identify opportunities for innovation or improvement in each of the nine building blocks
-                    - Suggest 3-5 specific strategies to enhance the business model
-                
-                Use the following information from web searches to inform your analysis:
-                {results}
-                """
+            query = search_query(route, state['input'])
+            # Answer repeat subjects from earlier analyses, search the web only when they fall short
+            internal = vector_index.retrieve(state['input']) if vector_index is not None else None
+            if internal is not None:
+                results, notes = internal
             else:
-                # Create detailed instructions to ensure proper markdown formatting
-                markdown_instructions = f"""
-                Generate a comprehensive {analysis_type} analysis in markdown format using the information provided below.
-                
-                Do NOT wrap your entire response in ```markdown or ```md code blocks. 
-                Write the content directly using markdown syntax.
-                
-                IMPORTANT: Include in-text citations using the format [X] where X is the source number (1, 2, 3, etc.).
-                For example: "According to recent market research [1], the industry has shown significant growth."
-                Make sure to cite sources for factual information, statistics, and specific claims.
-                
-                Follow these markdown formatting guidelines:
-                1. Use # for main headings and ## or ### for subheadings
-                2. Use bullet points (- or *) for lists of items
-                3. Use numbered lists (1., 2., etc.) for sequential steps or prioritized items
-                4. Use **bold** for emphasis on important points
-                5. Use tables with | and --- syntax where appropriate for organized data
-                6. Use `code` for any technical terms
-                
-                Structure your analysis with clear sections and proper formatting.
-                
-                Information for analysis:
-                {results}
-                """
+                results, notes = cached_search(search_tool, query, search_gate), []
+            
+            subject = state['messages'][-1][1] if state['messages'] else state['input']
+            markdown_instructions = build_analysis_prompt(
+                analysis_type, subject,
+                serialize_sources(results, query=state['input']) + format_internal_notes(notes)
+            )
             
-            response = llm.invoke(markdown_instructions)
-            sanitized_response = sanitize_markdown(response.content)
+            response = model_router.invoke(route, markdown_instructions)
+            sanitized_response, _ = validate_citations(sanitize_markdown(response.content), results)
             
             # Add source links to the response
             source_links = format_source_links(results)
             final_response = sanitized_response + source_links
+
+            # Reports built on internal sources are not indexed again: that would stamp the reused
+            # sources as new and VECTOR_MAX_AGE_DAYS would never send the subject back to the web
+            if vector_index is not None and internal is None:
+                try:
+                    vector_index.add_analysis(analysis_type, state['input'], final_response, results)
+                except Exception as e:
+                    print(f"Error indexing analysis: {e}")
             
             return {"messages": state["messages"] + [("ai", final_response)]}
         return analysis_node
     
     # Define general node function
     def general_node(state):
-        # Get search results for the user's input
-        search_results = search_tool.invoke(state['input'])
+        # Get search results for the user's input, unless the follow-up can be answered from
+        # the conversation (then reuse the sources cited in the previous answer)
+        decision = search_gate.decide(state['input'], state['messages'])
+        if decision.search:
+            search_results = cached_search(search_tool, search_query("general", state['input']), search_gate)
+        else:
+            search_results = decision.sources
+            search_gate.record_skip(decision)
         
         # Generate response with LLM
-        response_content = sanitize_markdown(llm.invoke(
-            f"""
-            Respond to the user's message using proper markdown formatting.
-            
-            Do NOT wrap your response in ```markdown or ```md code blocks.
-            Write the content directly using markdown syntax.
-            
-            IMPORTANT: Include in-text citations using the format [X] where X is the source number (1, 2, 3, etc.).
-            For example: "According to recent market research [1], the industry has shown significant growth."
-            Make sure to cite sources for factual information, statistics, and specific claims.
-            
-            Use these markdown elements appropriately:
-            - Headings with # or ##
-            - Lists with - or *
-            - Emphasis with **bold** or *italic*
-            - Tables with | and --- where appropriate
-            
-            User's message history: {state['messages']}
-            Latest message: {state['input']}
-            
-            Here is some relevant information that might help with your response:
-            {search_results}
-            """
+        response_content = sanitize_markdown(model_router.invoke(
+            "general",
+            build_general_prompt(
+                serialize_history(state['messages']),
+                state['input'],
+                serialize_sources(search_results, query=state['input']),
+            ),
         ).content)
+        response_content, _ = validate_citations(response_content, search_results)
         
         # Add source links to the response
         source_links = format_source_links(search_results)
@@ -290,22 +337,15 @@ def initialize_workflow():
         return {"messages": state["messages"] + [("ai", final_response)]}
 
     # Create nodes
-    nodes = {
-        "swot": analysis_node_factory("SWOT"),
-        "pestle": analysis_node_factory("PESTLE"),
-        "tows": analysis_node_factory("TOWS matrix"),
-        "porter": analysis_node_factory("Porter's Five Forces"),
-        "canvas": analysis_node_factory("Business Model Canvas"),
-        "general": general_node
-    }
+    nodes = {route: analysis_node_factory(route, analysis_type) for route, analysis_type in FRAMEWORK_ROUTES.items()}
+    nodes["general"] = general_node
 
     for name, node in nodes.items():
         workflow.add_node(name, node)
 
     # Configure routing
     def route_based_on_input(state):
-        input_text = state["input"].lower()
-        return next((key for key in nodes if key in input_text), "general")
+        return route_for(state)
 
     workflow.add_conditional_edges(
         START,
@@ -0,0 +1,37 @@
+# gunicorn.conf.py
+"""
+Production serving profile: gunicorn managing uvicorn workers.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+Each worker is a full event loop, but /analyze/ runs the LangGraph chain synchronously and spends
+most of that time waiting on Gemini/Tavily, so the default is the classic 2 x cores + 1 workers
+(benchmarks/bench_workers.py keeps scaling past the core count). Override with WEB_CONCURRENCY.
+
+Send SIGHUP to the master for a graceful reload: new workers start with the new code and old
+ones finish their in-flight requests within graceful_timeout.
+
+Workers do not share memory, so set CACHE_BACKEND=mongo or CACHE_BACKEND=redis to share the
+search and workflow caches between them.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+
+# Framework reports can take minutes on the pro model
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 300))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 60))
+keepalive = 5
+
+# Recycle workers now and then so slow leaks in third-party clients cannot build up
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = 100
+
+# The Mongo client and the workflow are created lazily inside each worker, never before the fork
+preload_app = False
+
+accesslog = "-"
+errorlog = "-"
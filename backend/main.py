@@ -1,24 +1,65 @@
 #main.py
 from fastapi.middleware.cors import CORSMiddleware
 import os
-from fastapi import FastAPI, Body, Response, Query
+from fastapi import FastAPI, Body, Response, Query, Request, Header, Depends
 from pydantic import BaseModel, Field, EmailStr
 from typing import List, Tuple, Optional
-from graph import initialize_workflow
+from graph import initialize_workflow, FRAMEWORK_ROUTES, route_for
+from model_tiering import get_model_router
+from search_gate import get_search_gate
+from vector_index import get_vector_index
+from prefetch import get_prefetcher
+from singleflight import get_single_flight, flight_key
+from retention import ensure_retention_indexes, load_conversation, run_retention, last_report
+from cache import get_cache, cache_key
+from compression import CompressionMiddleware
+from admission import AdmissionMiddleware, get_admission_controller
+from profiling import ProfilingMiddleware, get_profiling, admin_token_matches
 import motor.motor_asyncio
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from typing_extensions import Annotated
 from pydantic.functional_validators import BeforeValidator
 import uvicorn
 from dotenv import load_dotenv
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
 import pandas as pd
 from fpdf import FPDF 
 from passlib.context import CryptContext
 from fastapi import HTTPException
 from datetime import datetime # Added datetime import
-
-app = FastAPI()
+from contextlib import asynccontextmanager
+import asyncio
+import hashlib
+import tempfile
+import time
+import orjson
+
+@asynccontextmanager
+async def lifespan(app):
+    # Index creation is idempotent; a missing database must not stop the API from starting
+    try:
+        await ensure_discussion_indexes()
+    except Exception as e:
+        print(f"Could not create discussion indexes: {str(e)}")
+    yield
+
+def json_default(value):
+    """orjson fallback: Mongo ObjectIds as strings, anything else the FastAPI way"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    return jsonable_encoder(value)
+
+class MongoJSONResponse(ORJSONResponse):
+    """orjson rendering that also accepts raw Mongo documents (ObjectId, datetime)"""
+    def render(self, content):
+        return orjson.dumps(content, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+
+app = FastAPI(lifespan=lifespan, default_response_class=MongoJSONResponse)
+# Bounded concurrency and queueing for analyses; added first so CORS headers wrap its 503s
+app.add_middleware(AdmissionMiddleware)
 # Added CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -31,7 +72,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Retry-After"],
 )
+# Brotli/gzip for bodies above the threshold (reports and chat histories are large and repetitive)
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv("COMPRESSION_MIN_BYTES", 1000)))
+# Opt-in request profiling (X-Debug-Profile with an admin token, or PROFILE_SAMPLE_RATE)
+app.add_middleware(ProfilingMiddleware)
 
 # Connecting to MongoDB Database - using lazy initialization for serverless
 load_dotenv()
@@ -61,6 +107,16 @@ def get_db_collections():
 
     return _discussion_collection, _user_collection, _plans_collection
 
+_batch_collection = None
+
+def get_batch_collection():
+    """Batch_data holds one record per /analyze/batch run, with an item per subject"""
+    global _batch_collection
+    if _batch_collection is None:
+        get_db_collections()
+        _batch_collection = _db.get_collection("Batch_data")
+    return _batch_collection
+
 # Represents an ObjectId field in the database.
 # It will be represented as a `str` on the model so that it can be serialized to JSON.
 PyObjectId = Annotated[str, BeforeValidator(str)]
@@ -85,12 +141,17 @@ class AnalysisRequest(BaseModel):
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
     messages: List[Tuple[str, str]]
     user_input: str
+    user_id: Optional[str] = None
+    conversation_id: Optional[str] = None  # omitted on the first turn, a new id is returned
+    delta: bool = False  # only return the new turn; the client already holds the history
 
 
 class AnalysisResponse(BaseModel):
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
     response: str
-    full_history: List[Tuple[str,str]]
+    full_history: Optional[List[Tuple[str,str]]] = None
+    conversation_id: Optional[str] = None
+    turn_index: Optional[int] = None
 
 class User(BaseModel):
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
@@ -123,6 +184,21 @@ class PlanUpdate(BaseModel):
     status: Optional[str] = None
     # updated_at will be set by the server, so not included here for client input
 
+def etag_response(request: Request, content):
+    """JSON response with a weak ETag; 304 Not Modified when the client's copy is current
+
+    The tag is weak because CompressionMiddleware may send the same JSON gzipped,
+    brotli-compressed or plain, and a strong tag must differ per content-coding.
+    """
+    body = MongoJSONResponse(content).body
+    digest = f'"{hashlib.sha1(body).hexdigest()}"'
+    headers = {"ETag": f"W/{digest}", "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    known = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    if digest in known or "*" in known:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 
 #status check API route
 @app.get("/")
@@ -138,25 +214,116 @@ async def test_env():
         "mongodb_url_length": len(mongodb_url) if mongodb_url else 0
     }
 
+#per-route model usage: latency, token and cost accounting for tuning the model mix
+@app.get("/metrics/models")
+async def model_metrics():
+    return get_model_router().stats()
+
+#search gate counters: searches performed/skipped and the latency saved by skipping
+@app.get("/metrics/search")
+async def search_metrics():
+    return get_search_gate().stats()
+
+#local vector index over past analyses: size, internal hits versus web search fallbacks
+@app.get("/metrics/knowledge")
+async def knowledge_metrics():
+    vector_index = get_vector_index()
+    return vector_index.stats() if vector_index is not None else {"enabled": False}
+
+#analyses running and queued, and how many were shed with 503
+@app.get("/metrics/admission")
+async def admission_metrics():
+    return get_admission_controller().stats()
+
+#identical concurrent analyses served by one run: executions versus coalesced requests
+@app.get("/metrics/singleflight")
+async def single_flight_metrics():
+    return get_single_flight().stats()
+
+#speculative prefetch: drafts warmed, cancelled by newer drafts, and what the warm-up did
+@app.get("/metrics/prefetch")
+async def prefetch_metrics():
+    return get_prefetcher().stats()
+
+# --- Admin ---
+# Admin endpoints need the X-Admin-Token header to match ADMIN_TOKEN; without ADMIN_TOKEN they are closed
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not admin_token_matches(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+#profiles captured by the profiling middleware (in every worker sharing the cache), newest first
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    return {"items": await run_in_threadpool(get_profiling().list)}
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str):
+    profile = await run_in_threadpool(get_profiling().get, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    return profile
+
+@app.delete("/admin/profiles", dependencies=[Depends(require_admin)])
+async def clear_profiles():
+    return {"deleted": await run_in_threadpool(get_profiling().clear)}
+
+class PrefetchRequest(BaseModel):
+    client_id: str = Field(..., min_length=1, max_length=100)  # one pending prefetch per chat page
+    draft: str = Field(..., max_length=2000)  # a chat message, not a document
+    messages: List[Tuple[str, str]] = []
+
+# Warm the search cache for a draft the user is still typing; returns the route it will take
+@app.post("/prefetch", status_code=202)
+async def prefetch(request: PrefetchRequest = Body(...)):
+    return get_prefetcher().schedule(request.client_id, request.draft, request.messages)
+
+#compact idle conversations and archive cold ones to disk; returns the storage report
+@app.post("/admin/retention/run", dependencies=[Depends(require_admin)])
+async def run_retention_now():
+    discussion_collection, _, _ = get_db_collections()
+    return await run_retention(discussion_collection)
+
+@app.get("/admin/retention", dependencies=[Depends(require_admin)])
+async def retention_report():
+    return last_report() or {}
+
 #API for downloading the chats
 @app.get("/download/")
-async def download_analysis(format: str = Query("pdf")):
+async def download_analysis(format: str = Query("pdf"), conversation_id: Optional[str] = None):
+    check_report_format(format)
     discussion_collection, _, _ = get_db_collections()
-    # Fetch analysis report from MongoDB
-    # obj_id = ObjectId(item_id)
-    download_chat = await discussion_collection.find_one(sort=[("_id", -1)])
+    # Fetch analysis report from MongoDB: the requested conversation, else the latest turn
+    if conversation_id:
+        download_chat = await discussion_collection.find_one({"conversation_id": conversation_id, "is_head": True})
+    else:
+        download_chat = await discussion_collection.find_one(sort=[("_id", -1)])
     print(download_chat)
+    if download_chat:
+        # Compacted and archived conversations are read back from their single document/archive
+        download_chat = await load_conversation(discussion_collection, download_chat)
     if not download_chat:
         return {"error": "Report not found"}
 
     # Extract relevant data
     messages = download_chat.get("full_history", [])
     analysis_text = "\n".join([f"{msg[0]}: {msg[1]}" for msg in messages])
+    file_path = write_report_file(analysis_text, format, "analysis_report")
 
+    # Return file as response
+    return FileResponse(path=file_path, filename=f"analysis_report.{format}", media_type="application/octet-stream")
+
+REPORT_FORMATS = ("pdf", "md", "txt")
+
+def check_report_format(format):
+    # The format becomes the extension of a file in the temp dir, so only known ones are accepted
+    if format not in REPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format {format}, expected one of {', '.join(REPORT_FORMATS)}")
+
+def write_report_file(text, format, name):
+    """Write a report as PDF, or as plain text/markdown (md, txt); returns the path"""
     # Define file paths - use /tmp for serverless environment
-    import tempfile
-    temp_dir = tempfile.gettempdir()
-    file_path = os.path.join(temp_dir, f"analysis_report.{format}")
+    file_path = os.path.join(tempfile.gettempdir(), f"{name}.{format}")
 
     # Generate PDF
     if format == "pdf":
@@ -168,12 +335,21 @@ async def download_analysis(format: str = Query("pdf")):
         font_path = os.path.join(fonts_dir, "NotoSans-Regular.ttf")
         pdf.add_font("NotoSans", "", font_path, uni=True)
         pdf.set_font("NotoSans", size=12)
-        pdf.multi_cell(0, 10, analysis_text)
+        pdf.multi_cell(0, 10, text)
         pdf.output(file_path)
-
-
-    # Return file as response
-    return FileResponse(path=file_path, filename=f"analysis_report.{format}", media_type="application/octet-stream")
+    else:
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(text)
+    return file_path
+
+async def run_analysis(state):
+    """
+    Run the graph on the threadpool (it blocks on Gemini/Tavily), sharing one run between
+    concurrent requests for the same route, input and conversation
+    """
+    chain = get_analysis_chain()
+    key = flight_key(route_for(state), state["input"], state["messages"])
+    return await get_single_flight().run(key, lambda: run_in_threadpool(chain.invoke, state))
 
 # main API for communicating with the LLM and storing it in the database
 @app.post("/analyze/", response_model = AnalysisResponse)
@@ -183,8 +359,17 @@ async def analyze(request: AnalysisRequest = Body(...)):
             "messages": request.messages,
             "input": request.user_input
         }
-        chain = get_analysis_chain()
-        result = chain.invoke(state)
+        # Optional shared cache of finished answers (off by default: "rerun" expects a fresh answer)
+        cache_ttl = float(os.getenv("WORKFLOW_CACHE_TTL_SECONDS", 0))
+        workflow_key = cache_key("workflow", request.user_input, request.messages)
+        # The cache backends are synchronous (pymongo/redis), so they run on the threadpool
+        cached_response = await run_in_threadpool(get_cache().get, workflow_key) if cache_ttl > 0 else None
+        if cached_response is not None:
+            result = {"messages": request.messages + [("ai", cached_response)]}
+        else:
+            result = await run_analysis(state)
+            if cache_ttl > 0:
+                await run_in_threadpool(get_cache().set, workflow_key, result["messages"][-1][1], cache_ttl)
     except Exception as e:
         print(f"Error in analyze endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
@@ -201,16 +386,272 @@ async def analyze(request: AnalysisRequest = Body(...)):
     print("Final Result:", final_data)  # Debugging line
     # Send result data to the Db
     discussion_collection, _, _ = get_db_collections()
-    new_resp = await discussion_collection.insert_one(final_data)
+    new_resp = await insert_turn(discussion_collection, request, final_data)
 
     #Fetch data from Db
     result_chat = await discussion_collection.find_one( {"_id": new_resp.inserted_id})
 
-    return AnalysisResponse(
-        id = str(result_chat["_id"]),
-        response= result_chat["response"],
-        full_history = result_chat["full_history"],
+    # Same shape as AnalysisResponse (whose _id has always been null), without re-validating
+    # every (role, content) pair of a long history
+    content = {
+        "_id": None,
+        "response": result_chat["response"],
+        "full_history": result_chat["full_history"],
+        "conversation_id": result_chat["conversation_id"],
+        "turn_index": result_chat["turn_index"],
+    }
+    if request.delta:
+        del content["full_history"]
+    return MongoJSONResponse(content)
+
+# --- Batch analysis ---
+# One framework over a list of subjects (a portfolio of companies). Subjects run through the
+# graph on the threadpool, at most BATCH_CONCURRENCY at a time, each holding an admission slot
+# of its own (behind interactive /analyze/ requests), and share the search cache.
+# Results are streamed as NDJSON as each subject completes and stored in one Batch_data record.
+# The batch runs as its own task, so a client that disconnects can still fetch the record later.
+
+class BatchRequest(BaseModel):
+    framework: str  # one of the framework routes: swot, pestle, tows, porter, canvas
+    subjects: List[str] = Field(..., min_length=1, max_length=100)
+    user_id: Optional[str] = None
+
+_batch_tasks = set()  # strong references, so running batches are not garbage collected
+
+async def run_admitted_analysis(state):
+    """run_analysis holding an admission slot, for analyses the middleware does not guard"""
+    controller = get_admission_controller()
+    if not controller.enabled:
+        return await run_analysis(state)
+    await controller.acquire_free_slot()
+    started = time.perf_counter()
+    try:
+        return await run_analysis(state)
+    finally:
+        controller.release(time.perf_counter() - started)
+
+async def run_batch(batch_id, request, queue):
+    batch_collection = get_batch_collection()
+    semaphore = asyncio.Semaphore(int(os.getenv("BATCH_CONCURRENCY", 4)))
+
+    async def run_item(index, subject):
+        async with semaphore:
+            started = time.perf_counter()
+            item = {"index": index, "subject": subject}
+            try:
+                state = {"messages": [], "input": subject, "route": request.framework}
+                result = await run_admitted_analysis(state)
+                item.update(status="done", response=result["messages"][-1][1])
+            except Exception as e:
+                print(f"Error in batch {batch_id} for {subject}: {str(e)}")
+                item.update(status="error", error=str(e))
+            item["elapsed"] = round(time.perf_counter() - started, 3)
+        await batch_collection.update_one({"_id": batch_id}, {"$push": {"items": item}})
+        await queue.put(item)
+        return item
+
+    summary = {"status": "error", "error": "Batch was interrupted"}
+    try:
+        items = await asyncio.gather(*(run_item(i, s) for i, s in enumerate(request.subjects)))
+        failed = sum(item["status"] == "error" for item in items)
+        summary = {"status": "done", "completed": len(items) - failed, "failed": failed}
+    except Exception as e:
+        print(f"Error in batch {batch_id}: {str(e)}")
+        summary["error"] = str(e)
+    finally:
+        # Always record the outcome and end the stream, which stops at the summary line
+        summary["finished_at"] = datetime.utcnow()
+        try:
+            await batch_collection.update_one({"_id": batch_id}, {"$set": summary})
+        except Exception as e:
+            print(f"Could not store the outcome of batch {batch_id}: {str(e)}")
+        queue.put_nowait({"batch_id": str(batch_id), **summary})
+
+@app.post("/analyze/batch")
+async def analyze_batch(request: BatchRequest = Body(...)):
+    if request.framework not in FRAMEWORK_ROUTES:
+        raise HTTPException(status_code=400, detail=f"Unknown framework {request.framework}, expected one of {', '.join(FRAMEWORK_ROUTES)}")
+    subjects = [subject.strip() for subject in request.subjects if subject.strip()]
+    if not subjects:
+        raise HTTPException(status_code=400, detail="No subjects provided")
+    request.subjects = subjects
+
+    batch_collection = get_batch_collection()
+    new_batch = await batch_collection.insert_one({
+        "user_id": request.user_id,
+        "framework": request.framework,
+        "subjects": subjects,
+        "items": [],
+        "status": "running",
+        "created_at": datetime.utcnow(),
+    })
+    batch_id = new_batch.inserted_id
+    queue = asyncio.Queue()
+    task = asyncio.create_task(run_batch(batch_id, request, queue))
+    _batch_tasks.add(task)
+    task.add_done_callback(_batch_tasks.discard)
+
+    async def stream():
+        yield orjson.dumps({"batch_id": str(batch_id), "framework": request.framework, "total": len(subjects)}) + b"\n"
+        while True:  # one line per subject, then the summary (the only line with a batch_id)
+            line = await queue.get()
+            yield orjson.dumps(line, default=json_default) + b"\n"
+            if "batch_id" in line:
+                break
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+async def find_batch(batch_id):
+    batch = await get_batch_collection().find_one({"_id": parse_object_id(batch_id, "batch ID")})
+    if not batch:
+        raise HTTPException(status_code=404, detail=f"Batch {batch_id} not found")
+    return batch
+
+@app.get("/analyze/batch/{batch_id}")
+async def get_batch(request: Request, batch_id: str):
+    batch = await find_batch(batch_id)
+    batch["items"].sort(key=lambda item: item["index"])
+    return etag_response(request, batch)
+
+@app.get("/analyze/batch/{batch_id}/download")
+async def download_batch(batch_id: str, format: str = Query("pdf")):
+    """All subjects of a batch as one report, in the order they were submitted"""
+    check_report_format(format)
+    batch = await find_batch(batch_id)
+    framework = FRAMEWORK_ROUTES[batch["framework"]]
+    sections = [f"# {framework} analysis of {len(batch['subjects'])} subjects"]
+    for item in sorted(batch["items"], key=lambda item: item["index"]):
+        body = item["response"] if item["status"] == "done" else f"Analysis failed: {item['error']}"
+        sections.append(f"# {item['subject']}\n\n{body}")
+    file_path = write_report_file("\n\n".join(sections), format, f"batch_{batch_id}")
+    return FileResponse(path=file_path, filename=f"batch_report.{format}", media_type="application/octet-stream")
+
+# --- Discussion history ---
+# Every /analyze/ call stores one turn document in Discussion_data, tagged with user_id,
+# conversation_id and turn_index. The newest turn of each conversation is flagged is_head and
+# carries the conversation summary fields, so listing conversations is a single indexed query.
+
+SUMMARY_PROJECTION = {"conversation_id": 1, "title": 1, "turn_index": 1, "input": 1,
+                      "preview": 1, "created_at": 1, "started_at": 1}
+TURN_PROJECTION = {"conversation_id": 1, "turn_index": 1, "input": 1, "response": 1, "created_at": 1,
+                   "tier": 1, "archive": 1}
+LATEST_TURN_PROJECTION = {"user_id": 1, "turn_index": 1, "title": 1, "started_at": 1}
+PREVIEW_CHARS = 200
+TURN_INSERT_ATTEMPTS = 5
+
+async def ensure_discussion_indexes():
+    discussion_collection, _, _ = get_db_collections()
+    await discussion_collection.create_index([("user_id", 1), ("is_head", 1), ("_id", -1)])
+    # One document per turn index: concurrent turns of a conversation collide here and retry
+    await discussion_collection.create_index(
+        [("conversation_id", 1), ("turn_index", 1)], unique=True,
+        partialFilterExpression={"conversation_id": {"$exists": True}},
+    )
+    await discussion_collection.create_index(
+        [("user_id", 1), ("input", "text"), ("response", "text")], name="discussion_text"
     )
+    await ensure_retention_indexes(discussion_collection)
+
+async def next_turn_fields(discussion_collection, request, response_text):
+    """Tag a new turn with its user/conversation, as the turn after the newest one stored"""
+    now = datetime.utcnow()
+    latest = None
+    if request.conversation_id:
+        # By index rather than the head flag, so a conversation whose head flag was lost (or is
+        # being moved by a concurrent turn) still continues where it left off
+        latest = await discussion_collection.find_one(
+            {"conversation_id": request.conversation_id}, LATEST_TURN_PROJECTION, sort=[("turn_index", -1)]
+        )
+
+    return {
+        "user_id": request.user_id if request.user_id is not None else (latest or {}).get("user_id"),
+        "conversation_id": request.conversation_id or str(ObjectId()),
+        "turn_index": latest["turn_index"] + 1 if latest else 0,
+        "is_head": True,
+        "title": (latest or {}).get("title") or request.user_input[:PREVIEW_CHARS],
+        "preview": response_text[:PREVIEW_CHARS],
+        "started_at": latest.get("started_at", now) if latest else now,
+        "created_at": now,
+        "raw": True,  # a full snapshot; retention compaction drops the marker (see retention.py)
+    }
+
+async def insert_turn(discussion_collection, request, turn):
+    """
+    Store a turn as the new head of its conversation. The turn is inserted before the previous
+    head is demoted, so a failed insert leaves the conversation as it was; a concurrent turn that
+    took the same index fails on the unique index and this one retries with the next index.
+    """
+    for _ in range(TURN_INSERT_ATTEMPTS):
+        doc = {**turn, **await next_turn_fields(discussion_collection, request, turn["response"])}
+        try:
+            inserted = await discussion_collection.insert_one(doc)
+        except DuplicateKeyError:
+            continue
+        if request.conversation_id:
+            # Only older heads: a newer concurrent turn keeps its flag
+            await discussion_collection.update_many(
+                {"conversation_id": doc["conversation_id"], "is_head": True, "turn_index": {"$lt": doc["turn_index"]}},
+                {"$set": {"is_head": False}},
+            )
+        return inserted
+    raise HTTPException(status_code=409, detail="Conversation is being updated concurrently, please retry")
+
+def serialize_doc(doc):
+    doc["_id"] = str(doc["_id"])
+    return doc
+
+def parse_object_id(value, name="ID"):
+    try:
+        return ObjectId(value)
+    except Exception:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} format")
+
+@app.get("/discussions")
+async def list_discussions(request: Request, user_id: str = Query(...), limit: int = Query(20, ge=1, le=100),
+                           before: Optional[str] = None):
+    """Newest conversations of a user; pass next_cursor back as ``before`` for the next page"""
+    discussion_collection, _, _ = get_db_collections()
+    query = {"user_id": user_id, "is_head": True}
+    if before:
+        query["_id"] = {"$lt": parse_object_id(before, "cursor")}
+    cursor = discussion_collection.find(query, SUMMARY_PROJECTION).sort("_id", -1).limit(limit + 1)
+    items = [serialize_doc(doc) async for doc in cursor]
+    next_cursor = items[limit - 1]["_id"] if len(items) > limit else None
+    return etag_response(request, {"items": items[:limit], "next_cursor": next_cursor})
+
+@app.get("/discussions/search")
+async def search_discussions(request: Request, user_id: str = Query(...), q: str = Query(..., min_length=1),
+                             limit: int = Query(20, ge=1, le=100)):
+    """Full-text search over the user's past questions and analyses"""
+    discussion_collection, _, _ = get_db_collections()
+    projection = {**SUMMARY_PROJECTION, "score": {"$meta": "textScore"}}
+    cursor = discussion_collection.find(
+        {"user_id": user_id, "$text": {"$search": q}}, projection
+    ).sort([("score", {"$meta": "textScore"})]).limit(limit)
+    return etag_response(request, {"items": [serialize_doc(doc) async for doc in cursor]})
+
+@app.get("/discussions/{conversation_id}/turns")
+async def get_discussion_turns(request: Request, conversation_id: str, after: int = Query(-1, ge=-1),
+                               limit: int = Query(20, ge=1, le=100)):
+    """Turns of a conversation in order, ``limit`` at a time, starting after turn index ``after``"""
+    discussion_collection, _, _ = get_db_collections()
+    cursor = discussion_collection.find(
+        {"conversation_id": conversation_id, "turn_index": {"$gt": after}}, TURN_PROJECTION
+    ).sort("turn_index", 1).limit(limit)
+    items = []
+    async for doc in cursor:
+        if doc.get("tier"):
+            # A compacted or archived conversation keeps its turns in one document
+            conversation = await load_conversation(discussion_collection, doc) or {"turns": []}
+            items.extend({"conversation_id": conversation_id, **turn}
+                         for turn in conversation["turns"] if turn["turn_index"] > after)
+        else:
+            items.append(serialize_doc(doc))
+    items = items[:limit]
+    if not items and after < 0:
+        raise HTTPException(status_code=404, detail=f"Discussion {conversation_id} not found")
+    next_after = items[-1]["turn_index"] if len(items) == limit else None
+    return etag_response(request, {"items": items, "next_after": next_after})
 
 #use bcrypt for password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -249,6 +690,14 @@ async def login(user: User):
 
 # --- CRUD Endpoints for Plans ---
 
+# Reads serialize the stored documents directly (validated when written) instead of building
+# a Plan model per document; lean_plan keeps the Plan response shape
+PLAN_FIELDS = ("title", "description", "status", "created_at", "updated_at")
+PLAN_PROJECTION = dict.fromkeys(PLAN_FIELDS, 1)
+
+def lean_plan(plan_doc):
+    return {"_id": plan_doc["_id"], **{field: plan_doc.get(field) for field in PLAN_FIELDS}}
+
 @app.post("/plans/", response_model=Plan)
 async def create_plan(plan_data: PlanCreate = Body(...)):
     _, _, plans_collection = get_db_collections()
@@ -263,13 +712,11 @@ async def create_plan(plan_data: PlanCreate = Body(...)):
     raise HTTPException(status_code=500, detail="Failed to create plan")
 
 @app.get("/plans/", response_model=List[Plan])
-async def get_all_plans():
+async def get_all_plans(request: Request):
     try:
         _, _, plans_collection = get_db_collections()
-        plans = []
-        async for plan_doc in plans_collection.find().sort("created_at", -1): # Sort by newest first
-            plans.append(Plan(**plan_doc))
-        return plans
+        cursor = plans_collection.find({}, PLAN_PROJECTION).sort("created_at", -1) # Sort by newest first
+        return etag_response(request, [lean_plan(plan_doc) async for plan_doc in cursor])
     except Exception as e:
         print(f"Error in get_all_plans: {str(e)}")
         import traceback
@@ -277,7 +724,7 @@ async def get_all_plans():
         raise HTTPException(status_code=500, detail=f"Failed to fetch plans: {str(e)}")
 
 @app.get("/plans/{plan_id}", response_model=Plan)
-async def get_plan(plan_id: str):
+async def get_plan(request: Request, plan_id: str):
     _, _, plans_collection = get_db_collections()
     try:
         obj_id = ObjectId(plan_id)
@@ -286,7 +733,7 @@ async def get_plan(plan_id: str):
 
     plan_doc = await plans_collection.find_one({"_id": obj_id})
     if plan_doc:
-        return Plan(**plan_doc)
+        return etag_response(request, lean_plan(plan_doc))
     raise HTTPException(status_code=404, detail=f"Plan with id {plan_id} not found")
 
 @app.put("/plans/{plan_id}", response_model=Plan)
@@ -0,0 +1,193 @@
+#model_tiering.py
+"""
+Per-route model selection for the LangGraph workflow.
+
+Cheap conversational turns (the "general" route) run on a flash-class model while the
+framework reports (porter, canvas, ...) run on a pro-class model. Every call is timed and
+its token usage/cost is accounted per route so the mix can be tuned. When a route's recent
+latency breaches its SLO the router switches that route to a faster fallback model for a
+cooldown period.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from statistics import median
+from dotenv import load_dotenv
+load_dotenv()
+
+PREMIUM_MODEL = "gemini-2.0-pro-exp-02-05"
+FAST_MODEL = "gemini-2.0-flash"
+FALLBACK_MODEL = "gemini-2.0-flash-lite"
+
+# Default tier for each graph route; anything not listed uses MODEL_DEFAULT
+DEFAULT_ROUTE_MODELS = {
+    "general": FAST_MODEL,
+    "search_gate": FAST_MODEL,
+    "porter": PREMIUM_MODEL,
+    "canvas": PREMIUM_MODEL,
+}
+
+# USD per 1M tokens as (input, output). List prices at the time of writing, experimental
+# models are free. Override or extend with the MODEL_PRICES env variable (same JSON shape).
+DEFAULT_PRICES = {
+    PREMIUM_MODEL: (0.0, 0.0),
+    FAST_MODEL: (0.10, 0.40),
+    FALLBACK_MODEL: (0.075, 0.30),
+}
+
+
+def _env_float(name, default):
+    value = os.getenv(name)
+    try:
+        return float(value) if value not in (None, "") else default
+    except ValueError:
+        print(f"Ignoring invalid value for {name}: {value}")
+        return default
+
+
+def _env_prices(name):
+    value = os.getenv(name)
+    try:
+        prices = json.loads(value) if value not in (None, "") else {}
+        if not isinstance(prices, dict):
+            raise ValueError("expected a JSON object")
+        return prices
+    except ValueError:
+        print(f"Ignoring invalid value for {name}: {value}")
+        return {}
+
+
+def _default_llm_factory(model_name):
+    # Imported lazily so the router can be used (and tested) without the Gemini client
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model=model_name)
+
+
+def _token_usage(response, prompt):
+    """Token usage reported by the model, or a ~4 chars/token estimate when it is missing"""
+    usage = getattr(response, "usage_metadata", None) or {}
+    content = getattr(response, "content", "") or ""
+    input_tokens = usage.get("input_tokens") or max(1, len(str(prompt)) // 4)
+    output_tokens = usage.get("output_tokens") or max(1, len(str(content)) // 4)
+    return input_tokens, output_tokens
+
+
+class ModelRouter:
+    """Picks the model for each route, falls back on SLO breaches and keeps per-route stats"""
+
+    def __init__(self, llm_factory=None, route_models=None, default_model=None,
+                 fallback_model=None, latency_slo=None, window=None, cooldown=None, prices=None):
+        self._llm_factory = llm_factory or _default_llm_factory
+        self.default_model = default_model or os.getenv("MODEL_DEFAULT", PREMIUM_MODEL)
+        self.fallback_model = fallback_model or os.getenv("MODEL_FALLBACK", FALLBACK_MODEL)
+        self.route_models = dict(DEFAULT_ROUTE_MODELS)
+        self.route_models.update(route_models or {})
+        self.latency_slo = latency_slo if latency_slo is not None else _env_float("LLM_LATENCY_SLO_SECONDS", 45.0)
+        self.window = int(window or _env_float("LLM_LATENCY_WINDOW", 10))
+        self.cooldown = cooldown if cooldown is not None else _env_float("LLM_FALLBACK_COOLDOWN_SECONDS", 300.0)
+        self.prices = dict(DEFAULT_PRICES)
+        self.prices.update(prices if prices is not None else _env_prices("MODEL_PRICES"))
+
+        self._llms = {}
+        self._latencies = {}
+        self._fallback_until = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def model_for(self, route):
+        """Configured model for a route: MODEL_<ROUTE> env, then the tier table, then the default"""
+        return os.getenv(f"MODEL_{route.upper()}") or self.route_models.get(route, self.default_model)
+
+    def slo_for(self, route):
+        return _env_float(f"LLM_LATENCY_SLO_{route.upper()}_SECONDS", self.latency_slo)
+
+    def in_fallback(self, route):
+        return time.monotonic() < self._fallback_until.get(route, 0.0)
+
+    def _get_llm(self, model_name):
+        with self._lock:
+            if model_name not in self._llms:
+                self._llms[model_name] = self._llm_factory(model_name)
+            return self._llms[model_name]
+
+    def select_model(self, route):
+        primary = self.model_for(route)
+        if self.in_fallback(route) and self.fallback_model != primary:
+            return self.fallback_model, True
+        return primary, False
+
+    def invoke(self, route, prompt):
+        """Invoke the model chosen for ``route`` with ``prompt`` and record latency and cost"""
+        model_name, is_fallback = self.select_model(route)
+        llm = self._get_llm(model_name)
+        started = time.perf_counter()
+        try:
+            response = llm.invoke(prompt)
+        except Exception:
+            self._record(route, model_name, is_fallback, time.perf_counter() - started, error=True)
+            raise
+        elapsed = time.perf_counter() - started
+        input_tokens, output_tokens = _token_usage(response, prompt)
+        self._record(route, model_name, is_fallback, elapsed, input_tokens=input_tokens, output_tokens=output_tokens)
+        return response
+
+    def _record(self, route, model_name, is_fallback, elapsed, input_tokens=0, output_tokens=0, error=False):
+        in_price, out_price = self.prices.get(model_name, (0.0, 0.0))
+        cost = (input_tokens * in_price + output_tokens * out_price) / 1_000_000
+
+        with self._lock:
+            stats = self._stats.setdefault(route, {
+                "calls": 0, "fallback_calls": 0, "errors": 0, "slo_breaches": 0,
+                "total_latency": 0.0, "input_tokens": 0, "output_tokens": 0,
+                "cost_usd": 0.0, "models": {},
+            })
+            stats["calls"] += 1
+            stats["fallback_calls"] += int(is_fallback)
+            stats["errors"] += int(error)
+            stats["total_latency"] += elapsed
+            stats["input_tokens"] += input_tokens
+            stats["output_tokens"] += output_tokens
+            stats["cost_usd"] += cost
+            per_model = stats["models"].setdefault(model_name, {"calls": 0, "total_latency": 0.0, "cost_usd": 0.0})
+            per_model["calls"] += 1
+            per_model["total_latency"] += elapsed
+            per_model["cost_usd"] += cost
+
+            # Only the primary model's latency decides whether the route is healthy
+            if is_fallback:
+                return
+            latencies = self._latencies.setdefault(route, deque(maxlen=self.window))
+            latencies.append(elapsed)
+            if len(latencies) >= min(3, self.window) and median(latencies) > self.slo_for(route):
+                stats["slo_breaches"] += 1
+                self._fallback_until[route] = time.monotonic() + self.cooldown
+                latencies.clear()
+                print(f"Latency SLO breached on route '{route}', using {self.fallback_model} for {self.cooldown:.0f}s")
+
+    def stats(self):
+        """Snapshot of the per-route accounting, safe to return from an API route"""
+        with self._lock:
+            snapshot = {}
+            for route, stats in self._stats.items():
+                recent = list(self._latencies.get(route, ()))
+                snapshot[route] = {
+                    **{k: v for k, v in stats.items() if k != "models"},
+                    "avg_latency": stats["total_latency"] / stats["calls"] if stats["calls"] else 0.0,
+                    "recent_median_latency": median(recent) if recent else None,
+                    "model": self.model_for(route),
+                    "in_fallback": self.in_fallback(route),
+                    "models": {name: dict(m) for name, m in stats["models"].items()},
+                }
+            return snapshot
+
+
+# Lazy, per-process router shared by the workflow and the stats endpoint
+_router = None
+
+def get_model_router():
+    global _router
+    if _router is None:
+        _router = ModelRouter()
+    return _router
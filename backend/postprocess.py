@@ -0,0 +1,158 @@
+#postprocess.py
+"""
+Post-processing of model output: markdown sanitizing, citation validation and the numbered
+"### Sources" section.
+
+All patterns are compiled once at import. IncrementalSanitizer produces the same text as
+sanitize_markdown but works chunk by chunk, so a streamed response never has to be re-scanned
+from the start.
+"""
+import re
+from sources import extract_source
+
+_FENCE_OPEN_RE = re.compile(r"^```(?:markdown|md)\s*")
+_FENCE_CLOSE_RE = re.compile(r"\s*```$")
+# A header marker that does not start a line (the lookbehind also skips the inner #s of "###").
+# Starting with the literal "#" lets the regex engine jump straight to candidate positions.
+_HEADER_RE = re.compile(r"#(?<![\n#]#)#{0,5}\s")
+# Trailing characters that may still turn into a closing fence or a header marker
+_HOLD_RE = re.compile(r"[\s`#]*$")
+_FENCE_PREFIXES = ("```markdown", "```md")
+_FENCE_CLOSE_CHARS = " \t\n\r\f\v`"
+
+# Citation markers like [3] or [1, 2], skipping fenced code blocks (an unclosed fence runs to the
+# end, as in markdown), inline code and markdown links such as [1](url)
+_CITATION_RE = re.compile(
+    r"(^[ \t]*(?P<fence>```|~~~)[\s\S]*?(?:^[ \t]*(?P=fence)|\Z)|`[^`\n]*`)|( ?)\[(\d+(?:\s*,\s*\d+)*)\](?!\()",
+    re.MULTILINE,
+)
+_NUMBER_RE = re.compile(r"\d+")
+
+
+def _add_header_newline(match):
+    return "\n" + match.group(0)
+
+
+def _strip_closing_fence(text):
+    # A closing fence can only sit in the trailing run of whitespace and backticks, so only that
+    # run is scanned instead of retrying the pattern at every whitespace in the report
+    match = _FENCE_CLOSE_RE.search(text, len(text.rstrip(_FENCE_CLOSE_CHARS)))
+    return text[:match.start()] + text[match.end():] if match else text
+
+
+def sanitize_markdown(text):
+    """Remove a fence wrapping the whole response and make sure headers start on their own line"""
+    text = _FENCE_OPEN_RE.sub("", text, count=1)
+    text = _strip_closing_fence(text)
+    text = _HEADER_RE.sub(_add_header_newline, text)
+    return text.strip()
+
+
+class IncrementalSanitizer:
+    """
+    Streaming version of sanitize_markdown: ``feed`` returns the text that is safe to emit so far
+    and ``finish`` returns the rest. Only a short tail (whitespace, backticks, #) is held back.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._fence_checked = False
+        self._emitted = False
+        self._prev = "\n"
+
+    def _check_fence(self, final):
+        if not final and any(p.startswith(self._pending) for p in _FENCE_PREFIXES):
+            return False
+        self._pending = _FENCE_OPEN_RE.sub("", self._pending, count=1)
+        self._fence_checked = True
+        return True
+
+    def feed(self, chunk):
+        self._pending += chunk
+        if not self._fence_checked and not self._check_fence(final=False):
+            return ""
+        if not self._emitted:
+            self._pending = self._pending.lstrip()
+        cut = _HOLD_RE.search(self._pending).start()
+        if cut == 0:
+            return ""
+        segment, self._pending = self._pending[:cut], self._pending[cut:]
+        # The lookbehind only needs the previously emitted character, so prepend it and drop it again
+        out = _HEADER_RE.sub(_add_header_newline, self._prev + segment)[1:]
+        self._prev = segment[-1]
+        self._emitted = True
+        return out
+
+    def finish(self):
+        if not self._fence_checked:
+            self._check_fence(final=True)
+        tail = _strip_closing_fence(self._pending)
+        tail = _HEADER_RE.sub(_add_header_newline, self._prev + tail)[1:]
+        self._pending = ""
+        return tail.strip() if not self._emitted else tail.rstrip()
+
+
+def source_numbers(results):
+    """Map each result position to the number it is listed under in the Sources section"""
+    numbers, first_for_url = {}, {}
+    for i, result in enumerate(results or [], 1):
+        source = extract_source(result) if result else None
+        if source is None:
+            continue
+        url = source[1]
+        numbers[i] = first_for_url.setdefault(url, i)
+    return numbers
+
+
+def validate_citations(text, results):
+    """
+    Check [X] markers against the numbered sources. Markers pointing at a duplicate of an
+    earlier source are remapped to that source's number; markers with no source are dropped.
+    Returns the new text and the number of dropped and remapped markers.
+    """
+    numbers = source_numbers(results)
+    counts = {"dropped": 0, "remapped": 0}
+
+    def replace(match):
+        if match.group(1):
+            return match.group(1)
+        kept = []
+        for n in map(int, _NUMBER_RE.findall(match.group(4))):
+            if n not in numbers:
+                counts["dropped"] += 1
+                continue
+            if numbers[n] != n:
+                counts["remapped"] += 1
+            if numbers[n] not in kept:
+                kept.append(numbers[n])
+        if not kept:
+            return ""
+        return f"{match.group(3)}[{', '.join(map(str, kept))}]"
+
+    return _CITATION_RE.sub(replace, text), counts
+
+
+def format_source_links(results):
+    """Numbered markdown list of the unique sources, under a "### Sources" header"""
+    if not results:
+        return ""
+
+    sources = []
+    seen_urls = set()
+    for i, result in enumerate(results, 1):
+        if not result:
+            continue
+        try:
+            source = extract_source(result)
+        except Exception as e:
+            print(f"Error processing source {i}: {e}")
+            continue
+        if source is None or source[1] in seen_urls:
+            continue
+        title, url, _ = source
+        seen_urls.add(url)
+        sources.append(f"{i}. [{title}]({url})")
+
+    if not sources:
+        return ""
+    return "\n\n### Sources\n" + "\n".join(sources)
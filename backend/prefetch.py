@@ -0,0 +1,109 @@
+#prefetch.py
+"""
+Speculative search prefetch while the user is typing.
+
+The chat page posts its debounced draft to /prefetch. The draft is routed exactly like
+/analyze/ would route it (route_for). After a short quiet period (PREFETCH_DELAY_MS) the search
+that node would run is put into the shared search cache (cached_search), so the retrieval step is
+already done when the message is sent. Skipped cases:
+- everything when the search cache is off (SEARCH_CACHE_TTL_SECONDS=0), since nothing warmed is kept;
+- drafts shorter than PREFETCH_MIN_CHARS;
+- framework subjects the vector index would answer;
+- general follow-ups the search gate would not search for.
+
+Each client has at most one pending prefetch. A newer draft cancels the older one; a search
+already running on the threadpool finishes and is simply cached.
+"""
+import asyncio
+import functools
+import os
+import threading
+from graph import FRAMEWORK_ROUTES, route_for, search_query, cached_search, create_search_tool, search_cache_ttl
+from search_gate import get_search_gate
+from vector_index import get_vector_index
+from dotenv import load_dotenv
+load_dotenv()
+
+
+class Prefetcher:
+    def __init__(self, search_tool, search_gate, vector_index=None, delay=0.3, min_chars=12, max_pending=256):
+        self.search_tool = search_tool
+        self.search_gate = search_gate
+        self.vector_index = vector_index
+        self.delay = delay
+        self.min_chars = min_chars
+        self.max_pending = max_pending
+        self._tasks = {}  # client_id -> pending asyncio.Task
+        self._lock = threading.Lock()
+        self._stats = {"scheduled": 0, "cancelled": 0, "skipped": 0, "errors": 0, "outcomes": {}}
+
+    def schedule(self, client_id, draft, messages=None):
+        """Route the draft and start warming its search in the background; must run on the event loop"""
+        draft = draft.strip()
+        route = route_for({"messages": messages or [], "input": draft})
+        previous = self._tasks.pop(client_id, None)
+        if previous is not None and not previous.done():
+            previous.cancel()
+            self._count("cancelled")
+        if (len(draft) < self.min_chars or len(self._tasks) >= self.max_pending
+                or search_cache_ttl() <= 0):
+            self._count("skipped")
+            return {"route": route, "status": "skipped"}
+
+        task = asyncio.create_task(self._run(route, draft, messages or []))
+        self._tasks[client_id] = task
+        task.add_done_callback(functools.partial(self._forget, client_id))
+        self._count("scheduled")
+        return {"route": route, "status": "scheduled"}
+
+    def _forget(self, client_id, task):
+        if self._tasks.get(client_id) is task:
+            del self._tasks[client_id]
+
+    async def _run(self, route, draft, messages):
+        await asyncio.sleep(self.delay)  # a newer draft within the delay cancels this one for free
+        try:
+            outcome = await asyncio.to_thread(self.warm, route, draft, messages)
+        except Exception as e:
+            print(f"Prefetch failed for {draft!r}: {e}")
+            self._count("errors")
+            return
+        with self._lock:
+            outcomes = self._stats["outcomes"]
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    def warm(self, route, draft, messages):
+        """Run the retrieval the node for ``route`` would run; returns what was done"""
+        if route in FRAMEWORK_ROUTES:
+            if self.vector_index is not None and self.vector_index.retrieve(draft, record=False) is not None:
+                return "internal"
+        elif not self.search_gate.decide(draft, messages, record=False).search:
+            return "not_needed"
+        # Neither the classifier call above nor this search is counted in /metrics/search: it
+        # reports what answers needed, prefetches are counted in this prefetcher's outcomes
+        cached_search(self.search_tool, search_query(route, draft), self.search_gate, record=False)
+        return "searched"
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, outcomes=dict(self._stats["outcomes"]), pending=len(self._tasks))
+
+
+# Lazy, per-process prefetcher; warmed results land in the shared search cache
+_prefetcher = None
+
+def get_prefetcher():
+    global _prefetcher
+    if _prefetcher is None:
+        _prefetcher = Prefetcher(
+            create_search_tool(),
+            get_search_gate(),
+            get_vector_index(),
+            delay=float(os.getenv("PREFETCH_DELAY_MS", 300)) / 1000,
+            min_chars=int(os.getenv("PREFETCH_MIN_CHARS", 12)),
+        )
+    return _prefetcher
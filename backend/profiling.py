@@ -0,0 +1,192 @@
+#profiling.py
+"""
+On-demand profiling of live requests.
+
+A request is profiled when it carries ``X-Debug-Profile: 1`` together with a valid
+``X-Admin-Token`` (ADMIN_TOKEN), or when it is picked by PROFILE_SAMPLE_RATE (0 by default).
+With no admin token and no sampling the middleware is a single attribute check per request.
+
+Each profile records:
+- a call profile of the event-loop thread: pyinstrument when installed and
+  PROFILER=pyinstrument, else cProfile;
+- wall, time-to-first-byte and CPU time, split between the event-loop thread and the whole
+  process. The process figure includes the threadpool, where the LangGraph chain runs;
+- event-loop lag sampled every 10 ms while the request runs. High lag means the request (or a
+  neighbour) blocked the loop, e.g. bcrypt or FPDF. Low CPU with a long wall time means
+  waiting on Gemini/Tavily.
+
+The profiler hooks the whole event-loop thread, so concurrent requests show up in the same
+profile; only one request is profiled at a time per worker. Profiles are stored in the shared
+cache backend (cache.get_cache) for PROFILE_TTL_SECONDS, with an index of the newest
+PROFILE_MAX_STORED, and served by the /admin/profiles endpoints. Under gunicorn set
+CACHE_BACKEND=mongo or redis, or a profile taken by one worker is not found by the others.
+"""
+import asyncio
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+from cache import MemoryCache, get_cache
+from dotenv import load_dotenv
+load_dotenv()
+
+try:
+    import pyinstrument
+except ImportError:  # optional dependency
+    pyinstrument = None
+
+LAG_INTERVAL = 0.01
+REPORT_LINES = 40
+INDEX_KEY = "profiles:index"
+
+
+def admin_token_matches(token):
+    expected = os.getenv("ADMIN_TOKEN")
+    return bool(expected and token) and hmac.compare_digest(expected.encode(), token.encode())
+
+
+class Profiling:
+    """Sampling decision, profile capture and the bounded store of finished profiles"""
+
+    def __init__(self, sample_rate=0.0, max_profiles=50, backend="cprofile", store=None, ttl=3600):
+        self.sample_rate = sample_rate
+        self.backend = backend if backend == "pyinstrument" and pyinstrument is not None else "cprofile"
+        self.enabled = sample_rate > 0 or bool(os.getenv("ADMIN_TOKEN"))
+        self.max_profiles = max_profiles
+        self.store = store if store is not None else MemoryCache()
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._busy = False
+
+    def should_profile(self, scope):
+        if self._busy or scope["path"].startswith("/admin/"):
+            return False
+        headers = dict(scope["headers"])
+        if headers.get(b"x-debug-profile") in (b"1", b"true"):
+            return admin_token_matches(headers.get(b"x-admin-token", b"").decode("latin-1"))
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def profile(self, app, scope, receive, send):
+        self._busy = True
+        profile_id = uuid.uuid4().hex[:12]
+        timings = {}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timings["status"] = message["status"]
+                timings["ttfb"] = time.perf_counter()
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        lags = []
+        lag_task = asyncio.create_task(watch_loop_lag(lags))
+        profiler = pyinstrument.Profiler(async_mode="enabled") if self.backend == "pyinstrument" else cProfile.Profile()
+        started_at = datetime.utcnow()
+        wall, thread_cpu, process_cpu = time.perf_counter(), time.thread_time(), time.process_time()
+        tasks = len(asyncio.all_tasks())
+        (profiler.start if self.backend == "pyinstrument" else profiler.enable)()
+        try:
+            await app(scope, receive, send_with_timing)
+        finally:
+            (profiler.stop if self.backend == "pyinstrument" else profiler.disable)()
+            ended = time.perf_counter()
+            thread_cpu, process_cpu = time.thread_time() - thread_cpu, time.process_time() - process_cpu
+            lag_task.cancel()
+            self._busy = False
+            profile = {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": timings.get("status"),
+                "started_at": started_at.isoformat(),
+                "profiler": self.backend,
+                "wall_ms": round((ended - wall) * 1000, 2),
+                "ttfb_ms": round((timings["ttfb"] - wall) * 1000, 2) if "ttfb" in timings else None,
+                "loop_cpu_ms": round(thread_cpu * 1000, 2),
+                "process_cpu_ms": round(process_cpu * 1000, 2),
+                "loop_lag_max_ms": round(max(lags, default=0.0) * 1000, 2),
+                "loop_blocked_ms": round(sum(lags) * 1000, 2),
+                "tasks_at_start": tasks,
+                "report": render_report(profiler, self.backend),
+            }
+            # The store may be mongo/redis, so it is written off the event loop
+            await asyncio.to_thread(self.add, profile)
+
+    def add(self, profile):
+        """Store a profile and put its summary at the head of the index of recent profiles"""
+        self.store.set(f"profile:{profile['id']}", profile, self.ttl)
+        summary = {k: v for k, v in profile.items() if k != "report"}
+        # Read-modify-write of the index; a concurrent add from another worker can drop an index
+        # entry, but the profile itself stays retrievable by id until it expires
+        with self._lock:
+            index = [summary] + (self.store.get(INDEX_KEY) or [])
+            dropped = index[self.max_profiles:]
+            self.store.set(INDEX_KEY, index[:self.max_profiles], self.ttl)
+        for old in dropped:
+            self.store.delete(f"profile:{old['id']}")
+
+    def list(self):
+        """Summaries of the stored profiles, newest first"""
+        return self.store.get(INDEX_KEY) or []
+
+    def get(self, profile_id):
+        return self.store.get(f"profile:{profile_id}")
+
+    def clear(self):
+        with self._lock:
+            index = self.store.get(INDEX_KEY) or []
+            self.store.delete(INDEX_KEY)
+        for summary in index:
+            self.store.delete(f"profile:{summary['id']}")
+        return len(index)
+
+
+async def watch_loop_lag(lags, interval=LAG_INTERVAL):
+    """Append how late each ``interval`` sleep wakes up: time the loop could not run callbacks"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+def render_report(profiler, backend):
+    if backend == "pyinstrument":
+        return profiler.output_text(unicode=True, show_all=False)
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(REPORT_LINES)
+    return stream.getvalue()
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        profiling = get_profiling()
+        if scope["type"] != "http" or not profiling.enabled or not profiling.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        await profiling.profile(self.app, scope, receive, send)
+
+
+# Lazy, per-process settings; the profiles themselves live in the shared cache backend
+_profiling = None
+
+def get_profiling():
+    global _profiling
+    if _profiling is None:
+        _profiling = Profiling(
+            sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", 0)),
+            max_profiles=int(os.getenv("PROFILE_MAX_STORED", 50)),
+            backend=os.getenv("PROFILER", "cprofile").lower(),
+            store=get_cache(),
+            ttl=float(os.getenv("PROFILE_TTL_SECONDS", 3600)),
+        )
+    return _profiling
@@ -0,0 +1,257 @@
+#retention.py
+"""
+Retention for Discussion_data.
+
+Every /analyze/ call stores a turn document carrying the whole conversation so far
+(``messages`` and ``full_history``), so a conversation of n turns costs O(n^2) storage. A
+retention run moves conversations down two tiers, oldest first, by the age of their newest turn:
+
+- compacted (RETENTION_COMPACT_AFTER_DAYS, default 7): the turn documents collapse into the head
+  document. The head keeps ``full_history`` and gains a ``turns`` list (index, input, response,
+  time); the other snapshots are deleted. /discussions/{id}/turns reads the list.
+- archived (RETENTION_ARCHIVE_AFTER_DAYS, default 90): the compacted document is appended to a
+  compressed JSONL file under RETENTION_ARCHIVE_DIR (zstd when ``zstandard`` is installed, else
+  gzip) and replaced by a small stub. The stub keeps the listing fields and the archive file
+  name, and /download/ and the turns endpoint read from the archive.
+
+RETENTION_TURN_TTL_DAYS (default 0 = off) adds a Mongo TTL index that expires superseded raw turn
+snapshots: documents /analyze/ inserted with ``raw: True`` that are no longer the head. Compacted
+documents and archive stubs lose the marker, so they never expire, even after a resumed
+conversation moves the head off them. It is a backstop for deployments that do not run
+retention; keep it longer than the compaction age so turns are compacted before they expire.
+Changing the setting updates the index at startup (collMod), and setting it to 0 drops it.
+
+Run it with POST /admin/retention/run or ``python retention.py`` (e.g. from cron). Runs are
+idempotent and handle at most RETENTION_BATCH_SIZE conversations per tier.
+"""
+import asyncio
+import gzip
+import io
+import os
+import uuid
+from datetime import datetime, timedelta
+import bson
+from bson import json_util
+from dotenv import load_dotenv
+load_dotenv()
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+# Fields an archived stub keeps, so conversation listings look the same as before
+STUB_FIELDS = ("_id", "user_id", "conversation_id", "turn_index", "is_head", "title", "preview",
+               "started_at", "created_at")
+TTL_INDEX_NAME = "raw_snapshot_ttl"
+
+
+def document_size(doc):
+    return len(bson.encode(doc))
+
+
+def compact_conversation(docs):
+    """
+    One document for a conversation from its turn documents (sorted by turn_index, head last).
+    Earlier compacted documents contribute their ``turns``, so a conversation that was resumed
+    after compaction compacts again cleanly.
+    """
+    turns = []
+    for doc in docs:
+        if "turns" in doc:
+            turns.extend(doc["turns"])
+        else:
+            turns.append({"turn_index": doc.get("turn_index", len(turns)), "input": doc.get("input"),
+                          "response": doc.get("response"), "created_at": doc.get("created_at")})
+    head = docs[-1]
+    compacted = {k: v for k, v in head.items() if k not in ("messages", "turns", "tier", "archive", "raw")}
+    compacted["turns"] = turns
+    compacted["tier"] = "compacted"
+    return compacted
+
+
+def archive_stub(doc, archive_name):
+    stub = {k: doc[k] for k in STUB_FIELDS if k in doc}
+    stub.update(tier="archived", archive=archive_name)
+    return stub
+
+
+class ArchiveStore:
+    """Compressed JSONL files of archived conversations, one file per retention run"""
+
+    def __init__(self, directory, codec=None):
+        self.directory = directory
+        codec = (codec or ("zstd" if zstandard is not None else "gzip")).lower()
+        self.codec = "zstd" if codec == "zstd" and zstandard is not None else "gzip"
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, docs):
+        """Write the documents to a new archive file; returns (file name, compressed bytes)"""
+        suffix = "zst" if self.codec == "zstd" else "gz"
+        name = f"discussions-{datetime.utcnow():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}.jsonl.{suffix}"
+        data = "".join(json_util.dumps(doc) + "\n" for doc in docs).encode()
+        data = zstandard.ZstdCompressor(level=10).compress(data) if self.codec == "zstd" else gzip.compress(data, compresslevel=6)
+        path = os.path.join(self.directory, name)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        return name, len(data)
+
+    def read(self, name, conversation_id):
+        """The archived document of a conversation, or None"""
+        for doc in self.iter_file(name):
+            if doc.get("conversation_id") == conversation_id:
+                return doc
+        return None
+
+    def iter_file(self, name):
+        if os.path.basename(name) != name:
+            raise ValueError(f"Invalid archive name {name}")
+        with open(os.path.join(self.directory, name), "rb") as f:
+            if name.endswith(".zst"):
+                if zstandard is None:
+                    raise RuntimeError("zstandard is needed to read zstd archives")
+                raw = zstandard.ZstdDecompressor().stream_reader(f)
+            else:
+                raw = gzip.GzipFile(fileobj=f)
+            for line in io.TextIOWrapper(raw, encoding="utf-8"):
+                if line.strip():
+                    yield json_util.loads(line)
+
+
+async def load_conversation(discussion_collection, doc, archive_store=None):
+    """Full compacted document for a head or stub: archived stubs are read back from disk"""
+    if doc.get("tier") == "archived":
+        archive_store = archive_store or get_archive_store()
+        return await asyncio.to_thread(archive_store.read, doc["archive"], doc["conversation_id"])
+    if doc.get("tier") == "compacted" and "turns" not in doc:
+        return await discussion_collection.find_one({"_id": doc["_id"]})
+    return doc
+
+
+async def ensure_retention_indexes(discussion_collection):
+    await discussion_collection.create_index([("is_head", 1), ("created_at", 1)])
+    ttl_days = float(os.getenv("RETENTION_TURN_TTL_DAYS", 0))
+    expire_after = int(ttl_days * 86400)
+    existing = (await discussion_collection.index_information()).get(TTL_INDEX_NAME)
+    if existing is None:
+        if expire_after > 0:
+            await discussion_collection.create_index(
+                "created_at", name=TTL_INDEX_NAME, expireAfterSeconds=expire_after,
+                partialFilterExpression={"raw": True, "is_head": False},
+            )
+    elif expire_after <= 0:
+        print(f"RETENTION_TURN_TTL_DAYS is off, dropping index {TTL_INDEX_NAME}")
+        await discussion_collection.drop_index(TTL_INDEX_NAME)
+    elif existing.get("expireAfterSeconds") != expire_after:
+        # create_index would fail with IndexOptionsConflict; collMod changes the TTL in place
+        print(f"Changing {TTL_INDEX_NAME} expireAfterSeconds from {existing.get('expireAfterSeconds')} to {expire_after}")
+        await discussion_collection.database.command(
+            "collMod", discussion_collection.name,
+            index={"name": TTL_INDEX_NAME, "expireAfterSeconds": expire_after},
+        )
+
+
+async def compact(discussion_collection, head, archive_store, report):
+    conversation_id = head["conversation_id"]
+    cursor = discussion_collection.find({"conversation_id": conversation_id}).sort("turn_index", 1)
+    docs = [doc async for doc in cursor if doc.get("turn_index", 0) <= head["turn_index"]]
+    before = sum(document_size(doc) for doc in docs)
+    # A conversation resumed after archival has its archived part back in its stub. When that part
+    # cannot be read the conversation is left alone: compacting would delete the stub's pointer
+    loaded = []
+    for doc in docs:
+        try:
+            full = await load_conversation(discussion_collection, doc, archive_store)
+        except Exception as e:
+            print(f"Could not read archive {doc.get('archive')}: {str(e)}")
+            full = None
+        if full is None:
+            print(f"Skipping compaction of conversation {conversation_id}: archived turns unavailable")
+            report["skipped_conversations"] += 1
+            return None
+        loaded.append(full)
+    compacted = compact_conversation(loaded)
+    # The head only matches while no new turn arrived; otherwise leave it to the next run
+    result = await discussion_collection.replace_one(
+        {"_id": head["_id"], "is_head": True, "turn_index": head["turn_index"]}, compacted
+    )
+    if result.matched_count == 0:
+        return None
+    deleted = await discussion_collection.delete_many(
+        {"conversation_id": conversation_id, "turn_index": {"$lt": head["turn_index"]}}
+    )
+    report["compacted_conversations"] += 1
+    report["turn_documents_removed"] += deleted.deleted_count
+    report["mongo_bytes_before"] += before
+    report["mongo_bytes_after"] += document_size(compacted)
+    return compacted
+
+
+async def run_retention(discussion_collection, archive_store=None, now=None, compact_after_days=None,
+                        archive_after_days=None, batch_size=None):
+    """Compact, then archive, the conversations that have been idle long enough; returns a report"""
+    archive_store = archive_store or get_archive_store()
+    now = now or datetime.utcnow()
+    compact_after_days = float(os.getenv("RETENTION_COMPACT_AFTER_DAYS", 7)) if compact_after_days is None else compact_after_days
+    archive_after_days = float(os.getenv("RETENTION_ARCHIVE_AFTER_DAYS", 90)) if archive_after_days is None else archive_after_days
+    batch_size = int(os.getenv("RETENTION_BATCH_SIZE", 200)) if batch_size is None else batch_size
+    report = {"started_at": now, "compacted_conversations": 0, "turn_documents_removed": 0,
+              "skipped_conversations": 0,
+              "archived_conversations": 0, "archive_files": [], "archive_bytes": 0,
+              "mongo_bytes_before": 0, "mongo_bytes_after": 0}
+
+    compact_cutoff = now - timedelta(days=compact_after_days)
+    cursor = discussion_collection.find({
+        "is_head": True, "tier": {"$exists": False}, "conversation_id": {"$exists": True},
+        "created_at": {"$lt": compact_cutoff},
+    }).sort("created_at", 1).limit(batch_size)
+    for head in [doc async for doc in cursor]:
+        await compact(discussion_collection, head, archive_store, report)
+
+    archive_cutoff = now - timedelta(days=max(archive_after_days, compact_after_days))
+    cursor = discussion_collection.find({
+        "is_head": True, "tier": "compacted", "created_at": {"$lt": archive_cutoff},
+    }).sort("created_at", 1).limit(batch_size)
+    cold = [doc async for doc in cursor]
+    if cold:
+        # The file is written before any stub, so a failed run loses nothing
+        name, size = await asyncio.to_thread(archive_store.write, cold)
+        report["archive_files"].append(name)
+        report["archive_bytes"] += size
+        for doc in cold:
+            stub = archive_stub(doc, name)
+            result = await discussion_collection.replace_one(
+                {"_id": doc["_id"], "is_head": True, "turn_index": doc["turn_index"]}, stub
+            )
+            if result.matched_count:
+                report["archived_conversations"] += 1
+                report["mongo_bytes_before"] += document_size(doc)
+                report["mongo_bytes_after"] += document_size(stub)
+
+    report["mongo_bytes_saved"] = report["mongo_bytes_before"] - report["mongo_bytes_after"]
+    report["finished_at"] = datetime.utcnow()
+    global _last_report
+    _last_report = report
+    return report
+
+
+# Lazy, per-process archive store and the report of the last run in this process
+_archive_store = None
+_last_report = None
+
+def get_archive_store():
+    global _archive_store
+    if _archive_store is None:
+        directory = os.getenv("RETENTION_ARCHIVE_DIR") or os.path.join(os.path.dirname(__file__), "data", "archive")
+        _archive_store = ArchiveStore(directory, os.getenv("RETENTION_ARCHIVE_CODEC"))
+    return _archive_store
+
+def last_report():
+    return _last_report
+
+
+if __name__ == "__main__":
+    import main
+    discussion_collection, _, _ = main.get_db_collections()
+    print(asyncio.run(run_retention(discussion_collection)))
@@ -0,0 +1,172 @@
+#search_gate.py
+"""
+Decides whether a general chat turn needs a fresh web search.
+
+Follow-ups such as "thanks", "make that shorter" or "explain point 3" are answered from the
+conversation itself: the numbered sources already attached to the previous answer (the
+"### Sources" block written by format_source_links) are reused so citations stay valid, and
+the Tavily round trip is skipped. Uncertain inputs can optionally be sent to a cheap model
+classifier (SEARCH_GATE_CLASSIFIER=llm); otherwise they are searched as before.
+"""
+import os
+import re
+import threading
+from collections import namedtuple
+from dotenv import load_dotenv
+load_dotenv()
+
+SearchDecision = namedtuple("SearchDecision", ["search", "reason", "sources"])
+
+# Pure acknowledgements: no search and nothing to cite
+_ACK_RE = re.compile(
+    r"^\s*(?:ok(?:ay)?|k|thanks?(?: you)?(?: so much| a lot)?|thx|ty|cool|great|nice|perfect|awesome|"
+    r"got it|understood|sounds good|makes sense|appreciate it|that helps|helpful|yes|no|sure)"
+    r"[\s!.,:)]*$",
+    re.IGNORECASE,
+)
+
+# Requests that operate on the previous answer rather than asking about something new
+_REFERENTIAL_RE = re.compile(
+    r"^\s*(?:(?:can|could|would) you\s+|please\s+)?"
+    r"(?:make (?:it|that|this|the (?:answer|response|report))|shorten|condense|rephrase|reword|rewrite|"
+    r"simplify|summari[sz]e (?:it|that|this|the above|your)|tl;?dr|translate|format (?:it|that|this)|"
+    r"(?:explain|elaborate on|expand on|clarify|tell me more about) "
+    r"(?:point|section|item|bullet|number|step|force|the (?:\w+ )?(?:point|section|item|bullet|step))|"
+    r"(?:explain|elaborate on|expand on|clarify) (?:it|that|this|the above|your)|"
+    r"what do you mean|what does (?:that|this|it) mean|why (?:is|was|did) (?:that|this|it)|"
+    r"put (?:it|that|this) in|turn (?:it|that|this) into|give me (?:a|the) (?:shorter|longer|simpler))",
+    re.IGNORECASE,
+)
+
+# Signals that the user wants information that the previous turn cannot contain
+_FRESH_RE = re.compile(
+    r"\b(?:latest|news|today|current(?:ly)?|recent(?:ly)?|this (?:week|month|year)|20\d\d|"
+    r"price|stock|search|look up|find (?:out|me)|source for|compare with|versus|vs\.?)\b|https?://",
+    re.IGNORECASE,
+)
+
+_PRONOUN_RE = re.compile(r"\b(?:it|that|this|those|these|above|previous|earlier|you said)\b", re.IGNORECASE)
+
+_SOURCES_HEADER = "### Sources\n"
+_SOURCE_LINE_RE = re.compile(r"^(\d+)\. \[(.*)\]\((\S+)\)\s*$")
+
+
+def parse_source_links(text):
+    """
+    Recover the numbered sources from a "### Sources" block produced by format_source_links.
+    The list is positional (index n-1 holds source [n], gaps are None) so re-formatting it
+    keeps the same citation numbers.
+    """
+    if not text or _SOURCES_HEADER not in text:
+        return []
+    block = text.rsplit(_SOURCES_HEADER, 1)[1]
+    numbered = {}
+    for line in block.splitlines():
+        match = _SOURCE_LINE_RE.match(line.strip())
+        if match:
+            numbered[int(match.group(1))] = {"title": match.group(2), "url": match.group(3)}
+    if not numbered:
+        return []
+    return [numbered.get(n) for n in range(1, max(numbered) + 1)]
+
+
+def last_ai_message(messages):
+    for message in reversed(messages or []):
+        if isinstance(message, (list, tuple)) and len(message) == 2 and message[0] in ("ai", "assistant", "bot"):
+            return message[1]
+    return None
+
+
+class SearchGate:
+    """Search-necessity heuristics plus counters for skipped searches and latency saved"""
+
+    def __init__(self, classifier=None):
+        # classifier(text, previous_answer) -> bool (True means search), used for uncertain inputs
+        self.classifier = classifier
+        self._lock = threading.Lock()
+        self._stats = {"searches_performed": 0, "searches_skipped": 0, "sources_reused": 0,
+                       "search_cache_hits": 0, "classifier_calls": 0, "total_search_latency": 0.0,
+                       "skip_reasons": {}}
+
+    def decide(self, text, messages, record=True):
+        """``record=False`` leaves classifier_calls alone (used by speculative prefetch)"""
+        previous = last_ai_message(messages)
+        if previous is None:
+            return SearchDecision(True, "no_previous_answer", None)
+        if _FRESH_RE.search(text):
+            return SearchDecision(True, "fresh_information", None)
+        if _ACK_RE.match(text):
+            return SearchDecision(False, "acknowledgement", [])
+        if _REFERENTIAL_RE.match(text):
+            return SearchDecision(False, "refers_to_previous_answer", parse_source_links(previous))
+        if len(text.split()) <= 8 and _PRONOUN_RE.search(text):
+            return SearchDecision(False, "short_follow_up", parse_source_links(previous))
+        if self.classifier is not None:
+            if record:
+                with self._lock:
+                    self._stats["classifier_calls"] += 1
+            try:
+                if not self.classifier(text, previous):
+                    return SearchDecision(False, "classifier", parse_source_links(previous))
+            except Exception as e:
+                print(f"Search gate classifier failed, searching anyway: {e}")
+            return SearchDecision(True, "classifier", None)
+        return SearchDecision(True, "default", None)
+
+    def record_search(self, elapsed):
+        with self._lock:
+            self._stats["searches_performed"] += 1
+            self._stats["total_search_latency"] += elapsed
+
+    def record_cache_hit(self):
+        with self._lock:
+            self._stats["search_cache_hits"] += 1
+
+    def record_skip(self, decision):
+        with self._lock:
+            self._stats["searches_skipped"] += 1
+            self._stats["sources_reused"] += sum(1 for s in decision.sources or [] if s)
+            reasons = self._stats["skip_reasons"]
+            reasons[decision.reason] = reasons.get(decision.reason, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, skip_reasons=dict(self._stats["skip_reasons"]))
+        performed = stats["searches_performed"]
+        stats["avg_search_latency"] = stats["total_search_latency"] / performed if performed else 0.0
+        # Every skipped or cached search would have cost roughly one average search round trip
+        avoided = stats["searches_skipped"] + stats["search_cache_hits"]
+        stats["estimated_latency_saved"] = avoided * stats["avg_search_latency"]
+        return stats
+
+
+def llm_search_classifier(model_router):
+    """Yes/no classifier on the cheap "search_gate" route of the model router"""
+    def classify(text, previous_answer):
+        response = model_router.invoke(
+            "search_gate",
+            f"""
+            Decide if answering the user's latest message needs a new web search, or if the
+            previous assistant answer already contains what is needed.
+            Reply with exactly one word: SEARCH or CONTEXT.
+
+            Previous assistant answer (truncated): {previous_answer[:1500]}
+            Latest message: {text}
+            """,
+        )
+        return "CONTEXT" not in str(response.content).upper()
+    return classify
+
+
+# Lazy, per-process gate shared by the workflow and the stats endpoint
+_gate = None
+
+def get_search_gate():
+    global _gate
+    if _gate is None:
+        classifier = None
+        if os.getenv("SEARCH_GATE_CLASSIFIER", "").lower() == "llm":
+            from model_tiering import get_model_router
+            classifier = llm_search_classifier(get_model_router())
+        _gate = SearchGate(classifier=classifier)
+    return _gate
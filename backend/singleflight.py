@@ -0,0 +1,61 @@
+#singleflight.py
+"""
+Coalescing of concurrent identical analyses.
+
+When a team opens the same company at once, or a user double-clicks send, identical /analyze/
+requests arrive while the first one is still running. Requests with the same key (route,
+normalized input and a hash of the conversation so far) wait for the computation already in
+flight and share its result, instead of paying for another search and LLM call. Only concurrent
+requests are coalesced; nothing is kept once the computation finishes (that is the job of the
+optional workflow cache).
+
+The computation runs as its own task, so a leader whose client disconnects does not cancel it
+for the requests waiting on it.
+"""
+import asyncio
+from cache import cache_key
+
+
+def flight_key(route, user_input, messages):
+    return cache_key("analyze", route, " ".join(user_input.lower().split()), messages)
+
+
+class SingleFlight:
+    def __init__(self):
+        self._in_flight = {}  # key -> asyncio.Task
+        self._stats = {"requests": 0, "executions": 0, "coalesced": 0, "errors": 0}
+
+    async def run(self, key, compute):
+        """Result of ``compute()`` (a coroutine function), shared with concurrent callers of the same key"""
+        self._stats["requests"] += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            self._stats["executions"] += 1
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self._stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Retrieve the exception even if every waiter went away, so it is not reported as unhandled
+        if not task.cancelled() and task.exception() is not None:
+            self._stats["errors"] += 1
+
+    def stats(self):
+        stats = dict(self._stats, in_flight=len(self._in_flight))
+        stats["coalesced_ratio"] = stats["coalesced"] / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+
+# Lazy, per-process coalescer; identical requests landing on different workers are not merged
+_single_flight = None
+
+def get_single_flight():
+    global _single_flight
+    if _single_flight is None:
+        _single_flight = SingleFlight()
+    return _single_flight
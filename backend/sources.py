@@ -0,0 +1,148 @@
+#sources.py
+"""
+Compact prompt serialization of search results and chat history.
+
+Instead of pasting the Python repr of the Tavily result list (full page content included) into
+the prompt, each source becomes a single line ``[n] title — url — snippet`` where ``n`` matches
+the number format_source_links prints under "### Sources". Snippets keep only the sentences most
+relevant to the user's query and the whole block stays inside a character budget
+(PROMPT_SOURCE_BUDGET_CHARS, or PROMPT_SOURCE_BUDGET_TOKENS at ~4 chars per token).
+"""
+import os
+import re
+from dotenv import load_dotenv
+load_dotenv()
+
+DEFAULT_SOURCE_BUDGET_CHARS = 4000
+DEFAULT_HISTORY_BUDGET_CHARS = 8000
+HISTORY_MESSAGE_CHARS = 1500
+CHARS_PER_TOKEN = 4
+
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_WHITESPACE_RE = re.compile(r"\s+")
+_STOPWORDS = frozenset(
+    "the and for with that this from what about into over are was were has have had its their "
+    "our your you how why who which when where analysis company business 2025".split()
+)
+
+
+def source_budget_chars():
+    tokens = os.getenv("PROMPT_SOURCE_BUDGET_TOKENS")
+    if tokens:
+        return int(tokens) * CHARS_PER_TOKEN
+    return int(os.getenv("PROMPT_SOURCE_BUDGET_CHARS", DEFAULT_SOURCE_BUDGET_CHARS))
+
+
+def history_budget_chars():
+    return int(os.getenv("PROMPT_HISTORY_BUDGET_CHARS", DEFAULT_HISTORY_BUDGET_CHARS))
+
+
+def extract_source(result):
+    """
+    (title, url, content) of a search result, or None when the entry is not usable.
+    Understands Tavily dicts, dicts carrying a ``metadata`` dict and LangChain Documents.
+    """
+    if isinstance(result, dict):
+        if "url" in result and "title" in result:
+            url, title = result["url"], result["title"]
+            content = result.get("content") or ""
+        elif isinstance(result.get("metadata"), dict):
+            metadata = result["metadata"]
+            url = metadata.get("source", metadata.get("url", ""))
+            title = metadata.get("title", url)
+            content = result.get("page_content") or result.get("content") or ""
+        else:
+            return None
+    elif hasattr(result, "metadata") and hasattr(result, "page_content"):
+        metadata = result.metadata
+        url = metadata.get("source", metadata.get("url", ""))
+        title = metadata.get("title", url)
+        content = result.page_content or ""
+    else:
+        return None
+
+    title = str(title).strip().replace("\n", " ").replace('"', "'") if title else ""
+    url = str(url).strip() if url else ""
+    if not url or not title:
+        return None
+    return title, url, str(content)
+
+
+def query_terms(query):
+    return {w for w in _WORD_RE.findall((query or "").lower()) if len(w) > 2 and w not in _STOPWORDS}
+
+
+def trim_snippet(content, terms, budget):
+    """Keep the sentences that mention the most query terms, in document order, within ``budget`` chars"""
+    content = _WHITESPACE_RE.sub(" ", content).strip()
+    if len(content) <= budget:
+        return content
+    sentences = [s for s in _SENTENCE_SPLIT_RE.split(content) if s]
+    scored = sorted(
+        range(len(sentences)),
+        key=lambda i: (-len(terms & set(_WORD_RE.findall(sentences[i].lower()))), i),
+    )
+    chosen, used = [], 0
+    for i in scored:
+        length = len(sentences[i]) + 1
+        if used + length > budget:
+            continue
+        chosen.append(i)
+        used += length
+    if not chosen:
+        return content[:max(0, budget - 1)].rstrip() + "…"
+    return " ".join(sentences[i] for i in sorted(chosen))
+
+
+def serialize_sources(results, query=None, budget=None):
+    """
+    Numbered ``[n] title — url — snippet`` lines for the prompt. ``n`` is the 1-based position in
+    ``results``, exactly like format_source_links, and duplicate URLs are dropped the same way.
+    """
+    budget = source_budget_chars() if budget is None else budget
+    entries, seen_urls = [], set()
+    for i, result in enumerate(results or [], 1):
+        source = extract_source(result)
+        if source is None or source[1] in seen_urls:
+            continue
+        seen_urls.add(source[1])
+        entries.append((i, *source))
+    if not entries:
+        return "No search results available."
+
+    terms = query_terms(query)
+    headers = [f"[{i}] {title} — {url}" for i, title, url, _ in entries]
+    snippet_budget = max(0, budget - sum(len(h) + 4 for h in headers)) // len(entries)
+    lines = []
+    for header, (_, _, _, content) in zip(headers, entries):
+        snippet = trim_snippet(content, terms, snippet_budget) if content and snippet_budget else ""
+        lines.append(f"{header} — {snippet}" if snippet else header)
+    return "\n".join(lines)
+
+
+def serialize_history(messages, budget=None):
+    """
+    ``role: content`` lines for the chat history, newest messages kept first. Sources blocks are
+    stripped from earlier answers and older messages are clipped so the history fits ``budget``.
+    """
+    budget = history_budget_chars() if budget is None else budget
+    lines, used = [], 0
+    messages = list(messages or [])
+    for position, message in enumerate(reversed(messages)):
+        if isinstance(message, (list, tuple)) and len(message) == 2:
+            role, content = message
+        else:
+            role, content = "message", message
+        content = str(content).split("\n\n### Sources\n", 1)[0].strip()
+        # The latest message may use the whole budget, earlier ones get a fixed slice
+        limit = budget - used if position == 0 else min(HISTORY_MESSAGE_CHARS, budget - used)
+        if limit <= len(role) + 2:
+            lines.append(f"({len(messages) - position} earlier messages omitted)")
+            break
+        line = f"{role}: {content}"
+        if len(line) > limit:
+            line = line[:limit - 1].rstrip() + "…"
+        lines.append(line)
+        used += len(line) + 1
+    return "\n".join(reversed(lines)) if lines else "(no previous messages)"
@@ -0,0 +1,109 @@
+# test_admission.py
+import asyncio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import admission
+from admission import AdmissionController, AdmissionMiddleware, Shed
+
+def test_queue_hands_slots_over_in_order():
+    controller = AdmissionController(max_in_flight=1, max_queue=2, queue_timeout=1.0)
+    order = []
+    async def job(name):
+        await controller.acquire()
+        order.append(name)
+        await asyncio.sleep(0.01)
+        controller.release(0.01)
+    async def scenario():
+        await asyncio.gather(*(job(n) for n in "abc"))
+    asyncio.run(scenario())
+    assert order == ["a", "b", "c"]
+    assert controller.stats()["in_flight"] == 0 and controller.stats()["queued"] == 2
+
+def test_sheds_when_queue_is_full_or_deadline_passes():
+    controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.05)
+    async def scenario():
+        await controller.acquire()
+        waiting = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(Shed) as full:
+            await controller.acquire()
+        assert full.value.reason == "queue_full" and full.value.retry_after >= 1
+        with pytest.raises(Shed) as late:
+            await waiting
+        assert late.value.reason == "timeout"
+    asyncio.run(scenario())
+    assert controller.stats()["queue_depth"] == 0
+
+def test_sheds_early_when_recent_latency_exceeds_deadline():
+    controller = AdmissionController(max_in_flight=1, max_queue=10, queue_timeout=5)
+    controller._latencies.extend([30.0, 30.0])
+    async def scenario():
+        await controller.acquire()
+        with pytest.raises(Shed) as shed:
+            await controller.acquire()
+        return shed.value
+    shed = asyncio.run(scenario())
+    assert shed.reason == "predicted_timeout" and shed.retry_after == 30
+
+def test_queues_behind_analyses_that_are_nearly_done():
+    """Latency above the deadline does not shed a request whose slot frees up in time."""
+    controller = AdmissionController(max_in_flight=1, max_queue=10, queue_timeout=5)
+    controller._latencies.extend([30.0, 30.0])
+    async def scenario():
+        await controller.acquire()
+        controller._started[0] -= 28  # the running analysis has 2 of its 30 seconds left
+        assert controller.expected_wait(0) == pytest.approx(2, abs=0.1)
+        queued = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0.01)
+        controller.release(28.0)
+        await queued
+        # The handed-over slot just started: a full recent latency to go
+        assert controller.expected_wait(0) == pytest.approx(controller.recent_latency(), abs=0.1)
+    asyncio.run(scenario())
+    stats = controller.stats()
+    assert stats["admitted"] == 2 and stats["shed_predicted"] == 0 and stats["in_flight"] == 1
+
+def test_middleware_guards_analyses_only(monkeypatch):
+    app = FastAPI()
+    app.add_middleware(AdmissionMiddleware)
+    @app.post("/analyze/")
+    async def analyze():
+        return {"ok": True}
+    @app.get("/plans/")
+    async def plans():
+        return []
+    controller = AdmissionController(max_in_flight=1, max_queue=0)
+    controller.in_flight = 1  # a long analysis is running
+    monkeypatch.setattr(admission, "_controller", controller)
+    client = TestClient(app)
+    r = client.post("/analyze/")
+    assert r.status_code == 503 and r.headers["retry-after"] == "60"
+    assert client.get("/plans/").status_code == 200
+    controller.in_flight = 0
+    assert client.post("/analyze/").status_code == 200 and controller.in_flight == 0
+
+def test_background_work_waits_behind_queued_requests():
+    """A batch item only takes a free slot, after every queued request, and is never shed."""
+    controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=1.0)
+    order = []
+    async def request(name):
+        await controller.acquire()
+        order.append(name)
+        await asyncio.sleep(0.01)
+        controller.release(0.01)
+    async def background():
+        await controller.acquire_free_slot()
+        order.append("batch")
+        controller.release(0.01)
+    async def scenario():
+        await controller.acquire()
+        queued = asyncio.create_task(request("queued"))
+        item = asyncio.create_task(background())
+        await asyncio.sleep(0.01)
+        controller.release(0.01)
+        await asyncio.gather(queued, item)
+    asyncio.run(scenario())
+    assert order == ["queued", "batch"]
+    stats = controller.stats()
+    assert stats["background_deferred"] == 1 and stats["background_admitted"] == 1 and stats["in_flight"] == 0
@@ -0,0 +1,59 @@
+# test_cache.py
+import time
+import pytest
+from cache import CacheBackend, MemoryCache, RedisCache, cache_key
+import graph
+
+def test_cache_key_is_stable_and_namespaced():
+    assert cache_key("search", "tesla", [("human", "hi")]) == cache_key("search", "tesla", [("human", "hi")])
+    assert cache_key("search", "tesla") != cache_key("workflow", "tesla")
+
+def test_memory_cache_expiry_and_lru():
+    cache = MemoryCache(max_entries=2)
+    cache.set("a", [1], ttl=60)
+    cache.set("b", {"x": 1}, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("a") == [1]
+    assert cache.get("b") is None  # expired
+    cache.set("c", 3, ttl=60)
+    cache.set("d", 4, ttl=60)
+    assert cache.get("a") is None  # evicted as least recently used
+
+def test_backends_must_implement_the_interface():
+    class Partial(CacheBackend):
+        def get(self, key):
+            return None
+    with pytest.raises(TypeError):
+        Partial()
+
+def test_redis_cache_round_trip():
+    """RedisCache only needs get/set/delete, so a dict-backed stand-in is enough."""
+    class FakeRedis(dict):
+        def set(self, key, value, ex=None):
+            self[key] = value
+        def delete(self, key):
+            self.pop(key, None)
+    cache = RedisCache(FakeRedis())
+    cache.set("k", [{"title": "T"}], ttl=10)
+    assert cache.get("k") == [{"title": "T"}]
+    cache.delete("k")
+    assert cache.get("k") is None
+
+def test_cached_search_hits_tavily_once(monkeypatch):
+    """Identical queries (modulo case and spacing) are served from the shared cache."""
+    monkeypatch.setattr(graph, "get_cache", lambda: shared)
+    shared = MemoryCache()
+    class FakeSearch:
+        calls = 0
+        def invoke(self, query):
+            FakeSearch.calls += 1
+            return [{"title": "T", "url": "https://t.com", "content": query}]
+    class Gate:
+        hits = searches = 0
+        def record_cache_hit(self): Gate.hits += 1
+        def record_search(self, elapsed): Gate.searches += 1
+    tool, gate = FakeSearch(), Gate()
+    first = graph.cached_search(tool, "SWOT of Tesla", gate)
+    second = graph.cached_search(tool, "swot  of tesla", gate)
+    assert first == second
+    assert FakeSearch.calls == 1 and Gate.searches == 1 and Gate.hits == 1
@@ -0,0 +1,61 @@
+# test_compression.py
+import asyncio
+import zlib
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.testclient import TestClient
+import compression
+from compression import CompressionMiddleware
+
+app = FastAPI()
+app.add_middleware(CompressionMiddleware, minimum_size=500)
+
+@app.get("/big")
+async def big():
+    return PlainTextResponse("## Strengths\n" * 200)
+
+@app.get("/small")
+async def small():
+    return PlainTextResponse("ok")
+
+client = TestClient(app)
+
+def test_gzip_above_threshold_only():
+    r = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.text == "## Strengths\n" * 200
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+
+@pytest.mark.skipif(compression.brotli is None, reason="brotli not installed")
+def test_brotli_preferred_when_accepted():
+    r = client.get("/big", headers={"Accept-Encoding": "gzip, br"})
+    assert r.headers["content-encoding"] == "br"
+    assert int(r.headers["content-length"]) < 200
+    assert r.text == "## Strengths\n" * 200
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "br"}).headers
+
+def test_gzip_stream_delivers_each_line_before_the_next():
+    """A streamed NDJSON body is decodable line by line while the stream is still open."""
+    sent = []
+    seen_before_last_chunk = []
+
+    def decoded():
+        body = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+        return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(body)
+
+    async def record(message):
+        sent.append(message)
+
+    async def ndjson(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/x-ndjson")]})
+        await send({"type": "http.response.body", "body": b'{"subject": "tesla"}\n' * 40, "more_body": True})
+        seen_before_last_chunk.append(decoded())
+        await send({"type": "http.response.body", "body": b'{"batch_id": "b1"}\n'})
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", b"gzip")]}
+    asyncio.run(CompressionMiddleware(ndjson, minimum_size=500)(scope, None, record))
+    assert dict(sent[0]["headers"])[b"content-encoding"] == b"gzip"
+    assert seen_before_last_chunk == [b'{"subject": "tesla"}\n' * 40]
+    assert decoded().endswith(b'{"batch_id": "b1"}\n')
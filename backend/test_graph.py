@@ -0,0 +1,51 @@
+# test_graph.py
+import graph
+from cache import MemoryCache
+from search_gate import SearchGate
+
+RESULTS = [{"title": f"T{i}", "url": f"https://example.com/{i}", "content": "text"} for i in range(3)]
+
+class FakeRouter:
+    def __init__(self):
+        self.routes = []
+    def invoke(self, route, prompt):
+        self.routes.append(route)
+        return type("Reply", (), {"content": "Analysis [1]"})()
+
+class FakeSearch:
+    def __init__(self, max_results=5):
+        pass
+    def invoke(self, query):
+        return RESULTS
+
+def build(monkeypatch):
+    router = FakeRouter()
+    monkeypatch.setattr(graph, "get_model_router", lambda: router)
+    monkeypatch.setattr(graph, "get_search_gate", lambda: SearchGate())
+    monkeypatch.setattr(graph, "get_vector_index", lambda: None)
+    monkeypatch.setattr(graph, "get_cache", lambda: MemoryCache())
+    monkeypatch.setattr(graph, "TavilySearchResults", FakeSearch)
+    return graph.initialize_workflow(), router
+
+def test_explicit_route_overrides_keyword_routing(monkeypatch):
+    chain, router = build(monkeypatch)
+    result = chain.invoke({"messages": [], "input": "Tesla", "route": "porter"})
+    assert router.routes == ["porter"]
+    assert result["messages"][-1][1].startswith("Analysis [1]")
+
+def test_keyword_routing_without_route(monkeypatch):
+    chain, router = build(monkeypatch)
+    chain.invoke({"messages": [], "input": "pestle of Tesla"})
+    chain.invoke({"messages": [], "input": "hello", "route": "unknown"})
+    assert router.routes == ["pestle", "general"]
+
+def test_reports_built_on_internal_sources_are_not_reindexed(monkeypatch, tmp_path):
+    """Re-indexing would stamp reused sources as new and they would never age out."""
+    from vector_index import VectorIndex
+    index = VectorIndex(str(tmp_path))
+    build(monkeypatch)
+    monkeypatch.setattr(graph, "get_vector_index", lambda: index)
+    chain = graph.initialize_workflow()
+    chain.invoke({"messages": [], "input": "Tesla", "route": "pestle"})
+    chain.invoke({"messages": [], "input": "Tesla", "route": "swot"})
+    assert len(index) == 1 and index.stats()["internal_hits"] == 1
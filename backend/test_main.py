@@ -1,8 +1,11 @@
 # test_main.py
+import asyncio
+import json
 import pytest
 from fastapi.testclient import TestClient  # HTTPX-based testing client for FastAPI
 import main
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from passlib.context import CryptContext  # for verifying hashed passwords
 from datetime import datetime
 
@@ -40,11 +43,41 @@ class AsyncIterator:
         else:
             raise StopAsyncIteration
 
+def matches(doc, filter):
+    """Equality plus the few query operators the API uses ($gt, $lt, $exists, $text)."""
+    for k, v in (filter or {}).items():
+        if k == "$text":
+            words = v["$search"].lower().split()
+            text = f"{doc.get('input', '')} {doc.get('response', '')}".lower()
+            if not any(w in text for w in words):
+                return False
+        elif isinstance(v, dict) and "$exists" in v:
+            if (k in doc) != v["$exists"]:
+                return False
+        elif isinstance(v, dict) and ("$gt" in v or "$lt" in v):
+            if k not in doc:
+                return False
+            if "$gt" in v and not doc[k] > v["$gt"]:
+                return False
+            if "$lt" in v and not doc[k] < v["$lt"]:
+                return False
+        elif doc.get(k) != v:
+            return False
+    return True
+
+def project(doc, projection):
+    """Inclusion projection; $meta fields are ignored."""
+    if not projection:
+        return doc
+    return {k: v for k, v in doc.items() if k == "_id" or projection.get(k) == 1}
+
 class DummyCursor:
     """Mocks a Motor cursor, primarily to provide a sort() method."""
-    def __init__(self, items_future):
+    def __init__(self, items_future, projection=None):
         self._items_future = items_future # This will be a list of items from the store
         self._sort_params = None
+        self._limit = None
+        self._projection = projection
 
     def sort(self, key_or_list, direction=None):
         if isinstance(key_or_list, list):
@@ -52,6 +85,10 @@ class DummyCursor:
         else:
             self._sort_params = [(key_or_list, direction)]
         return self # Allow chaining like cursor.sort().limit() if needed later
+
+    def limit(self, n):
+        self._limit = n
+        return self
     
     def __aiter__(self):
         # Apply sorting when iteration starts
@@ -60,7 +97,9 @@ class DummyCursor:
             for key, direction_val in reversed(self._sort_params): # motor applies sorts in reverse order of calls
                 items.sort(key=lambda x: x.get(key, datetime.min if isinstance(x.get(key), datetime) else float('-inf')), 
                            reverse=direction_val == -1)
-        return AsyncIterator(items)
+        if self._limit:
+            items = items[:self._limit]
+        return AsyncIterator([project(dict(d), self._projection) for d in items])
 
 class DummyCollection:
     """
@@ -68,9 +107,14 @@ class DummyCollection:
     Supports insert_one and find_one(filter or sort).
     Also supports find, update_one, delete_one for plans.
     """
-    def __init__(self):
+    def __init__(self, unique=None):
         self._store = {}
+        self._unique = unique  # fields of a unique index, enforced when a document has them all
     async def insert_one(self, doc):
+        await asyncio.sleep(0)  # a real driver call yields to other requests
+        if self._unique and all(k in doc for k in self._unique):
+            if any(all(d.get(k) == doc[k] for k in self._unique) for d in self._store.values()):
+                raise DuplicateKeyError("duplicate key")
         _id = ObjectId()
         doc["_id"] = _id
         # For plans, ensure created_at and updated_at are set if not present (though API should do this)
@@ -81,29 +125,27 @@ class DummyCollection:
         self._store[_id] = doc
         return type("R",(),{"inserted_id":_id})()
     
-    async def find_one(self, filter=None, sort=None):
-        # sort => return latest, else filter by arbitrary fields :contentReference[oaicite:2]{index=2}
+    async def find_one(self, filter=None, projection=None, sort=None):
+        # filter by arbitrary fields; sort => the first match in that order
+        await asyncio.sleep(0)
+        found = [d for d in self._store.values() if matches(d, filter)] if filter or sort else []
         if sort:
-            # Ensure values have _id before sorting if that's the key
-            valid_items = [d for d in self._store.values() if "_id" in d]
-            return max(valid_items, key=lambda d: d["_id"], default=None)
-        if filter:
-            # match on any field
-            for doc in self._store.values():
-                if all(doc.get(k)==v for k,v in filter.items()):
-                    return doc
-        return None
+            key, direction = sort[0]
+            found = sorted((d for d in found if key in d), key=lambda d: d[key], reverse=direction == -1)
+        if not found:
+            return None
+        return project(dict(found[0]), projection) if projection else found[0]
     
-    def find(self, filter=None): # filter is not used in current get_all_plans but good to have
+    def find(self, filter=None, projection=None): # filter is not used in current get_all_plans but good to have
         # Returns a DummyCursor which can then be sorted and iterated
         items_in_store = list(self._store.values())
         if filter: # Basic filtering for find()
             filtered_items = []
             for doc in items_in_store:
-                if all(doc.get(k) == v for k, v in filter.items()):
+                if matches(doc, filter):
                     filtered_items.append(doc)
-            return DummyCursor(filtered_items)
-        return DummyCursor(items_in_store)
+            return DummyCursor(filtered_items, projection)
+        return DummyCursor(items_in_store, projection)
 
     async def update_one(self, filter, update):
         updated_count = 0
@@ -112,10 +154,32 @@ class DummyCollection:
                 set_data = update.get("$set", {})
                 for k, v in set_data.items():
                     doc[k] = v
+                for k, v in update.get("$push", {}).items():
+                    doc.setdefault(k, []).append(v)
                 updated_count = 1
                 break
         return type("UpdateResult", (), {"matched_count": updated_count, "modified_count": updated_count})()
 
+    async def update_many(self, filter, update):
+        await asyncio.sleep(0)
+        docs = [doc for doc in self._store.values() if matches(doc, filter)]
+        for doc in docs:
+            doc.update(update.get("$set", {}))
+        return type("UpdateResult", (), {"matched_count": len(docs), "modified_count": len(docs)})()
+
+    async def replace_one(self, filter, replacement):
+        for _id, doc in self._store.items():
+            if matches(doc, filter):
+                self._store[_id] = {**replacement, "_id": _id}
+                return type("UpdateResult", (), {"matched_count": 1})()
+        return type("UpdateResult", (), {"matched_count": 0})()
+
+    async def delete_many(self, filter):
+        doomed = [_id for _id, doc in self._store.items() if matches(doc, filter)]
+        for _id in doomed:
+            del self._store[_id]
+        return type("DeleteResult", (), {"deleted_count": len(doomed)})()
+
     async def delete_one(self, filter):
         _id_to_delete = filter.get("_id")
         if _id_to_delete in self._store:
@@ -128,12 +192,16 @@ def patch_dbs(monkeypatch):
     """
     Replace discussion_collection, user_collection, and plans_collection with DummyCollection.
     """
-    dummy_discussion = DummyCollection()
+    dummy_discussion = DummyCollection(unique=("conversation_id", "turn_index"))
     dummy_user = DummyCollection()
     dummy_plans = DummyCollection() # For plans
-    monkeypatch.setattr(main, "discussion_collection", dummy_discussion)
-    monkeypatch.setattr(main, "user_collection", dummy_user)
-    monkeypatch.setattr(main, "plans_collection", dummy_plans) # Patch plans_collection
+    monkeypatch.setattr(main, "discussion_collection", dummy_discussion, raising=False)
+    monkeypatch.setattr(main, "user_collection", dummy_user, raising=False)
+    monkeypatch.setattr(main, "plans_collection", dummy_plans, raising=False) # Patch plans_collection
+    # main now resolves collections lazily, so route the accessor to the dummies as well
+    monkeypatch.setattr(main, "get_db_collections", lambda: (main.discussion_collection, main.user_collection, main.plans_collection))
+    batch_collection = DummyCollection()
+    monkeypatch.setattr(main, "get_batch_collection", lambda: batch_collection)
     yield
 
 # ─── Tests ────────────────────────────────────────────────────────────────────
@@ -349,3 +417,326 @@ def test_delete_plan_invalid_id_format():
     """DELETE /plans/{plan_id} with a malformed ID should return 400."""
     response = client.delete("/plans/invalid-id-format")
     assert response.status_code == 400
+
+# --- Tests for discussion history ---
+
+def post_turn(user_input, conversation_id=None, user_id="user-1"):
+    payload = {"messages": [], "user_input": user_input, "user_id": user_id}
+    if conversation_id:
+        payload["conversation_id"] = conversation_id
+    r = client.post("/analyze/", json=payload)
+    assert r.status_code == 200
+    return r.json()
+
+def test_analyze_tags_turns_with_conversation():
+    """Turns of one conversation share its id and get increasing turn indexes."""
+    first = post_turn("swot of tesla")
+    second = post_turn("make it shorter", first["conversation_id"])
+    assert first["turn_index"] == 0 and second["turn_index"] == 1
+    assert second["conversation_id"] == first["conversation_id"]
+    heads = [d for d in main.discussion_collection._store.values() if d["is_head"]]
+    assert len(heads) == 1 and heads[0]["turn_index"] == 1
+
+def test_concurrent_turns_of_one_conversation_get_successive_indexes():
+    """Two turns sent together (a double submit) both continue the conversation; one head remains."""
+    import httpx
+    first = post_turn("swot of tesla")
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            return await asyncio.gather(*(ac.post("/analyze/", json={
+                "messages": [], "user_input": text, "conversation_id": first["conversation_id"]})
+                for text in ("shorter please", "and ford?")))
+    responses = asyncio.run(scenario())
+    assert sorted(r.json()["turn_index"] for r in responses) == [1, 2]
+    docs = list(main.discussion_collection._store.values())
+    assert [d["turn_index"] for d in docs if d["is_head"]] == [2]
+    assert {d["title"] for d in docs} == {"swot of tesla"}
+
+def test_failed_insert_keeps_the_previous_head(monkeypatch):
+    first = post_turn("swot of tesla")
+    async def failing_insert_one(doc):
+        raise RuntimeError("write failed")
+    monkeypatch.setattr(main.discussion_collection, "insert_one", failing_insert_one)
+    with pytest.raises(RuntimeError):
+        client.post("/analyze/", json={"messages": [], "user_input": "more", "conversation_id": first["conversation_id"]})
+    (doc,) = main.discussion_collection._store.values()
+    assert doc["is_head"] and doc["turn_index"] == 0
+
+def test_list_discussions_paginates():
+    """GET /discussions returns one summary per conversation, newest first, with a cursor."""
+    ids = [post_turn(f"question {i}")["conversation_id"] for i in range(3)]
+    post_turn("someone else", user_id="user-2")
+    r = client.get("/discussions", params={"user_id": "user-1", "limit": 2})
+    assert r.status_code == 200
+    page = r.json()
+    assert [d["conversation_id"] for d in page["items"]] == [ids[2], ids[1]]
+    assert "response" not in page["items"][0] and "full_history" not in page["items"][0]
+    assert page["items"][0]["title"] == "question 2"
+    r = client.get("/discussions", params={"user_id": "user-1", "limit": 2, "before": page["next_cursor"]})
+    page = r.json()
+    assert [d["conversation_id"] for d in page["items"]] == [ids[0]]
+    assert page["next_cursor"] is None
+
+def test_discussion_turns_lazy_loading():
+    """Turns are returned in order, a page at a time, after the given turn index."""
+    conversation_id = post_turn("turn 0")["conversation_id"]
+    for i in range(1, 5):
+        post_turn(f"turn {i}", conversation_id)
+    r = client.get(f"/discussions/{conversation_id}/turns", params={"limit": 3})
+    page = r.json()
+    assert [t["input"] for t in page["items"]] == ["turn 0", "turn 1", "turn 2"]
+    assert page["next_after"] == 2
+    r = client.get(f"/discussions/{conversation_id}/turns", params={"after": 2, "limit": 3})
+    assert [t["turn_index"] for t in r.json()["items"]] == [3, 4]
+    assert client.get("/discussions/unknown/turns").status_code == 404
+
+def test_search_discussions():
+    post_turn("porter analysis of airlines")
+    post_turn("swot of tesla")
+    r = client.get("/discussions/search", params={"user_id": "user-1", "q": "airlines"})
+    assert r.status_code == 200
+    assert [d["input"] for d in r.json()["items"]] == ["porter analysis of airlines"]
+
+def test_list_discussions_invalid_cursor():
+    r = client.get("/discussions", params={"user_id": "user-1", "before": "nope"})
+    assert r.status_code == 400
+
+# --- Tests for conditional reads and delta responses ---
+
+def test_plan_reads_revalidate_with_etag():
+    """Unchanged reads answer 304; an update changes the ETag."""
+    plan_id = client.post("/plans/", json={"title": "T", "description": "D", "status": "todo"}).json()["_id"]
+    first = client.get("/plans/")
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"')
+    assert client.get("/plans/", headers={"If-None-Match": etag}).status_code == 304
+    single = client.get(f"/plans/{plan_id}")
+    assert client.get(f"/plans/{plan_id}", headers={"If-None-Match": single.headers["etag"].removeprefix("W/")}).status_code == 304
+    client.put(f"/plans/{plan_id}", json={"status": "done"})
+    again = client.get("/plans/", headers={"If-None-Match": etag})
+    assert again.status_code == 200 and again.json()[0]["status"] == "done"
+
+def test_discussion_turns_revalidate_with_etag():
+    conversation_id = post_turn("swot of tesla")["conversation_id"]
+    r = client.get(f"/discussions/{conversation_id}/turns")
+    assert client.get(f"/discussions/{conversation_id}/turns", headers={"If-None-Match": r.headers["etag"]}).status_code == 304
+    post_turn("and ford?", conversation_id)
+    assert client.get(f"/discussions/{conversation_id}/turns", headers={"If-None-Match": r.headers["etag"]}).status_code == 200
+
+def test_etag_is_shared_across_content_codings():
+    """Compressed and plain copies of one read carry the same weak validator."""
+    conversation_id = post_turn("swot of tesla")["conversation_id"]
+    url = f"/discussions/{conversation_id}/turns"
+    gzipped = client.get(url, headers={"Accept-Encoding": "gzip"})
+    plain = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert gzipped.headers["etag"] == plain.headers["etag"]
+    assert gzipped.headers["etag"].startswith("W/")
+    assert client.get(url, headers={"Accept-Encoding": "identity", "If-None-Match": gzipped.headers["etag"]}).status_code == 304
+
+def test_analyze_delta_omits_full_history():
+    r = client.post("/analyze/", json={"messages": [("human", "hi"), ("ai", "hello")], "user_input": "Q", "delta": True})
+    assert r.status_code == 200
+    d = r.json()
+    assert "full_history" not in d
+    assert d["response"] == "Reply [src]" and d["turn_index"] == 0
+
+def test_mongo_json_response_renders_raw_documents():
+    """ObjectId and datetime values are serialized without an intermediate model."""
+    _id = ObjectId()
+    body = main.MongoJSONResponse({"_id": _id, "created_at": datetime(2024, 5, 1, 9, 30)}).body
+    assert body == f'{{"_id":"{_id}","created_at":"2024-05-01T09:30:00"}}'.encode()
+
+# --- Tests for batch analysis ---
+
+def test_batch_streams_each_subject_and_stores_record(monkeypatch):
+    """Every subject is forced onto the framework route; results arrive as NDJSON lines."""
+    states = []
+    class RecordingChain:
+        def invoke(self, state):
+            states.append(state)
+            if state["input"] == "Broken Co":
+                raise RuntimeError("upstream failed")
+            return {"messages": [("ai", f"SWOT of {state['input']}")]}
+    monkeypatch.setattr(main, "get_analysis_chain", lambda: RecordingChain())
+    r = client.post("/analyze/batch", json={"framework": "swot", "subjects": ["Tesla", " ", "Ford", "Broken Co"]})
+    assert r.status_code == 200 and r.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert lines[0]["total"] == 3
+    assert sorted(line["subject"] for line in lines[1:4]) == ["Broken Co", "Ford", "Tesla"]
+    assert lines[-1]["completed"] == 2 and lines[-1]["failed"] == 1
+    assert {s["route"] for s in states} == {"swot"} and all(s["messages"] == [] for s in states)
+
+    batch = client.get(f"/analyze/batch/{lines[0]['batch_id']}").json()
+    assert batch["status"] == "done"
+    assert [item["subject"] for item in batch["items"]] == ["Tesla", "Ford", "Broken Co"]
+    report = client.get(f"/analyze/batch/{lines[0]['batch_id']}/download?format=md").text
+    assert report.index("SWOT of Tesla") < report.index("SWOT of Ford") < report.index("upstream failed")
+
+def test_batch_items_take_admission_slots_one_by_one(monkeypatch):
+    """The batch stream is not guarded as one request; each subject holds a slot while it runs."""
+    import threading
+    import time
+    from admission import AdmissionController
+    running, peak = [], []
+    lock = threading.Lock()
+    class SlowChain:
+        def invoke(self, state):
+            with lock:
+                running.append(state["input"])
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(state["input"])
+            return {"messages": [("ai", state["input"])]}
+    monkeypatch.setattr(main, "get_analysis_chain", lambda: SlowChain())
+    controller = AdmissionController(max_in_flight=1)
+    monkeypatch.setattr(main, "get_admission_controller", lambda: controller)
+    r = client.post("/analyze/batch", json={"framework": "swot", "subjects": ["A", "B", "C"]})
+    assert json.loads(r.text.splitlines()[-1])["completed"] == 3
+    assert max(peak) == 1
+    assert controller.stats()["background_admitted"] == 3 and len(controller._latencies) == 3
+
+def test_batch_stream_ends_when_the_batch_fails(monkeypatch):
+    """A failed Mongo write ends the stream with an error line instead of hanging it."""
+    batch_collection = main.get_batch_collection()
+    update_one = batch_collection.update_one
+    async def failing_update_one(filter, update):
+        if "$push" in update:
+            raise RuntimeError("write failed")
+        return await update_one(filter, update)
+    monkeypatch.setattr(batch_collection, "update_one", failing_update_one)
+    r = client.post("/analyze/batch", json={"framework": "swot", "subjects": ["Tesla", "Ford"]})
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert lines[-1]["status"] == "error" and lines[-1]["error"] == "write failed"
+    assert client.get(f"/analyze/batch/{lines[0]['batch_id']}").json()["status"] == "error"
+
+def test_downloads_reject_unknown_formats():
+    post_turn("swot of tesla")
+    assert client.get("/download/?format=../../etc/x").status_code == 400
+    assert client.get(f"/analyze/batch/{ObjectId()}/download?format=exe").status_code == 400
+
+def test_batch_rejects_unknown_framework():
+    r = client.post("/analyze/batch", json={"framework": "bcg", "subjects": ["Tesla"]})
+    assert r.status_code == 400
+    assert client.get(f"/analyze/batch/{ObjectId()}").status_code == 404
+
+def test_prefetch_returns_route_immediately(monkeypatch):
+    calls = []
+    class FakePrefetcher:
+        def schedule(self, client_id, draft, messages):
+            calls.append((client_id, draft, messages))
+            return {"route": "swot", "status": "scheduled"}
+    monkeypatch.setattr(main, "get_prefetcher", lambda: FakePrefetcher())
+    r = client.post("/prefetch", json={"client_id": "tab-1", "draft": "swot of tesla"})
+    assert r.status_code == 202 and r.json()["route"] == "swot"
+    assert calls == [("tab-1", "swot of tesla", [])]
+    assert client.post("/prefetch", json={"client_id": "tab-1", "draft": "x" * 2001}).status_code == 422
+
+def test_concurrent_identical_analyses_share_one_run(monkeypatch):
+    """Five identical requests in flight together cost one chain run; each still stores its turn."""
+    import asyncio
+    import threading
+    import time
+    import httpx
+    from singleflight import SingleFlight
+    calls = []
+    class SlowChain:
+        def invoke(self, state):
+            calls.append(threading.get_ident())
+            time.sleep(0.3)
+            return {"messages": state["messages"] + [("ai", f"Report on {state['input']}")]}
+    monkeypatch.setattr(main, "get_analysis_chain", lambda: SlowChain())
+    flights = SingleFlight()
+    monkeypatch.setattr(main, "get_single_flight", lambda: flights)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            same = [ac.post("/analyze/", json={"messages": [], "user_input": "SWOT of Tesla"}) for _ in range(5)]
+            other = ac.post("/analyze/", json={"messages": [], "user_input": "SWOT of Ford"})
+            return await asyncio.gather(*same, other)
+
+    started = time.perf_counter()
+    responses = asyncio.run(scenario())
+    assert time.perf_counter() - started < 1.0  # ran on the threadpool, not one after another
+    assert len(calls) == 2
+    assert {r.json()["response"] for r in responses[:5]} == {"Report on SWOT of Tesla"}
+    assert responses[5].json()["response"] == "Report on SWOT of Ford"
+    assert len(main.discussion_collection._store) == 6
+    assert flights.stats()["coalesced"] == 4 and flights.stats()["executions"] == 2
+
+# --- Tests for retention ---
+
+@pytest.fixture
+def retention_env(monkeypatch, tmp_path):
+    import retention
+    monkeypatch.setenv("ADMIN_TOKEN", "s3cret")
+    monkeypatch.setenv("RETENTION_ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(retention, "_archive_store", None)
+    yield {"X-Admin-Token": "s3cret"}
+
+def idle_conversation(days, turns=3):
+    from datetime import timedelta
+    conversation_id = None
+    for i in range(turns):
+        conversation_id = post_turn(f"question {i}", conversation_id)["conversation_id"]
+    for doc in main.discussion_collection._store.values():
+        doc["created_at"] -= timedelta(days=days)
+    return conversation_id
+
+def test_retention_compacts_idle_conversations(retention_env):
+    conversation_id = idle_conversation(days=10)
+    report = client.post("/admin/retention/run", headers=retention_env).json()
+    assert report["compacted_conversations"] == 1 and report["turn_documents_removed"] == 2
+    assert report["archived_conversations"] == 0 and report["mongo_bytes_saved"] > 0
+    (doc,) = main.discussion_collection._store.values()
+    assert doc["tier"] == "compacted" and "messages" not in doc
+    page = client.get(f"/discussions/{conversation_id}/turns?after=0&limit=1").json()
+    assert [t["input"] for t in page["items"]] == ["question 1"] and page["next_after"] == 1
+    assert client.get("/admin/retention", headers=retention_env).json()["compacted_conversations"] == 1
+
+def test_retention_archives_cold_conversations_readably(retention_env, tmp_path):
+    conversation_id = idle_conversation(days=120)
+    report = client.post("/admin/retention/run", headers=retention_env).json()
+    assert report["archived_conversations"] == 1 and report["archive_bytes"] > 0
+    assert (tmp_path / report["archive_files"][0]).exists()
+    (stub,) = main.discussion_collection._store.values()
+    assert stub["tier"] == "archived" and "full_history" not in stub
+    turns = client.get(f"/discussions/{conversation_id}/turns").json()["items"]
+    assert [t["input"] for t in turns] == ["question 0", "question 1", "question 2"]
+    listed = client.get("/discussions?user_id=user-1").json()["items"]
+    assert listed[0]["conversation_id"] == conversation_id
+    r = client.get(f"/download/?format=md&conversation_id={conversation_id}")
+    assert "question 2: Reply [src]" in r.text
+    # Nothing left to do on a second run
+    assert client.post("/admin/retention/run", headers=retention_env).json()["archived_conversations"] == 0
+
+def test_resumed_compacted_conversation_keeps_its_turns(retention_env):
+    """Resuming moves the head off the compacted document, which must not become TTL-expirable."""
+    from datetime import timedelta
+    conversation_id = idle_conversation(days=10)
+    client.post("/admin/retention/run", headers=retention_env)
+    post_turn("question 3", conversation_id)
+    docs = sorted(main.discussion_collection._store.values(), key=lambda d: d["turn_index"])
+    assert [(d["tier"] if "tier" in d else None, d["is_head"], d.get("raw")) for d in docs] == [
+        ("compacted", False, None), (None, True, True)]
+    for doc in docs:
+        doc["created_at"] -= timedelta(days=10)
+    report = client.post("/admin/retention/run", headers=retention_env).json()
+    assert report["compacted_conversations"] == 1
+    (doc,) = main.discussion_collection._store.values()
+    assert [t["input"] for t in doc["turns"]] == ["question 0", "question 1", "question 2", "question 3"]
+
+def test_compaction_skips_conversations_with_unreadable_archives(retention_env, tmp_path):
+    from datetime import timedelta
+    conversation_id = idle_conversation(days=120)
+    archive = client.post("/admin/retention/run", headers=retention_env).json()["archive_files"][0]
+    (tmp_path / archive).unlink()
+    post_turn("question 3", conversation_id)
+    for doc in main.discussion_collection._store.values():
+        doc["created_at"] -= timedelta(days=10)
+    report = client.post("/admin/retention/run", headers=retention_env).json()
+    assert report["compacted_conversations"] == 0 and report["skipped_conversations"] == 1
+    tiers = sorted(d.get("tier", "raw") for d in main.discussion_collection._store.values())
+    assert tiers == ["archived", "raw"]  # the stub still points at its archive
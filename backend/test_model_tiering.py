@@ -0,0 +1,79 @@
+# test_model_tiering.py
+import time
+from model_tiering import ModelRouter, FAST_MODEL, PREMIUM_MODEL
+
+"""
+The router is tested with a fake LLM factory so no Gemini calls are made
+"""
+class FakeLLM:
+    def __init__(self, name, delay=0.0):
+        self.name = name
+        self.delay = delay
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        time.sleep(self.delay)
+        return type("Msg", (), {"content": f"{self.name}: ok",
+                                "usage_metadata": {"input_tokens": 1000, "output_tokens": 500}})()
+
+def make_router(delays=None, **kwargs):
+    delays = delays or {}
+    llms = {}
+    def factory(name):
+        llms[name] = FakeLLM(name, delays.get(name, 0.0))
+        return llms[name]
+    router = ModelRouter(llm_factory=factory, **kwargs)
+    return router, llms
+
+def test_routes_use_their_tier(monkeypatch):
+    """general runs on the flash model, framework reports on the pro model."""
+    monkeypatch.delenv("MODEL_GENERAL", raising=False)
+    monkeypatch.delenv("MODEL_PORTER", raising=False)
+    router, llms = make_router()
+    router.invoke("general", "hi")
+    router.invoke("porter", "five forces")
+    assert llms[FAST_MODEL].calls == 1
+    assert llms[PREMIUM_MODEL].calls == 1
+
+def test_env_overrides_route_model(monkeypatch):
+    """MODEL_<ROUTE> env var overrides the tier table."""
+    monkeypatch.setenv("MODEL_SWOT", "custom-model")
+    router, llms = make_router()
+    router.invoke("swot", "q")
+    assert "custom-model" in llms
+
+def test_cost_and_latency_accounting():
+    """Token usage is priced per model and aggregated per route."""
+    router, _ = make_router(prices={FAST_MODEL: (1.0, 2.0)})
+    router.invoke("general", "a")
+    router.invoke("general", "b")
+    stats = router.stats()["general"]
+    assert stats["calls"] == 2
+    assert stats["input_tokens"] == 2000 and stats["output_tokens"] == 1000
+    assert abs(stats["cost_usd"] - 0.004) < 1e-9
+    assert stats["models"][FAST_MODEL]["calls"] == 2
+
+def test_fallback_on_slo_breach(monkeypatch):
+    """A slow primary trips the SLO and later calls go to the fallback model."""
+    monkeypatch.delenv("MODEL_GENERAL", raising=False)
+    router, llms = make_router(delays={FAST_MODEL: 0.02}, latency_slo=0.01, window=3,
+                               cooldown=60, fallback_model="fast-fallback")
+    for _ in range(3):
+        router.invoke("general", "q")
+    assert router.in_fallback("general")
+    router.invoke("general", "q")
+    assert llms["fast-fallback"].calls == 1
+    stats = router.stats()["general"]
+    assert stats["slo_breaches"] == 1
+    assert stats["fallback_calls"] == 1
+
+def test_invalid_model_prices_fall_back_to_defaults(monkeypatch):
+    """Malformed MODEL_PRICES is ignored instead of breaking every request."""
+    from model_tiering import DEFAULT_PRICES
+    monkeypatch.setenv("MODEL_PRICES", "{not json")
+    router, _ = make_router()
+    assert router.prices == DEFAULT_PRICES
+    monkeypatch.setenv("MODEL_PRICES", '{"custom-model": [1.0, 2.0]}')
+    router, _ = make_router()
+    assert router.prices["custom-model"] == [1.0, 2.0]
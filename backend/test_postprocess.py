@@ -0,0 +1,60 @@
+# test_postprocess.py
+import random
+from postprocess import sanitize_markdown, IncrementalSanitizer, validate_citations, format_source_links
+
+SAMPLES = [
+    "```markdown\n# Title\nSome text ## Inline header\n### Kept\n```",
+    "```md   \n\n## A\nbody\n\n```\n",
+    "  plain text # header later and `code` ``` not a fence\n### H3\n",
+    "```python\nprint('hi')\n```",
+    "",
+    "```markdown",
+    "# T\n\ntext ending with hashes ##",
+]
+
+RESULTS = [
+    {"title": "A", "url": "https://a.com", "content": "a"},
+    {"title": "A again", "url": "https://a.com", "content": "dup"},
+    {"title": "B", "url": "https://b.com", "content": "b"},
+]
+
+def run_incremental(text, chunk_sizes):
+    sanitizer = IncrementalSanitizer()
+    out, i = [], 0
+    while i < len(text):
+        size = chunk_sizes[len(out) % len(chunk_sizes)]
+        out.append(sanitizer.feed(text[i:i + size]))
+        i += size
+    out.append(sanitizer.finish())
+    return "".join(out)
+
+def test_sanitize_strips_fences_and_fixes_headers():
+    assert sanitize_markdown(SAMPLES[0]) == "# Title\nSome text \n## Inline header\n### Kept"
+
+def test_sanitize_keeps_deep_headers_intact():
+    """### must not be split into '#' and '## '."""
+    assert sanitize_markdown("intro\n### Sources\n1. x") == "intro\n### Sources\n1. x"
+
+def test_incremental_matches_batch_for_any_chunking():
+    rng = random.Random(0)
+    for text in SAMPLES:
+        expected = sanitize_markdown(text)
+        for _ in range(50):
+            sizes = [rng.randint(1, 7) for _ in range(5)]
+            assert run_incremental(text, sizes) == expected, (text, sizes)
+
+def test_validate_citations_drops_and_remaps():
+    text, counts = validate_citations("Growth [1] and [2], also [7]. Both [1, 3]. Code `a[9]`, link [1](https://x).", RESULTS)
+    assert text == "Growth [1] and [1], also. Both [1, 3]. Code `a[9]`, link [1](https://x)."
+    assert counts == {"dropped": 1, "remapped": 1}
+
+def test_format_source_links_numbering():
+    assert format_source_links(RESULTS) == "\n\n### Sources\n1. [A](https://a.com)\n3. [B](https://b.com)"
+    assert format_source_links([]) == ""
+    assert format_source_links([None, {"bad": 1}]) == ""
+
+def test_validate_citations_skips_fenced_code():
+    text = "Intro [9].\n```python\nx = arr[2]\n```\nAfter [1].\n~~~\nm[3]\n~~~\nEnd [2]."
+    out, counts = validate_citations(text, RESULTS)
+    assert out == "Intro.\n```python\nx = arr[2]\n```\nAfter [1].\n~~~\nm[3]\n~~~\nEnd [1]."
+    assert counts == {"dropped": 1, "remapped": 1}
@@ -0,0 +1,72 @@
+# test_prefetch.py
+import asyncio
+import graph
+from cache import MemoryCache
+from prefetch import Prefetcher
+from search_gate import SearchGate
+
+class FakeSearch:
+    def __init__(self):
+        self.queries = []
+    def invoke(self, query):
+        self.queries.append(query)
+        return [{"title": "T", "url": "https://t.com", "content": query}]
+
+def make(monkeypatch, delay=0.0):
+    monkeypatch.setattr(graph, "get_cache", lambda cache=MemoryCache(): cache)
+    tool = FakeSearch()
+    return Prefetcher(tool, SearchGate(), delay=delay, min_chars=5), tool
+
+def test_prefetch_warms_the_query_the_node_will_run(monkeypatch):
+    prefetcher, tool = make(monkeypatch)
+    async def scenario():
+        assert prefetcher.schedule("c1", "porter five forces of Ford")["route"] == "porter"
+        await asyncio.sleep(0.05)
+    asyncio.run(scenario())
+    query = graph.search_query("porter", "porter five forces of Ford")
+    assert tool.queries == [query]
+    assert prefetcher.search_gate.stats()["searches_performed"] == 0  # speculative, not counted
+    # The node's own search is now a cache hit
+    graph.cached_search(tool, query, prefetcher.search_gate)
+    assert len(tool.queries) == 1 and prefetcher.search_gate.stats()["search_cache_hits"] == 1
+
+def test_newer_draft_cancels_pending_prefetch(monkeypatch):
+    prefetcher, tool = make(monkeypatch, delay=0.05)
+    async def scenario():
+        prefetcher.schedule("c1", "news about Tes")
+        prefetcher.schedule("c1", "news about Tesla")
+        assert prefetcher.schedule("c2", "hi")["status"] == "skipped"
+        await asyncio.sleep(0.15)
+    asyncio.run(scenario())
+    assert tool.queries == ["news about Tesla"]
+    stats = prefetcher.stats()
+    assert stats["cancelled"] == 1 and stats["outcomes"] == {"searched": 1} and stats["pending"] == 0
+
+def test_follow_up_without_search_is_not_prefetched(monkeypatch):
+    prefetcher, tool = make(monkeypatch)
+    async def scenario():
+        prefetcher.schedule("c1", "thanks a lot", [("human", "swot of tesla"), ("ai", "report")])
+        await asyncio.sleep(0.05)
+    asyncio.run(scenario())
+    assert tool.queries == [] and prefetcher.stats()["outcomes"] == {"not_needed": 1}
+
+def test_prefetch_classifier_calls_stay_out_of_search_metrics(monkeypatch):
+    monkeypatch.setattr(graph, "get_cache", lambda cache=MemoryCache(): cache)
+    tool = FakeSearch()
+    prefetcher = Prefetcher(tool, SearchGate(classifier=lambda text, previous: True), delay=0.0, min_chars=5)
+    async def scenario():
+        prefetcher.schedule("c1", "how does the brand strength compare overall",
+                            [("human", "swot of tesla"), ("ai", "report")])
+        await asyncio.sleep(0.05)
+    asyncio.run(scenario())
+    assert len(tool.queries) == 1 and prefetcher.stats()["outcomes"] == {"searched": 1}
+    assert prefetcher.search_gate.stats()["classifier_calls"] == 0
+
+def test_nothing_is_prefetched_when_search_cache_is_off(monkeypatch):
+    prefetcher, tool = make(monkeypatch)
+    monkeypatch.setenv("SEARCH_CACHE_TTL_SECONDS", "0")
+    async def scenario():
+        assert prefetcher.schedule("c1", "porter five forces of Ford")["status"] == "skipped"
+        await asyncio.sleep(0.05)
+    asyncio.run(scenario())
+    assert tool.queries == [] and prefetcher.stats()["skipped"] == 1
@@ -0,0 +1,51 @@
+# test_profiling.py
+import pytest
+from fastapi.testclient import TestClient
+import main
+import profiling
+from cache import MemoryCache
+
+client = TestClient(main.app)
+
+@pytest.fixture
+def admin(monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "s3cret")
+    monkeypatch.setattr(profiling, "_profiling", profiling.Profiling(store=MemoryCache()))
+    yield {"X-Admin-Token": "s3cret"}
+    profiling._profiling = None
+
+def test_debug_header_profiles_request_for_admins(admin):
+    r = client.get("/", headers={"X-Debug-Profile": "1", **admin})
+    profile_id = r.headers["x-profile-id"]
+    listed = client.get("/admin/profiles", headers=admin).json()["items"]
+    assert listed[0]["id"] == profile_id and listed[0]["path"] == "/" and "report" not in listed[0]
+    profile = client.get(f"/admin/profiles/{profile_id}", headers=admin).json()
+    assert profile["status"] == 200 and profile["wall_ms"] >= 0 and "function calls" in profile["report"]
+    assert client.delete("/admin/profiles", headers=admin).json() == {"deleted": 1}
+
+def test_debug_header_needs_valid_token(admin):
+    r = client.get("/", headers={"X-Debug-Profile": "1", "X-Admin-Token": "wrong"})
+    assert "x-profile-id" not in r.headers
+    assert client.get("/admin/profiles", headers={"X-Admin-Token": "wrong"}).status_code == 403
+
+def test_disabled_without_token_or_sampling(monkeypatch):
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    monkeypatch.setattr(profiling, "_profiling", profiling.Profiling(sample_rate=0))
+    assert not profiling.get_profiling().enabled
+    assert "x-profile-id" not in client.get("/", headers={"X-Debug-Profile": "1"}).headers
+    assert client.get("/admin/profiles").status_code == 403
+
+def test_sampling_keeps_a_bounded_number_of_profiles(monkeypatch):
+    monkeypatch.setattr(profiling, "_profiling", profiling.Profiling(sample_rate=1.0, max_profiles=2))
+    for _ in range(3):
+        client.get("/")
+    assert len(profiling.get_profiling().list()) == 2
+
+def test_profiles_are_visible_to_every_worker_sharing_the_store(admin, monkeypatch):
+    """A profile taken by one worker is listed and served by another one using the same cache."""
+    shared = MemoryCache()
+    monkeypatch.setattr(profiling, "_profiling", profiling.Profiling(store=shared))
+    profile_id = client.get("/", headers={"X-Debug-Profile": "1", **admin}).headers["x-profile-id"]
+    monkeypatch.setattr(profiling, "_profiling", profiling.Profiling(store=shared))
+    assert client.get("/admin/profiles", headers=admin).json()["items"][0]["id"] == profile_id
+    assert client.get(f"/admin/profiles/{profile_id}", headers=admin).status_code == 200
@@ -0,0 +1,78 @@
+# test_retention.py
+import asyncio
+from datetime import datetime
+import pytest
+from bson import ObjectId
+import retention
+from retention import ArchiveStore, compact_conversation, archive_stub, ensure_retention_indexes
+
+def turn_doc(i, history):
+    return {"_id": ObjectId(), "conversation_id": "c1", "turn_index": i, "input": f"q{i}", "response": f"a{i}",
+            "messages": history[:-1], "full_history": history, "created_at": datetime(2024, 1, 1, 0, i)}
+
+def test_compaction_keeps_every_turn_once():
+    docs = [turn_doc(i, [("q", "a")] * (i + 1)) for i in range(3)]
+    compacted = compact_conversation(docs)
+    assert [t["input"] for t in compacted["turns"]] == ["q0", "q1", "q2"]
+    assert compacted["_id"] == docs[-1]["_id"] and "messages" not in compacted
+    # A conversation resumed after compaction merges the earlier turns list
+    resumed = compact_conversation([compacted, turn_doc(3, [("q", "a")] * 4)])
+    assert [t["turn_index"] for t in resumed["turns"]] == [0, 1, 2, 3]
+
+@pytest.mark.parametrize("codec", ["gzip", "zstd"])
+def test_archive_round_trip(tmp_path, codec):
+    if codec == "zstd" and retention.zstandard is None:
+        pytest.skip("zstandard not installed")
+    store = ArchiveStore(str(tmp_path), codec)
+    docs = [compact_conversation([turn_doc(0, [["q", "a"]])]), {"_id": ObjectId(), "conversation_id": "c2", "turns": []}]
+    name, size = store.write(docs)
+    assert name.endswith(".zst" if codec == "zstd" else ".gz") and size > 0
+    assert store.read(name, "c1") == docs[0]  # ObjectId and datetime survive
+    assert store.read(name, "missing") is None
+    assert archive_stub(docs[0], name)["archive"] == name
+    with pytest.raises(ValueError):
+        store.read("../" + name, "c1")
+
+class IndexRecorder:
+    """Records index changes; ``indexes`` is what index_information() reports"""
+    name = "Discussion_data"
+
+    def __init__(self, indexes=None):
+        self.indexes = indexes or {}
+        self.created, self.dropped, self.commands = [], [], []
+        self.database = self
+
+    async def index_information(self):
+        return self.indexes
+
+    async def create_index(self, keys, **options):
+        self.created.append(options)
+
+    async def drop_index(self, name):
+        self.dropped.append(name)
+
+    async def command(self, *args, **kwargs):
+        self.commands.append((args, kwargs))
+
+def test_turn_ttl_only_matches_raw_snapshots(monkeypatch):
+    """Compacted documents and stubs lose is_head when a conversation resumes; they must not expire."""
+    monkeypatch.setenv("RETENTION_TURN_TTL_DAYS", "30")
+    collection = IndexRecorder()
+    asyncio.run(ensure_retention_indexes(collection))
+    ttl = next(options for options in collection.created if "expireAfterSeconds" in options)
+    assert ttl["partialFilterExpression"] == {"raw": True, "is_head": False}
+    assert "raw" not in compact_conversation([dict(turn_doc(0, [["q", "a"]]), raw=True)])
+
+def test_changed_turn_ttl_is_applied_with_collmod(monkeypatch):
+    monkeypatch.setenv("RETENTION_TURN_TTL_DAYS", "30")
+    current = IndexRecorder({"raw_snapshot_ttl": {"expireAfterSeconds": 30 * 86400}})
+    asyncio.run(ensure_retention_indexes(current))
+    assert current.commands == [] and len(current.created) == 1  # only the (is_head, created_at) index
+    changed = IndexRecorder({"raw_snapshot_ttl": {"expireAfterSeconds": 7 * 86400}})
+    asyncio.run(ensure_retention_indexes(changed))
+    assert changed.commands == [(("collMod", "Discussion_data"),
+                                 {"index": {"name": "raw_snapshot_ttl", "expireAfterSeconds": 30 * 86400}})]
+    monkeypatch.setenv("RETENTION_TURN_TTL_DAYS", "0")
+    turned_off = IndexRecorder({"raw_snapshot_ttl": {"expireAfterSeconds": 7 * 86400}})
+    asyncio.run(ensure_retention_indexes(turned_off))
+    assert turned_off.dropped == ["raw_snapshot_ttl"]
@@ -0,0 +1,62 @@
+# test_search_gate.py
+from search_gate import SearchGate, parse_source_links
+
+PREVIOUS_ANSWER = """# Tesla SWOT
+
+Strong brand [1] and growing energy business [3].
+
+### Sources
+1. [Tesla 10-K](https://example.com/10k)
+3. [Energy storage report](https://example.com/energy)"""
+
+HISTORY = [("human", "swot of tesla"), ("ai", PREVIOUS_ANSWER)]
+
+def test_parse_source_links_keeps_numbering():
+    """Gaps in the numbering stay as None so [3] still points at the third entry."""
+    sources = parse_source_links(PREVIOUS_ANSWER)
+    assert len(sources) == 3
+    assert sources[0] == {"title": "Tesla 10-K", "url": "https://example.com/10k"}
+    assert sources[1] is None
+    assert sources[2]["url"] == "https://example.com/energy"
+
+def test_first_turn_searches():
+    """Without a previous answer there is nothing to reuse."""
+    assert SearchGate().decide("thanks", []).search
+
+def test_acknowledgement_skips_without_sources():
+    decision = SearchGate().decide("Thanks!", HISTORY)
+    assert not decision.search
+    assert decision.sources == []
+
+def test_follow_up_reuses_previous_sources():
+    """Edits of the previous answer skip the search and reuse its numbered sources."""
+    gate = SearchGate()
+    for text in ["make that shorter", "explain point 3", "Can you rephrase it?"]:
+        decision = gate.decide(text, HISTORY)
+        assert not decision.search, text
+        assert decision.sources[2]["title"] == "Energy storage report"
+
+def test_fresh_information_searches():
+    """Requests for new facts still search even when they look like follow-ups."""
+    gate = SearchGate()
+    assert gate.decide("explain point 3 with the latest numbers", HISTORY).search
+    assert gate.decide("What about Rivian's market share in Europe?", HISTORY).search
+
+def test_classifier_used_for_uncertain_inputs():
+    calls = []
+    def classifier(text, previous):
+        calls.append(text)
+        return False
+    decision = SearchGate(classifier=classifier).decide("How does the brand strength compare overall", HISTORY)
+    assert calls and not decision.search
+
+def test_counters_and_latency_saved():
+    gate = SearchGate()
+    gate.record_search(0.5)
+    gate.record_search(1.5)
+    gate.record_skip(gate.decide("make it shorter", HISTORY))
+    stats = gate.stats()
+    assert stats["searches_performed"] == 2
+    assert stats["searches_skipped"] == 1
+    assert stats["sources_reused"] == 2
+    assert stats["estimated_latency_saved"] == 1.0
@@ -0,0 +1,39 @@
+# test_singleflight.py
+import asyncio
+import pytest
+from singleflight import SingleFlight, flight_key
+
+def test_flight_key_normalizes_input_but_not_context():
+    assert flight_key("swot", "SWOT of  Tesla", []) == flight_key("swot", "swot of tesla", [])
+    assert flight_key("swot", "swot of tesla", []) != flight_key("swot", "swot of tesla", [("human", "hi")])
+    assert flight_key("swot", "tesla", []) != flight_key("porter", "tesla", [])
+
+def test_errors_are_shared_and_nothing_is_kept():
+    flights, calls = SingleFlight(), []
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+    async def scenario():
+        results = await asyncio.gather(*(flights.run("k", failing) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        with pytest.raises(RuntimeError):
+            await flights.run("k", failing)  # a later request runs again
+    asyncio.run(scenario())
+    assert len(calls) == 2
+    assert flights.stats()["errors"] == 2 and flights.stats()["in_flight"] == 0
+
+def test_cancelled_leader_does_not_cancel_waiters():
+    flights = SingleFlight()
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "report"
+    async def scenario():
+        leader = asyncio.create_task(flights.run("k", slow))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.run("k", slow))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+    assert asyncio.run(scenario()) == "report"
+    assert flights.stats()["executions"] == 1 and flights.stats()["coalesced"] == 1
@@ -0,0 +1,44 @@
+# test_sources.py
+from sources import serialize_sources, serialize_history, trim_snippet, query_terms
+
+RESULTS = [
+    {"title": "Tesla annual report", "url": "https://a.com", "content": "Tesla delivered 1.8M cars. The weather was mild. Tesla margins fell."},
+    {"title": "Duplicate", "url": "https://a.com", "content": "same url"},
+    {"foo": "unusable entry"},
+    {"title": "Battery market", "url": "https://b.com", "content": "Battery prices dropped."},
+]
+
+def test_numbering_matches_result_positions():
+    """[n] follows the position in the results, skipping duplicates and unusable entries."""
+    text = serialize_sources(RESULTS, query="tesla", budget=10_000)
+    lines = text.splitlines()
+    assert len(lines) == 2
+    assert lines[0].startswith("[1] Tesla annual report — https://a.com — Tesla delivered")
+    assert lines[1].startswith("[4] Battery market — https://b.com")
+
+def test_reused_sources_without_content():
+    """Sources parsed from a previous answer have no content and keep their gaps."""
+    text = serialize_sources([{"title": "T", "url": "https://t.com"}, None, {"title": "U", "url": "https://u.com"}])
+    assert text == "[1] T — https://t.com\n[3] U — https://u.com"
+
+def test_empty_results():
+    assert serialize_sources([]) == "No search results available."
+
+def test_trim_keeps_relevant_sentences_in_order():
+    content = "Tesla delivered 1.8M cars. The weather was mild. Tesla margins fell."
+    snippet = trim_snippet(content, query_terms("Tesla margins"), 25)
+    assert snippet == "Tesla margins fell."
+    snippet = trim_snippet(content, query_terms("Tesla margins"), 50)
+    assert snippet == "Tesla delivered 1.8M cars. Tesla margins fell."
+
+def test_budget_is_respected():
+    long_results = [{"title": f"T{i}", "url": f"https://x.com/{i}", "content": "Some sentence here. " * 500} for i in range(5)]
+    assert len(serialize_sources(long_results, query="sentence", budget=2000)) <= 2000
+
+def test_history_strips_sources_and_fits_budget():
+    report = "# Report\n\nBody text [1]\n\n### Sources\n1. [A](https://a.com)"
+    history = [("human", "old question " * 200), ("ai", report)] * 5
+    text = serialize_history(history, budget=1500)
+    assert "### Sources" not in text
+    assert len(text) <= 1500 + 50
+    assert text.endswith("ai: # Report\n\nBody text [1]")
@@ -0,0 +1,72 @@
+# test_vector_index.py
+from vector_index import VectorIndex, normalize_subject, format_internal_notes
+
+SOURCES = [{"title": f"Source {i}", "url": f"https://example.com/{i}", "content": "text " * 500} for i in range(4)]
+REPORT = "# SWOT\n\nBody [1]\n\n### Sources\n1. [Source 0](https://example.com/0)"
+
+def test_normalize_subject_drops_framework_words():
+    assert normalize_subject("Porter's Five Forces analysis of Tesla 2025") == "tesla"
+
+def test_repeat_subject_is_answered_internally(tmp_path):
+    """A second framework on the same subject reuses the stored sources."""
+    index = VectorIndex(str(tmp_path))
+    index.add_analysis("SWOT", "swot of tesla", REPORT, SOURCES)
+    sources, notes = index.retrieve("pestle analysis of Tesla")
+    assert [s["url"] for s in sources] == [s["url"] for s in SOURCES]
+    assert notes[0]["content"] == "# SWOT\n\nBody [1]"
+    assert index.retrieve("swot of rivian") is None
+    assert index.stats()["internal_hits"] == 1 and index.stats()["web_fallbacks"] == 1
+
+def test_other_subjects_sharing_a_word_fall_back(tmp_path):
+    """Apple's sources do not answer Apple Music, Apple Bank or the apple pie industry."""
+    index = VectorIndex(str(tmp_path))
+    index.add_analysis("SWOT", "swot of Apple", REPORT, SOURCES)
+    for subject in ("pestle of apple pie industry", "swot of Apple Music", "Apple Bank", "swot analysis"):
+        assert index.retrieve(subject) is None, subject
+    assert index.retrieve("porter five forces of apple") is not None
+
+def test_index_is_opt_in(monkeypatch, tmp_path):
+    import vector_index
+    monkeypatch.setattr(vector_index, "_index", None)
+    monkeypatch.setattr(vector_index, "_index_disabled", False)
+    monkeypatch.setenv("VECTOR_INDEX_DIR", str(tmp_path))
+    monkeypatch.delenv("VECTOR_INDEX_ENABLED", raising=False)
+    assert vector_index.get_vector_index() is None
+    monkeypatch.setattr(vector_index, "_index_disabled", False)
+    monkeypatch.setenv("VECTOR_INDEX_ENABLED", "1")
+    assert vector_index.get_vector_index() is not None
+
+def test_stale_or_thin_matches_fall_back(tmp_path):
+    index = VectorIndex(str(tmp_path))
+    index.add_analysis("SWOT", "tesla", REPORT, SOURCES[:2])
+    assert index.retrieve("tesla") is None  # fewer than 3 sources
+    assert index.retrieve("tesla", min_sources=1, max_age_days=-1) is None  # too old
+
+def test_index_persists_and_deduplicates(tmp_path):
+    """Entries are appended to disk once and are visible to a fresh instance (another worker)."""
+    index = VectorIndex(str(tmp_path))
+    assert index.add_analysis("SWOT", "tesla", REPORT, SOURCES) == 1
+    assert index.add_analysis("SWOT", "tesla", REPORT, SOURCES) == 0
+    other = VectorIndex(str(tmp_path))
+    assert len(other) == 1
+    index.add_analysis("PESTLE", "ford", REPORT + " more", SOURCES)
+    assert other.search("ford", k=1)[0]["title"] == "PESTLE analysis: ford"
+
+def test_interrupted_append_is_cut_off(tmp_path):
+    """Vectors without metadata and a half-written line from a crashed append do not shift rows."""
+    index = VectorIndex(str(tmp_path))
+    index.add_analysis("SWOT", "tesla", REPORT, SOURCES)
+    with open(index.vectors_path, "ab") as f:
+        f.write(b"\0" * (index.dim * 4 + 10))
+    with open(index.meta_path, "ab") as f:
+        f.write(b'{"key": "half')
+    other = VectorIndex(str(tmp_path))
+    assert len(other) == 1
+    other.add_analysis("PESTLE", "ford", REPORT + " more", SOURCES)
+    assert len(other) == 2 and other._meta[1]["title"] == "PESTLE analysis: ford"
+    assert other.search("ford", k=1)[0]["title"] == "PESTLE analysis: ford"
+    assert VectorIndex(str(tmp_path)).search("tesla", k=1)[0]["title"] == "SWOT analysis: tesla"
+
+def test_internal_notes_are_not_numbered():
+    assert format_internal_notes([]) == ""
+    assert "do not cite" in format_internal_notes([{"title": "SWOT analysis: tesla", "content": "x"}])
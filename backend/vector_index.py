@@ -0,0 +1,287 @@
+#vector_index.py
+"""
+Local vector index over past analyses and the web sources they cited.
+
+Every framework report produced by the graph is embedded on the CPU by its subject ("tesla" for
+"SWOT analysis of Tesla") and appended to a flat float32 matrix on disk (``vectors.f32``, read
+through numpy.memmap) with one JSON line of metadata per row (``meta.jsonl``) holding the report
+text and the web sources it cited. Before calling Tavily the analysis nodes ask the index first:
+when recent analyses of the same subject (same words once framework terms are dropped) provide
+enough sources, those are used instead of a web search and the earlier reports are added to the
+prompt as internal background. The index is off unless VECTOR_INDEX_ENABLED=1.
+
+The default embedder is a feature-hashing bag of words and bigrams, which needs no model
+download; the best hashed candidates are re-ranked on their exact features so bucket collisions
+do not produce false matches. Set VECTOR_EMBED_MODEL to a sentence-transformers model name to
+use that instead.
+Appends take an exclusive file lock, so several worker processes can share one index directory
+(on platforms without fcntl, e.g. Windows, only threads are locked: run a single worker there).
+Vectors are written before their metadata and the metadata file decides which rows exist, so an
+append interrupted by a crash is cut off again by the next append.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+import zlib
+import numpy as np
+from dotenv import load_dotenv
+load_dotenv()
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+DEFAULT_DIM = 1024
+HASH_PROBES = 2             # buckets per feature, so two subjects rarely collide completely
+RERANK_CANDIDATES = 50      # hashed-score candidates re-ranked on exact features
+EMBED_CHARS = 4000          # text embedded per entry
+STORED_CHARS = 2000         # report text kept in the metadata for prompt background
+SOURCE_CHARS = 1000         # content kept per source for prompt snippets
+MAX_INTERNAL_SOURCES = 8
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Framework names and request phrasing say nothing about the subject being analysed
+_SUBJECT_STOPWORDS = frozenset(
+    "swot pestle pestel tows porter porters five forces business model canvas matrix analysis "
+    "analyse analyze do a an the of for on about please give me make create generate run write "
+    "report company companies industry inc corp ltd 2024 2025 2026 s".split()
+)
+
+
+def normalize_subject(text):
+    """Subject words of an analysis request: "SWOT analysis of Tesla 2025" becomes 'tesla'"""
+    return " ".join(t for t in _TOKEN_RE.findall(text.lower()) if t not in _SUBJECT_STOPWORDS)
+
+
+class HashingEmbedder:
+    """Signed feature hashing of unigrams and bigrams (HASH_PROBES buckets each), L2-normalised"""
+
+    def __init__(self, dim=DEFAULT_DIM):
+        self.dim = dim
+
+    def features(self, text):
+        tokens = _TOKEN_RE.findall(text.lower()[:EMBED_CHARS])
+        counts = {}
+        for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+            counts[feature] = counts.get(feature, 0) + 1
+        return {feature: 1.0 + math.log(count) for feature, count in counts.items()}
+
+    def rescore(self, text_a, text_b):
+        """Exact cosine of the unhashed features, used to re-rank candidates hurt by hash collisions"""
+        a, b = self.features(text_a), self.features(text_b)
+        dot = sum(w * b[f] for f, w in a.items() if f in b)
+        norm = math.sqrt(sum(w * w for w in a.values()) * sum(w * w for w in b.values()))
+        return dot / norm if norm else 0.0
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self.features(text).items():
+                for probe in range(HASH_PROBES):
+                    h = zlib.crc32(f"{probe}:{feature}".encode())
+                    sign = 1.0 if h & 0x80000000 else -1.0
+                    matrix[row, h % self.dim] += sign * weight
+            norm = np.linalg.norm(matrix[row])
+            if norm:
+                matrix[row] /= norm
+        return matrix
+
+
+class SentenceTransformerEmbedder:
+    """Optional dense embedder; sentence-transformers is not a required dependency"""
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts):
+        vectors = self.model.encode([t[:EMBED_CHARS] for t in texts], normalize_embeddings=True)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+class VectorIndex:
+    """Append-only flat inner-product index persisted as a memory-mapped matrix"""
+
+    def __init__(self, directory, embedder=None):
+        self.embedder = embedder or HashingEmbedder()
+        self.dim = self.embedder.dim
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.meta_path = os.path.join(directory, "meta.jsonl")
+        self.lock_path = os.path.join(directory, ".lock")
+        self._meta = []
+        self._meta_offset = 0
+        self._keys = set()
+        self._matrix = None
+        self._lock = threading.Lock()
+        self._stats = {"internal_hits": 0, "web_fallbacks": 0, "entries_added": 0,
+                       "searches": 0, "total_search_latency": 0.0}
+        self._refresh()
+
+    def __len__(self):
+        return 0 if self._matrix is None else self._matrix.shape[0]
+
+    def _refresh(self, repair=False):
+        # Pick up rows appended since the last look, by this process or another worker. With
+        # ``repair`` (only under the file lock) the leftovers of an interrupted append are cut off:
+        # a partial metadata line and vector rows that have no metadata
+        if os.path.exists(self.meta_path) and os.path.getsize(self.meta_path) > self._meta_offset:
+            with open(self.meta_path, "rb") as f:
+                f.seek(self._meta_offset)
+                data = f.read()
+            complete = data[:data.rfind(b"\n") + 1]
+            for line in complete.splitlines():
+                entry = json.loads(line)
+                self._meta.append(entry)
+                self._keys.add(entry["key"])
+            self._meta_offset += len(complete)
+        size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        if repair:
+            if os.path.exists(self.meta_path) and os.path.getsize(self.meta_path) > self._meta_offset:
+                os.truncate(self.meta_path, self._meta_offset)
+            if size > len(self._meta) * self.dim * 4:
+                size = len(self._meta) * self.dim * 4
+                self._matrix = None  # drop the memmap before the file shrinks under it
+                os.truncate(self.vectors_path, size)
+        rows = min(size // (self.dim * 4), len(self._meta))
+        if rows != len(self) or (rows and self._matrix is None):
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim)) if rows else None
+
+    def add(self, entries):
+        """Embed the ``text`` of each entry and append it; entries whose ``key`` is known are skipped"""
+        with self._lock, open(self.lock_path, "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._refresh(repair=True)
+            new, seen = [], set()
+            for entry in entries:
+                if entry["key"] not in self._keys and entry["key"] not in seen:
+                    seen.add(entry["key"])
+                    new.append(entry)
+            if not new:
+                return 0
+            vectors = self.embedder.embed([e["text"] for e in new])
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors.astype(np.float32).tobytes())
+            # The metadata lines go out in one write, after the vectors they describe
+            lines = [json.dumps(dict(entry, content=str(entry.get("content", ""))[:STORED_CHARS]),
+                                ensure_ascii=False) + "\n" for entry in new]
+            with open(self.meta_path, "ab") as f:
+                f.write("".join(lines).encode("utf-8"))
+            self._refresh()
+            self._stats["entries_added"] += len(new)
+            return len(new)
+
+    def search(self, text, k=5):
+        """Top ``k`` entries by cosine similarity, each a metadata dict with a ``score``"""
+        started = time.perf_counter()
+        with self._lock:
+            self._refresh()
+            matrix, meta = self._matrix, self._meta
+        if matrix is None:
+            return []
+        scores = matrix @ self.embedder.embed([text])[0]
+        rescore = getattr(self.embedder, "rescore", None)
+        # With a hashing embedder take a wider candidate set and re-rank it exactly
+        candidates = min(len(scores), max(k, RERANK_CANDIDATES) if rescore else k)
+        top = np.argpartition(-scores, candidates - 1)[:candidates]
+        if rescore:
+            hits = [dict(meta[i], score=rescore(text, meta[i]["text"])) for i in top]
+        else:
+            hits = [dict(meta[i], score=float(scores[i])) for i in top]
+        hits.sort(key=lambda h: -h["score"])
+        hits = hits[:k]
+        with self._lock:
+            self._stats["searches"] += 1
+            self._stats["total_search_latency"] += time.perf_counter() - started
+        return hits
+
+    def retrieve(self, subject, k=3, min_score=None, min_sources=None, max_age_days=None, record=True):
+        """
+        Internal material for a subject: (sources, notes) built from earlier analyses of the same
+        normalized subject, or None when there are not enough recent matches and the caller should
+        search.
+        ``record=False`` leaves the hit/fallback counters alone (used by speculative prefetch).
+        """
+        min_score = float(os.getenv("VECTOR_MIN_SCORE", 0.55)) if min_score is None else min_score
+        min_sources = int(os.getenv("VECTOR_MIN_SOURCES", 3)) if min_sources is None else min_sources
+        max_age_days = float(os.getenv("VECTOR_MAX_AGE_DAYS", 30)) if max_age_days is None else max_age_days
+        oldest = time.time() - max_age_days * 86400
+
+        # Only analyses of the same subject count: "apple music" shares a token with "apple" and
+        # scores well above chance, but Apple's sources do not answer it
+        wanted = normalize_subject(subject)
+        words = set(wanted.split())
+        hits = [h for h in self.search(wanted, k=k) if words
+                and h["score"] >= min_score and h.get("created_at", 0) >= oldest
+                and set(h["text"].split()) == words]
+        sources, seen_urls = [], set()
+        for hit in hits:
+            for source in hit.get("sources", []):
+                if source["url"] not in seen_urls:
+                    seen_urls.add(source["url"])
+                    sources.append(source)
+        with self._lock:
+            if len(sources) < min_sources:
+                self._stats["web_fallbacks"] += record
+                return None
+            self._stats["internal_hits"] += record
+        return sources[:MAX_INTERNAL_SOURCES], hits
+
+    def add_analysis(self, analysis_type, subject, report, results):
+        """Index a finished report, keyed on its normalized subject, with the web sources it used"""
+        sources = []
+        for result in results or []:
+            if isinstance(result, dict) and result.get("url") and result.get("title"):
+                sources.append({"title": result["title"], "url": result["url"],
+                                "content": str(result.get("content", ""))[:SOURCE_CHARS]})
+        report_body = report.split("\n\n### Sources\n", 1)[0]
+        return self.add([{
+            "key": "report:" + hashlib.sha1(f"{analysis_type}\n{subject}\n{report_body}".encode()).hexdigest(),
+            "text": normalize_subject(subject),
+            "title": f"{analysis_type} analysis: {subject[:120]}",
+            "content": report_body,
+            "sources": sources,
+            "created_at": time.time(),
+        }])
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["entries"] = len(self)
+        stats["avg_search_latency"] = stats["total_search_latency"] / stats["searches"] if stats["searches"] else 0.0
+        return stats
+
+
+def format_internal_notes(notes):
+    """Past reports as background for the prompt; they are not numbered, citable sources"""
+    if not notes:
+        return ""
+    parts = [f"- {n['title']}: {n['content'][:800]}" for n in notes]
+    return "\n\nEarlier internal analyses (background only, do not cite):\n" + "\n".join(parts)
+
+
+# Lazy, per-process index; None unless VECTOR_INDEX_ENABLED=1 or when the directory is not writable
+_index = None
+_index_disabled = False
+
+def get_vector_index():
+    global _index, _index_disabled
+    if _index is None and not _index_disabled:
+        if os.getenv("VECTOR_INDEX_ENABLED", "0").lower() not in ("1", "true", "yes"):
+            _index_disabled = True
+            return None
+        directory = os.getenv("VECTOR_INDEX_DIR") or os.path.join(os.path.dirname(__file__), "data", "vector_index")
+        try:
+            model_name = os.getenv("VECTOR_EMBED_MODEL")
+            embedder = SentenceTransformerEmbedder(model_name) if model_name else None
+            _index = VectorIndex(directory, embedder=embedder)
+        except Exception as e:
+            print(f"Vector index disabled: {str(e)}")
+            _index_disabled = True
+    return _index
@@ -29,6 +29,7 @@ export default function LoginPage() {
       if (res.ok) {
         const data = await res.json();
         console.log('Logged in successfully', data);
+        localStorage.setItem('user_id', data.user_id); // Tags the chats this user starts
 
         router.push('/chat');
       } else {
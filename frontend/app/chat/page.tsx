@@ -1,6 +1,6 @@
 'use client';
 
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { Button } from "@/components/ui/button";
 // Added PanelLeftClose and PanelRightClose for the sidebar toggle button
 import { Bot, Send, Home, Mic, MicOff, Volume2, VolumeX, Copy, Check, Download, RefreshCw, ListTodo, PanelLeftClose, PanelRightClose } from "lucide-react";
@@ -23,10 +23,13 @@ interface Message {
 // API response interface to match backend structure
 interface AnalysisResponse {
   response: string;
-  full_history: [string, string][];
+  full_history?: [string, string][]; // omitted when the request sets delta
+  conversation_id?: string;
 }
 
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || 'http://127.0.0.1:8000'; // Added API_BASE_URL
+const PREFETCH_DEBOUNCE_MS = 600; // Pause in typing before the draft is sent to /prefetch
+const PREFETCH_MIN_CHARS = 12;
 
 export default function Chat() {
   const [mounted, setMounted] = useState(false);
@@ -38,9 +41,12 @@ export default function Chat() {
     }
   ]);
   const [isLoading, setIsLoading] = useState(false);
+  const [conversationId, setConversationId] = useState<string | null>(null); // Set by the first /analyze response
+  const [userId, setUserId] = useState<string | null>(null); // Saved at login; null for guests
   const [speakingIndex, setSpeakingIndex] = useState<number | null>(null);
   const [copiedIndex, setCopiedIndex] = useState<number | null>(null);
   const [isSidebarVisible, setIsSidebarVisible] = useState(true); // State for sidebar visibility
+  const prefetchClientId = useRef(Math.random().toString(36).slice(2)); // One pending prefetch per page
   const { speakingId, speak, stop } = useTextToSpeech();
 
   const {
@@ -56,6 +62,10 @@ export default function Chat() {
     resetTranscript
   } = useSpeechRecognition();
 
+  useEffect(() => {
+    setUserId(localStorage.getItem('user_id'));
+  }, []);
+
   // Update input field with transcript when voice input changes
   useEffect(() => {
     if (transcript) {
@@ -63,6 +73,27 @@ export default function Chat() {
     }
   }, [transcript]);
 
+  // The backend only needs the latest answer to route a draft and decide whether it needs a search
+  const lastAnswer = messages.slice(1).reverse().find(msg => msg.type === 'bot')?.content;
+
+  // Warm the backend search cache while the user is still typing (best effort, errors ignored)
+  useEffect(() => {
+    const draft = input.trim();
+    if (isLoading || draft.length < PREFETCH_MIN_CHARS) return;
+    const timer = setTimeout(() => {
+      fetch(`${API_BASE_URL}/prefetch`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          client_id: prefetchClientId.current,
+          draft,
+          messages: lastAnswer ? [['ai', lastAnswer]] : []
+        }),
+      }).catch(() => {});
+    }, PREFETCH_DEBOUNCE_MS);
+    return () => clearTimeout(timer);
+  }, [input, isLoading, lastAnswer]);
+
   // Handle voice send
   const handleVoiceSend = () => {
     if (input.trim()) {
@@ -74,7 +105,8 @@ export default function Chat() {
     // send get request "/download" to get collection from database
 
     try{
-      const response = await fetch(`${API_BASE_URL}/download`, {
+      const query = conversationId ? `?conversation_id=${encodeURIComponent(conversationId)}` : '';
+      const response = await fetch(`${API_BASE_URL}/download${query}`, {
         method: 'GET',
         headers: {
           'Accept': 'application/pdf'
@@ -112,7 +144,10 @@ export default function Chat() {
         },
         body: JSON.stringify({
           messages: historyForApi,
-          user_input: userMessageToRerun.content
+          user_input: userMessageToRerun.content,
+          user_id: userId,
+          conversation_id: conversationId,
+          delta: true
         }),
       });
       if (!response.ok) {
@@ -165,7 +200,10 @@ export default function Chat() {
         },
         body: JSON.stringify({
           messages: historyMessages, // Send the processed history
-          user_input: currentInput // Send the captured current input
+          user_input: currentInput, // Send the captured current input
+          user_id: userId, // Lists the conversation under the logged-in user's discussions
+          conversation_id: conversationId, // Keeps every turn of this chat in one discussion
+          delta: true // Only the new turn comes back; the page already holds the history
         }),
       });
 
@@ -174,6 +212,9 @@ export default function Chat() {
       }
 
       const data: AnalysisResponse = await response.json();
+      if (data.conversation_id) {
+        setConversationId(data.conversation_id);
+      }
       
       // Add bot response to chat
       setMessages(prev => [...prev, {